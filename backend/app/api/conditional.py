@@ -0,0 +1,61 @@
+# _*_ coding : utf-8 _*_
+# @Time : 2026/3/14 20:10
+# @Author : Yoln
+# @File : conditional
+# @Project : mahjong-handle-web
+"""
+状态接口的条件 GET（ETag / If-None-Match）。
+
+每份存储状态都带单调递增的 ``version``，ETag 由 version 与调用方视角（如 userId）组成。
+仓库的 ``version()`` 只读版本号（Redis 下是一个小 key 或 hash 字段），命中时直接 304，
+不需要解码整份文档、也不需要重新序列化响应体。
+"""
+from __future__ import annotations
+
+import zlib
+from typing import Optional
+
+from fastapi import Request, Response
+
+# 让浏览器缓存响应但每次都带 If-None-Match 回源校验，axios 轮询无需改动即可拿到 304。
+CACHE_CONTROL = "no-cache"
+
+
+def etag(version: int, *scope: object) -> str:
+    """弱 ETag：``W/"<version>-<scope crc32>"``，scope 区分同一版本下不同用户看到的内容。"""
+    digest = zlib.crc32("\x1f".join(str(part) for part in scope).encode("utf-8"))
+    return f'W/"{int(version)}-{digest:08x}"'
+
+
+def etag_matches(request: Request, tag: str) -> bool:
+    """If-None-Match 是否命中 ``tag``（弱比较）。"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # 弱比较：忽略 W/ 前缀（代理可能会去掉或加上）
+    wanted = tag[2:] if tag.startswith("W/") else tag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == wanted:
+            return True
+    return False
+
+
+def not_modified(request: Request, version: Optional[int], *scope: object) -> Optional[Response]:
+    """If-None-Match 命中当前版本时返回 304 响应，否则返回 None（version 未知也返回 None）。"""
+    if version is None:
+        return None
+    tag = etag(version, *scope)
+    if not etag_matches(request, tag):
+        return None
+    return Response(status_code=304, headers={"ETag": tag, "Cache-Control": CACHE_CONTROL})
+
+
+def tag_response(response: Response, version: int, *scope: object) -> None:
+    """给 200 响应带上 ETag 与 Cache-Control。"""
+    response.headers["ETag"] = etag(version, *scope)
+    response.headers["Cache-Control"] = CACHE_CONTROL
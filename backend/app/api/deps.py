@@ -7,15 +7,30 @@ from __future__ import annotations
 
 import logging
 
+from app.api.settled import create_settled_cache_from_env
 from app.modules.handle.repo import create_handle_repo_from_env
 from app.modules.link.repo import create_link_repo_from_env
 from app.modules.battle.repo import create_battle_repo_from_env
+from app.modules.nonogram_battle.bank import create_bank_from_env, create_recent_puzzles_from_env
+from app.modules.nonogram_battle.pool import create_puzzle_pool_from_env
 from app.modules.nonogram_battle.repo import create_repo as create_nonogram_battle_repo
+from app.modules.push.broker import create_broker_from_env
+from app.modules.push.snapshots import create_snapshot_cache_from_env
+from app.modules.matchmaking.queue import create_matchmaker_from_env
+from app.modules.rating.store import create_rating_store_from_env
 
 # NOTE: keep single repo instances for the whole process.
 handle_repo = create_handle_repo_from_env()
 link_repo = create_link_repo_from_env()
 battle_repo = create_battle_repo_from_env()
 nonogram_battle_repo = create_nonogram_battle_repo()
+nonogram_puzzle_pool = create_puzzle_pool_from_env()
+nonogram_puzzle_bank = create_bank_from_env()
+nonogram_recent_puzzles = create_recent_puzzles_from_env()
+event_broker = create_broker_from_env()
+match_snapshots = create_snapshot_cache_from_env()
+matchmaker = create_matchmaker_from_env()
+rating_store = create_rating_store_from_env()
+settled_cache = create_settled_cache_from_env()
 
 log = logging.getLogger("mahjong.api")
@@ -10,7 +10,10 @@ from fastapi import APIRouter
 from app.modules.handle.api import router as handle_router
 from app.modules.link.api import router as link_router
 from app.modules.battle.api import router as battle_router
+from app.modules.nonogram.api import router as nonogram_router
 from app.modules.nonogram_battle.api import router as nonogram_battle_router
+from app.modules.matchmaking.api import router as matchmaking_router
+from app.modules.rating.api import router as rating_router
 from .health import router as health_router
 
 router = APIRouter()
@@ -19,4 +22,7 @@ router.include_router(health_router, prefix="/health", tags=["health"])
 router.include_router(handle_router, prefix="/handle", tags=["handle"])
 router.include_router(link_router, prefix="/link", tags=["link"])
 router.include_router(battle_router, prefix="/battle", tags=["battle"])
+router.include_router(nonogram_router, prefix="/nonogram", tags=["nonogram"])
 router.include_router(nonogram_battle_router, prefix="/nonogram-battle", tags=["nonogram-battle"])
+router.include_router(matchmaking_router, prefix="/matchmaking", tags=["matchmaking"])
+router.include_router(rating_router, prefix="/rating", tags=["rating"])
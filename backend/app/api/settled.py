@@ -0,0 +1,122 @@
+# _*_ coding : utf-8 _*_
+# @Time : 2026/3/21 21:40
+# @Author : Yoln
+# @File : settled
+# @Project : mahjong-handle-web
+"""
+已结束对局的响应缓存。
+
+结算后的响应（handle 答案、battle 结果、已结束的 link / nonogram 状态）不会再变化。
+首次请求照常读仓库、构造响应，之后把序列化好的响应体按 key 存进进程内 LRU
+（可选再写一份到 Redis 供其他进程共享），再次请求直接返回这段字节，不读仓库也不走领域逻辑。
+按 TTL 失效，对局被删除 / 重开时由 ``delete`` 清掉；响应带 ``Cache-Control: max-age`` 与 ETag，浏览器 / CDN 在 TTL 内可直接复用。
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import redis
+from fastapi import Request, Response
+from pydantic import BaseModel
+
+from app.api.conditional import etag_matches
+
+MEDIA_TYPE = "application/json"
+
+
+def body_etag(body: bytes) -> str:
+    return f'"{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+
+
+class SettledCache:
+    """key -> (ETag, 响应体)；进程内 LRU + 可选 Redis，两层按 TTL 过期或被 ``delete`` 清掉。"""
+
+    def __init__(self, ttl: int = 3600, max_entries: int = 4096, redis_url: Optional[str] = None, key_prefix: str = "mh:v1:settled"):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.key_prefix = key_prefix
+        self.redis = redis.Redis.from_url(redis_url) if redis_url else None
+        self._entries: "OrderedDict[str, Tuple[float, str, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _remember(self, key: str, expires_at: float, tag: str, body: bytes) -> None:
+        with self._lock:
+            self._entries[key] = (expires_at, tag, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Tuple[str, bytes, int]]:
+        """(ETag, 响应体, 剩余秒数)；未命中返回 None。"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    return entry[1], entry[2], int(entry[0] - now)
+                self._entries.pop(key, None)
+        if self.redis is None:
+            return None
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.get(f"{self.key_prefix}:{key}")
+        pipe.ttl(f"{self.key_prefix}:{key}")
+        raw, ttl = pipe.execute()
+        if raw is None or ttl is None or ttl <= 0:
+            return None
+        tag, _, body = raw.partition(b"\n")
+        self._remember(key, now + ttl, tag.decode(), body)
+        return tag.decode(), body, int(ttl)
+
+    def put(self, key: str, tag: str, body: bytes) -> None:
+        self._remember(key, time.time() + self.ttl, tag, body)
+        if self.redis is not None:
+            # 内容已定，已有的一份不覆盖，也不续期。
+            self.redis.set(f"{self.key_prefix}:{key}", tag.encode() + b"\n" + body, nx=True, ex=self.ttl)
+
+    def delete(self, *keys: str) -> None:
+        """对局被删除 / 重开时丢掉它的缓存，旧 id 不再返回已结束的响应。"""
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+        if self.redis is not None and keys:
+            self.redis.delete(*(f"{self.key_prefix}:{key}" for key in keys))
+
+    def respond(self, request: Request, key: str, private: bool = False) -> Optional[Response]:
+        """命中时直接返回缓存的响应（If-None-Match 匹配则 304）；未命中返回 None。"""
+        hit = self.get(key)
+        if hit is None:
+            return None
+        tag, body, remaining = hit
+        return _response(request, tag, body, remaining, private)
+
+    def store(self, request: Request, key: str, payload: BaseModel, tag: Optional[str] = None, private: bool = False) -> Response:
+        """序列化一次并缓存；``tag`` 缺省时按响应体内容生成。"""
+        body = payload.model_dump_json().encode("utf-8")
+        tag = tag or body_etag(body)
+        self.put(key, tag, body)
+        return _response(request, tag, body, self.ttl, private)
+
+
+def _response(request: Request, tag: str, body: bytes, max_age: int, private: bool) -> Response:
+    headers = {
+        "ETag": tag,
+        "Cache-Control": f"{'private' if private else 'public'}, max-age={max(0, max_age)}, immutable",
+    }
+    if etag_matches(request, tag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type=MEDIA_TYPE, headers=headers)
+
+
+def create_settled_cache_from_env() -> SettledCache:
+    shared = os.getenv("SETTLED_CACHE_REDIS", "").lower() in ("1", "true", "yes", "on")
+    return SettledCache(
+        ttl=int(os.getenv("SETTLED_CACHE_TTL_SECONDS", "3600")),
+        max_entries=int(os.getenv("SETTLED_CACHE_SIZE", "4096")),
+        redis_url=os.getenv("REDIS_URL", "redis://localhost:6379/0") if shared else None,
+    )
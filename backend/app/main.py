@@ -6,10 +6,14 @@
 # backend/app/main.py
 import os
 import logging
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from .api import router
+from .api.deps import event_broker, nonogram_puzzle_pool
+from .modules.battle import questions as battle_questions
 
 
 def _setup_logging() -> None:
@@ -20,6 +24,18 @@ def _setup_logging() -> None:
     )
 
 
+@asynccontextmanager
+async def _lifespan(app: FastAPI):
+    # 后台题目池：启动时预热，退出时回收工作进程
+    nonogram_puzzle_pool.warm()
+    try:
+        yield
+    finally:
+        nonogram_puzzle_pool.shutdown()
+        battle_questions.shutdown()
+        event_broker.close()
+
+
 def create_app() -> FastAPI:
     _setup_logging()
     app = FastAPI(
@@ -28,6 +44,7 @@ def create_app() -> FastAPI:
         docs_url="/api/docs",
         openapi_url="/api/openapi.json",
         redoc_url="/api/redoc",
+        lifespan=_lifespan,
     )
 
     app.add_middleware(
@@ -1,15 +1,24 @@
 from __future__ import annotations
 
-from fastapi import APIRouter
+from typing import Optional, Union
 
-from app.api.deps import battle_repo, log
+from fastapi import APIRouter, Request
+from fastapi.responses import Response
+
+from app.api.conditional import not_modified, tag_response
+from app.api.deps import battle_repo, event_broker, log, match_snapshots, rating_store, settled_cache
 from app.modules.battle.domain import (
     create_battle,
     enter_battle,
     join_battle,
+    join_events,
+    submit_events,
     submit_guess,
+    final_scores,
     to_result_payload,
+    to_spectator_payload,
     to_status_payload,
+    to_sync_event,
 )
 from app.modules.battle.schemas import (
     ApiError,
@@ -20,9 +29,29 @@ from app.modules.battle.schemas import (
     SubmitBattleReq,
 )
 
+from app.modules.push.broker import publish
+from app.modules.push.sse import last_version, stream_response
+
 router = APIRouter()
 
 
+def _channel(match_id: str) -> str:
+    return f"battle:{match_id}"
+
+
+def _rate(match_id: str) -> None:
+    """Rate a match once it finishes; the store ignores a match it has already rated.
+    A rating failure is logged and never fails the submission that finished the match."""
+    try:
+        state = battle_repo.get(match_id)
+        if state and state.get("status") == "finished":
+            changes = rating_store.record(match_id, *final_scores(state))
+            if changes is not None:
+                log.info("battle_rated matchId=%s players=%s", match_id, len(changes))
+    except Exception:
+        log.exception("battle_rating_failed matchId=%s", match_id)
+
+
 @router.post("/create", response_model=ApiResponse)
 def create(req: CreateBattleReq) -> ApiResponse:
     try:
@@ -31,6 +60,7 @@ def create(req: CreateBattleReq) -> ApiResponse:
             mode=req.mode,
             question_count=req.questionCount,
             max_guess=req.maxGuess,
+            max_players=req.maxPlayers,
         )
     except Exception as e:
         return ApiResponse(ok=False, data=None, error=ApiError(code="CREATE_FAILED", message=str(e)))
@@ -52,6 +82,7 @@ def create(req: CreateBattleReq) -> ApiResponse:
 def join(match_id: str, req: JoinBattleReq) -> ApiResponse:
     try:
         result = battle_repo.update(match_id, lambda s: join_battle(s, req.userId))
+        publish(event_broker, _channel(match_id), *join_events(result, req.userId))
     except KeyError:
         return ApiResponse(ok=False, data=None, error=ApiError(code="MATCH_NOT_FOUND", message="matchId 不存在"))
     except ValueError as e:
@@ -65,7 +96,10 @@ def join(match_id: str, req: JoinBattleReq) -> ApiResponse:
 @router.post("/{match_id}/enter", response_model=ApiResponse)
 def enter(match_id: str, req: EnterBattleReq) -> ApiResponse:
     try:
-        result = battle_repo.update(match_id, lambda s: enter_battle(s, req.userId))
+        battle_repo.update_player(match_id, req.userId, lambda s: enter_battle(s, req.userId))
+        result = battle_repo.view(match_id, req.userId)
+        if result is None:
+            raise KeyError("MATCH_NOT_FOUND")
     except KeyError:
         return ApiResponse(ok=False, data=None, error=ApiError(code="MATCH_NOT_FOUND", message="matchId 不存在"))
     except ValueError as e:
@@ -77,8 +111,11 @@ def enter(match_id: str, req: EnterBattleReq) -> ApiResponse:
 
 
 @router.get("/{match_id}/status", response_model=ApiResponse)
-def status(match_id: str, userId: str) -> ApiResponse:
-    state = battle_repo.get(match_id)
+def status(match_id: str, userId: str, request: Request, response: Response) -> Union[ApiResponse, Response]:
+    cached = not_modified(request, battle_repo.version(match_id), userId)
+    if cached is not None:
+        return cached
+    state = battle_repo.view(match_id, userId)
     if not state:
         return ApiResponse(ok=False, data=None, error=ApiError(code="MATCH_NOT_FOUND", message="matchId 不存在"))
     try:
@@ -86,13 +123,56 @@ def status(match_id: str, userId: str) -> ApiResponse:
     except ValueError as e:
         code = str(e)
         return ApiResponse(ok=False, data=None, error=ApiError(code=code, message=code))
+    tag_response(response, payload["version"], userId)
+    return ApiResponse(ok=True, data=payload, error=None)
+
+
+@router.get("/{match_id}/events", response_model=None)
+def events(match_id: str, request: Request, lastVersion: Optional[int] = None) -> Union[ApiResponse, Response]:
+    """Server-sent events replacing status polling: ``sync`` snapshots, then ``joined``,
+    ``progress``, ``questionFinished`` and ``finished``. Ids are match versions, so a
+    reconnect (``Last-Event-ID``) only resends a snapshot if something changed."""
+
+    def build():
+        state = battle_repo.get(match_id)
+        return to_sync_event(state) if state else None
+
+    def snapshot():
+        # Shared by every stream on this match; never older than the current version.
+        return match_snapshots.get(f"sync:{_channel(match_id)}", lambda: battle_repo.version(match_id), build, fresh_seconds=0)
+
+    current = snapshot()
+    if current is None:
+        return ApiResponse(ok=False, data=None, error=ApiError(code="MATCH_NOT_FOUND", message="matchId 不存在"))
+    return stream_response(request, event_broker, _channel(match_id), snapshot, last_version(request, lastVersion), current)
+
+
+@router.get("/{match_id}/spectate", response_model=ApiResponse)
+def spectate(match_id: str, request: Request, response: Response) -> Union[ApiResponse, Response]:
+    """Spectator view, no ``userId`` needed. Built once per match version and shared by
+    every viewer in the process; ``/events`` pushes the same match live."""
+
+    def build():
+        state = battle_repo.view(match_id, "")
+        return to_spectator_payload(state) if state else None
+
+    payload = match_snapshots.get(f"spectate:{_channel(match_id)}", lambda: battle_repo.version(match_id), build)
+    if payload is None:
+        return ApiResponse(ok=False, data=None, error=ApiError(code="MATCH_NOT_FOUND", message="matchId 不存在"))
+    cached = not_modified(request, payload["version"], "spectate")
+    if cached is not None:
+        return cached
+    tag_response(response, payload["version"], "spectate")
     return ApiResponse(ok=True, data=payload, error=None)
 
 
 @router.post("/{match_id}/submit", response_model=ApiResponse)
 def submit(match_id: str, req: SubmitBattleReq) -> ApiResponse:
     try:
-        result = battle_repo.update(match_id, lambda s: submit_guess(s, req.userId, req.guess))
+        result, state = battle_repo.update_player(match_id, req.userId, lambda s: (submit_guess(s, req.userId, req.guess), s))
+        publish(event_broker, _channel(match_id), *submit_events(state, req.userId, result))
+        if state.get("status") == "finished":
+            _rate(match_id)
     except KeyError:
         return ApiResponse(ok=False, data=None, error=ApiError(code="MATCH_NOT_FOUND", message="matchId 不存在"))
     except ValueError as e:
@@ -104,7 +184,12 @@ def submit(match_id: str, req: SubmitBattleReq) -> ApiResponse:
 
 
 @router.get("/{match_id}/result", response_model=ApiResponse)
-def result(match_id: str, userId: str) -> ApiResponse:
+def result(match_id: str, userId: str, request: Request) -> Union[ApiResponse, Response]:
+    """Final standings; once built, served from ``settled_cache`` without reading the match."""
+    key = f"battle:result:{match_id}:{userId}"
+    cached = settled_cache.respond(request, key)
+    if cached is not None:
+        return cached
     state = battle_repo.get(match_id)
     if not state:
         return ApiResponse(ok=False, data=None, error=ApiError(code="MATCH_NOT_FOUND", message="matchId 不存在"))
@@ -113,4 +198,4 @@ def result(match_id: str, userId: str) -> ApiResponse:
     except ValueError as e:
         code = str(e)
         return ApiResponse(ok=False, data=None, error=ApiError(code=code, message=code))
-    return ApiResponse(ok=True, data=payload, error=None)
+    return settled_cache.store(request, key, ApiResponse(ok=True, data=payload, error=None))
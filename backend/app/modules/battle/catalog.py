@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict
+
+from app.modules.handle.domain import HandResultData, get_hand
+
+# Hand data and hints for battle hand indices. New matches evaluate their hands once
+# through a question set (questions.py); entries are shared and must be treated as read-only.
+
+_HANDLE_HANDS_PATH = Path(__file__).resolve().parent.parent / "handle" / "assets" / "hands.txt"
+_WIND_MAP = {1: "东", 2: "南", 3: "西", 4: "北"}
+
+
+@lru_cache(maxsize=1)
+def hands_count() -> int:
+    if not _HANDLE_HANDS_PATH.exists():
+        raise RuntimeError(f"hands file not found: {_HANDLE_HANDS_PATH.as_posix()}")
+    with _HANDLE_HANDS_PATH.open("r", encoding="utf-8") as f:
+        lines = [ln.strip() for ln in f.readlines() if ln.strip()]
+    if not lines:
+        raise RuntimeError("hands file is empty")
+    return len(lines)
+
+
+@lru_cache(maxsize=4096)
+def hand_for(hand_index: int, mode: str) -> HandResultData:
+    return get_hand(hand_index=hand_index, rule_mode=mode)  # type: ignore[arg-type]
+
+
+def _wind_tip(round_wind: int, seat_wind: int) -> str:
+    seat = _WIND_MAP.get(seat_wind, "未知")
+    rnd = _WIND_MAP.get(round_wind, "未知")
+    return f"自风：{seat}，场风：{rnd}"
+
+
+def _strip_tip_prefix(tip: str) -> str:
+    if not tip:
+        return ""
+    return tip[3:] if tip.startswith("役种：") else tip
+
+
+@lru_cache(maxsize=4096)
+def _hint_items(hand_index: int, mode: str) -> tuple:
+    hand = hand_for(hand_index, mode)
+    return (
+        ("yakuTip", _strip_tip_prefix(hand.tip or "")),
+        ("hanTip", hand.han_tip or ""),
+        ("windTip", _wind_tip(int(hand.round_wind), int(hand.seat_wind))),
+        ("isTsumo", "自摸" if hand.tsumo else "荣和"),
+    )
+
+
+def hint_for(hand_index: int, mode: str) -> Dict[str, str]:
+    """The per-question hint shown to a player; the same before and after any guess."""
+    return dict(_hint_items(hand_index, mode))
@@ -3,126 +3,130 @@ from __future__ import annotations
 import random
 import time
 import uuid
-from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple
 
-from app.modules.handle.domain import evaluate_guess, new_game
-from app.modules.handle.repo import game_from_dict, game_to_dict
+from app.modules.battle.catalog import hand_for, hands_count, hint_for
+from app.modules.battle.questions import load_question_set, resolve_question_set
+from app.modules.handle.domain import GameState, HandResultData, UserProgress, evaluate_guess
 
 ModeType = str
 
-_HANDLE_HANDS_PATH = Path(__file__).resolve().parent.parent / "handle" / "assets" / "hands.txt"
-_WIND_MAP = {1: "东", 2: "南", 3: "西", 4: "北"}
+MAX_PLAYERS = 100
+# Status payloads carry the caller, the top TOP_K and NEIGHBOURS players either side of the caller.
+TOP_K = 10
+NEIGHBOURS = 2
 
 
-def _wind_tip(round_wind: int, seat_wind: int) -> str:
-    seat = _WIND_MAP.get(seat_wind, "未知")
-    rnd = _WIND_MAP.get(round_wind, "未知")
-    return f"自风：{seat}，场风：{rnd}"
-
-
-def _is_tsumo_text(is_tsumo: bool) -> str:
-    return "自摸" if is_tsumo else "荣和"
-
-
-def _strip_tip_prefix(tip: str) -> str:
-    if not tip:
-        return ""
-    return tip[3:] if tip.startswith("役种：") else tip
+def _pick_hand_indices(question_count: int, total_hands: int) -> List[int]:
+    if question_count <= total_hands:
+        return random.sample(range(total_hands), question_count)
+    return [random.randint(0, total_hands - 1) for _ in range(question_count)]
 
 
-def _build_hint(*, tip: str, han_tip: str, round_wind: int, seat_wind: int, tsumo: bool) -> Dict[str, str]:
+def _new_player_progress() -> Dict[str, Any]:
+    # Only the question position and this question's guesses are stored; the hand
+    # itself comes from the match's shared question set.
+    now = time.time()
     return {
-        "yakuTip": _strip_tip_prefix(tip),
-        "hanTip": han_tip or "",
-        "windTip": _wind_tip(round_wind, seat_wind),
-        "isTsumo": _is_tsumo_text(tsumo),
+        "joinedAt": now,
+        "finished": False,
+        "finishedAt": None,
+        "currentQuestion": 0,
+        "questionScores": [],
+        "totalScore": 0,
+        "questionStartedAt": now,
+        "guesses": [],
     }
 
 
-def _hint_from_game(game: Any) -> Dict[str, str]:
-    hand = getattr(game, "hand", None)
-    if hand is None:
-        return {"yakuTip": "", "hanTip": "", "windTip": "", "isTsumo": ""}
-    return _build_hint(
-        tip=getattr(hand, "tip", "") or "",
-        han_tip=getattr(hand, "han_tip", "") or "",
-        round_wind=int(getattr(hand, "round_wind", 1)),
-        seat_wind=int(getattr(hand, "seat_wind", 1)),
-        tsumo=bool(getattr(hand, "tsumo", False)),
-    )
+def _compact_progress(progress: Dict[str, Any], user_id: str) -> Dict[str, Any]:
+    """Convert progress stored with an embedded handle ``currentGame`` to the compact form."""
+    game = progress.pop("currentGame", None)
+    progress.pop("currentHint", None)
+    if "guesses" in progress:
+        return progress
+    started_at = None
+    guesses: List[str] = []
+    if isinstance(game, dict):
+        raw = game.get("created_at", game.get("createdAt"))
+        started_at = float(raw) if raw is not None else None
+        user = (game.get("users") or {}).get(user_id) or {}
+        for entry in user.get("history") or []:
+            guesses.append("".join(entry.get("guess_tiles_14") or entry.get("guessTiles14") or []))
+    if started_at is None and not progress.get("finished"):
+        started_at = progress.get("joinedAt")
+    progress["questionStartedAt"] = started_at
+    progress["guesses"] = guesses
+    return progress
+
+
+def _player(state: Dict[str, Any], user_id: str) -> Dict[str, Any]:
+    players = state.get("players", {})
+    if user_id not in players:
+        raise ValueError("USER_NOT_IN_MATCH")
+    return _compact_progress(players[user_id], user_id)
 
 
-def _current_game_created_at(progress: Dict[str, Any]) -> Optional[float]:
-    current_game = progress.get("currentGame")
-    if not isinstance(current_game, dict):
-        return None
-    raw = current_game.get("created_at", current_game.get("createdAt"))
-    if raw is None:
-        return None
-    try:
-        return float(raw)
-    except Exception:
-        return None
+def _question(state: Dict[str, Any], question: int) -> Tuple[HandResultData, Dict[str, str]]:
+    """Hand and hint of one question: from the shared question set, or straight from the
+    catalog for matches created before question sets existed."""
+    mode = state.get("mode", "normal")
+    set_id = state.get("questionSetId")
+    if set_id:
+        entry = load_question_set(set_id, mode, state["questionHandIndices"]).questions[question]
+        return entry.hand, entry.hint_dict()
+    hand_index = state["questionHandIndices"][question]
+    return hand_for(hand_index, mode), hint_for(hand_index, mode)
 
 
-def _load_hands_count() -> int:
-    if not _HANDLE_HANDS_PATH.exists():
-        raise RuntimeError(f"hands file not found: {_HANDLE_HANDS_PATH.as_posix()}")
-    with _HANDLE_HANDS_PATH.open("r", encoding="utf-8") as f:
-        lines = [ln.strip() for ln in f.readlines() if ln.strip()]
-    if not lines:
-        raise RuntimeError("hands file is empty")
-    return len(lines)
+def _current_hint(state: Dict[str, Any], progress: Dict[str, Any]) -> Optional[Dict[str, str]]:
+    question = int(progress.get("currentQuestion", 0))
+    if progress.get("finished") or question >= int(state.get("questionCount", 0)):
+        return None
+    return _question(state, question)[1]
 
 
-def _pick_hand_indices(question_count: int, total_hands: int) -> List[int]:
-    if question_count <= total_hands:
-        return random.sample(range(total_hands), question_count)
-    return [random.randint(0, total_hands - 1) for _ in range(question_count)]
+def _question_game(state: Dict[str, Any], user_id: str, progress: Dict[str, Any]) -> GameState:
+    """A throwaway handle game for the current question, sharing the question set's hand."""
+    question = int(progress.get("currentQuestion", 0))
+    mode = state.get("mode", "normal")
+    return GameState(
+        game_id=state["matchId"],
+        created_at=float(progress.get("questionStartedAt") or progress.get("joinedAt") or time.time()),
+        max_guess=int(state.get("maxGuess", 6)),
+        rule_mode=mode,  # type: ignore[arg-type]
+        hand=_question(state, question)[0],
+        users={user_id: UserProgress(hit_count_valid=len(progress.get("guesses", [])))},
+    )
 
 
-def _new_player_progress(*, mode: ModeType, hand_index: int, max_guess: int) -> Dict[str, Any]:
-    game = new_game(hand_index=hand_index, max_guess=max_guess, rule_mode=mode)  # type: ignore[arg-type]
-    return {
-        "joinedAt": time.time(),
-        "finished": False,
-        "finishedAt": None,
-        "currentQuestion": 0,
-        "questionScores": [],
-        "totalScore": 0,
-        "currentGame": game_to_dict(game),
-        "currentHint": _hint_from_game(game),
-    }
+def _ranking(players: Dict[str, Any]) -> List[Tuple[str, int]]:
+    """(userId, totalScore) best first; equal scores order by userId descending, like ZREVRANGE."""
+    entries = [(int(p.get("totalScore", 0)), pid) for pid, p in players.items()]
+    return [(pid, score) for score, pid in sorted(entries, reverse=True)]
 
 
 def _refresh_match_status(state: Dict[str, Any]) -> None:
+    """Finished once every player has finished; the top score wins, a tie at the top is a draw."""
     players = state.get("players", {})
-    player_ids = list(players.keys())
-    if len(player_ids) < 2:
+    if len(players) < 2:
         state["status"] = "waiting"
         state["winnerUserId"] = None
         return
 
-    p1 = players[player_ids[0]]
-    p2 = players[player_ids[1]]
-    both_finished = bool(p1.get("finished")) and bool(p2.get("finished"))
-    state["status"] = "finished" if both_finished else "playing"
+    all_finished = all(bool(p.get("finished")) for p in players.values())
+    state["status"] = "finished" if all_finished else "playing"
 
-    if not both_finished:
+    if not all_finished:
         state["winnerUserId"] = None
         return
 
-    s1 = int(p1.get("totalScore", 0))
-    s2 = int(p2.get("totalScore", 0))
-    if s1 == s2:
+    (leader, best), (_, runner_up) = _ranking(players)[:2]
+    if best == runner_up:
         state["winnerUserId"] = None
         state["isDraw"] = True
-    elif s1 > s2:
-        state["winnerUserId"] = player_ids[0]
-        state["isDraw"] = False
     else:
-        state["winnerUserId"] = player_ids[1]
+        state["winnerUserId"] = leader
         state["isDraw"] = False
 
 
@@ -132,9 +136,11 @@ def create_battle(
     mode: ModeType,
     question_count: int,
     max_guess: int = 6,
+    max_players: int = 2,
 ) -> Dict[str, Any]:
-    total_hands = _load_hands_count()
-    indices = _pick_hand_indices(question_count, total_hands)
+    indices = _pick_hand_indices(question_count, hands_count())
+    # Every hand, fan count and hint is evaluated here, once per match.
+    questions = resolve_question_set(mode, indices)
 
     state = {
         "matchId": uuid.uuid4().hex,
@@ -142,12 +148,16 @@ def create_battle(
         "mode": mode,
         "questionCount": question_count,
         "maxGuess": max_guess,
+        "maxPlayers": max(2, min(int(max_players), MAX_PLAYERS)),
         "questionHandIndices": indices,
+        "questionSetId": questions.set_id,
         "status": "waiting",
         "winnerUserId": None,
         "isDraw": False,
+        # Bumped by the repo on every write; event ids and resume points for streams.
+        "version": 0,
         "players": {
-            creator_user_id: _new_player_progress(mode=mode, hand_index=indices[0], max_guess=max_guess),
+            creator_user_id: _new_player_progress(),
         },
     }
     return state
@@ -157,41 +167,32 @@ def join_battle(state: Dict[str, Any], user_id: str) -> Dict[str, Any]:
     players = state.setdefault("players", {})
     if user_id in players:
         return state
-    if len(players) >= 2:
+    if len(players) >= int(state.get("maxPlayers", 2)):
         raise ValueError("MATCH_FULL")
+    if state.get("status") == "finished":
+        raise ValueError("MATCH_FINISHED")
 
-    indices: List[int] = state["questionHandIndices"]
-    players[user_id] = _new_player_progress(
-        mode=state["mode"],
-        hand_index=indices[0],
-        max_guess=int(state.get("maxGuess", 6)),
-    )
+    players[user_id] = _new_player_progress()
     _refresh_match_status(state)
     return state
 
 
 def submit_guess(state: Dict[str, Any], user_id: str, guess: str) -> Dict[str, Any]:
-    players = state.get("players", {})
-    if user_id not in players:
-        raise ValueError("USER_NOT_IN_MATCH")
-
-    progress = players[user_id]
+    progress = _player(state, user_id)
     if progress.get("finished"):
         raise ValueError("PLAYER_FINISHED")
 
-    current_game_dict = progress.get("currentGame")
-    if not current_game_dict:
+    question_index = int(progress.get("currentQuestion", 0))
+    if question_index >= int(state["questionCount"]):
         raise ValueError("QUESTION_NOT_READY")
 
-    game = game_from_dict(current_game_dict)
+    game = _question_game(state, user_id, progress)
     ok, err = evaluate_guess(game=game, user_id=user_id, guess_str=guess)
     if err is not None:
         raise ValueError(err.code.value)
 
     assert ok is not None
-    progress["currentGame"] = game_to_dict(game)
-
-    question_index = int(progress.get("currentQuestion", 0))
+    progress["guesses"].append("".join(ok.guess_tiles_14))
     question_finished = bool(ok.finish)
 
     if question_finished:
@@ -202,29 +203,14 @@ def submit_guess(state: Dict[str, Any], user_id: str, guess: str) -> Dict[str, A
 
         next_question = question_index + 1
         progress["currentQuestion"] = next_question
+        progress["guesses"] = []
 
         if next_question >= int(state["questionCount"]):
             progress["finished"] = True
             progress["finishedAt"] = time.time()
-            progress["currentGame"] = None
-            progress["currentHint"] = None
+            progress["questionStartedAt"] = None
         else:
-            next_hand_index = state["questionHandIndices"][next_question]
-            next_game = new_game(
-                hand_index=next_hand_index,
-                max_guess=int(state.get("maxGuess", 6)),
-                rule_mode=state["mode"],  # type: ignore[arg-type]
-            )
-            progress["currentGame"] = game_to_dict(next_game)
-            progress["currentHint"] = _hint_from_game(next_game)
-    else:
-        progress["currentHint"] = _build_hint(
-            tip=ok.tip,
-            han_tip=ok.han_tip,
-            round_wind=int(getattr(game.hand, "round_wind", 1)),
-            seat_wind=int(getattr(game.hand, "seat_wind", 1)),
-            tsumo=bool(getattr(game.hand, "tsumo", False)),
-        )
+            progress["questionStartedAt"] = time.time()
 
     _refresh_match_status(state)
 
@@ -241,17 +227,13 @@ def submit_guess(state: Dict[str, Any], user_id: str, guess: str) -> Dict[str, A
             "win": ok.win,
             "createdAt": ok.created_at,
             "score": ok.score,
-            "hint": progress.get("currentHint"),
+            "hint": _current_hint(state, progress),
         },
     }
 
 
 def enter_battle(state: Dict[str, Any], user_id: str) -> Dict[str, Any]:
-    players = state.get("players", {})
-    if user_id not in players:
-        raise ValueError("USER_NOT_IN_MATCH")
-
-    progress = players[user_id]
+    progress = _player(state, user_id)
     if progress.get("finished"):
         return state
 
@@ -260,55 +242,69 @@ def enter_battle(state: Dict[str, Any], user_id: str) -> Dict[str, Any]:
     if current_question >= question_count:
         return state
 
-    current_game_dict = progress.get("currentGame")
-    if not current_game_dict:
-        return state
-
-    game = game_from_dict(current_game_dict)
-    game_users = getattr(game, "users", {}) or {}
-    user_progress = game_users.get(user_id)
-    hit_count_valid = int(getattr(user_progress, "hit_count_valid", 0) or 0) if user_progress else 0
-
     # Only reset the first-question timer when the player has not submitted any valid guess yet.
-    if current_question == 0 and hit_count_valid == 0:
-        hand_index = state["questionHandIndices"][0]
-        next_game = new_game(
-            hand_index=hand_index,
-            max_guess=int(state.get("maxGuess", 6)),
-            rule_mode=state.get("mode", "normal"),  # type: ignore[arg-type]
-        )
-        progress["currentGame"] = game_to_dict(next_game)
-        progress["currentHint"] = _hint_from_game(next_game)
+    if current_question == 0 and not progress.get("guesses"):
+        progress["questionStartedAt"] = time.time()
 
     progress["enteredAt"] = time.time()
     return state
 
 
+def scoreboard_view(state: Dict[str, Any], user_id: str, top_k: int = TOP_K, radius: int = NEIGHBOURS) -> Dict[str, Any]:
+    """Top ``top_k`` and the caller's neighbours, from a fully loaded match.
+
+    Repos answer the same shape from their incrementally kept scoreboard without loading
+    every player (``state["scoreboard"]``); this is the fallback for a full state.
+    """
+    ranking = _ranking(state.get("players", {}))
+    rank = next((i for i, (pid, _) in enumerate(ranking) if pid == user_id), None)
+    around = ranking[max(0, rank - radius):rank + radius + 1] if rank is not None else []
+    return {"count": len(ranking), "rank": rank, "top": ranking[:top_k], "around": around, "aroundStart": max(0, (rank or 0) - radius)}
+
+
+def _board_entries(state: Dict[str, Any], entries: List[Tuple[str, int]], start: int) -> List[Dict[str, Any]]:
+    players = state.get("players", {})
+    return [
+        {"rank": start + i + 1, **_player_summary(pid, _compact_progress(players[pid], pid))}
+        for i, (pid, _) in enumerate(entries)
+        if pid in players
+    ]
+
+
 def to_status_payload(state: Dict[str, Any], user_id: str) -> Dict[str, Any]:
+    """The caller's view: their own progress, ``opponent`` (the best-placed other player,
+    i.e. the opponent in a two-player match) and a ``leaderboard`` of the top players and
+    the caller's neighbours. Only those players are read, so the cost does not grow with
+    the room size when ``state`` comes from ``BattleRepo.view``."""
     players = state.get("players", {})
-    me = players.get(user_id)
-    if not me:
-        raise ValueError("USER_NOT_IN_MATCH")
+    me = _player(state, user_id)
+    board = state.get("scoreboard") or scoreboard_view(state, user_id)
 
-    opp_id = next((pid for pid in players.keys() if pid != user_id), None)
-    opp = players.get(opp_id) if opp_id else None
-    me_created_at = _current_game_created_at(me)
-    opp_created_at = _current_game_created_at(opp or {})
+    opp_id = next((pid for pid, _ in board["top"] if pid != user_id), None)
+    opp = _player(state, opp_id) if opp_id in players else None
 
     return {
         "matchId": state["matchId"],
         "status": state.get("status", "waiting"),
+        "version": int(state.get("version", 0)),
         "mode": state.get("mode", "normal"),
         "questionCount": int(state.get("questionCount", 0)),
         "maxGuess": int(state.get("maxGuess", 6)),
+        "maxPlayers": int(state.get("maxPlayers", 2)),
+        "playerCount": int(board["count"]),
+        "leaderboard": {
+            "top": _board_entries(state, board["top"], 0),
+            "around": _board_entries(state, board["around"], board["aroundStart"]),
+        },
         "my": {
             "userId": user_id,
             "currentQuestion": int(me.get("currentQuestion", 0)),
             "totalScore": int(me.get("totalScore", 0)),
             "finished": bool(me.get("finished", False)),
             "questionScores": me.get("questionScores", []),
-            "currentHint": me.get("currentHint"),
-            "currentGameCreatedAt": me_created_at,
+            "currentHint": _current_hint(state, me),
+            "currentGameCreatedAt": me.get("questionStartedAt"),
+            "rank": board["rank"] + 1 if board["rank"] is not None else None,
         },
         "opponent": {
             "userId": opp_id,
@@ -316,12 +312,31 @@ def to_status_payload(state: Dict[str, Any], user_id: str) -> Dict[str, Any]:
             "totalScore": int((opp or {}).get("totalScore", 0)),
             "finished": bool((opp or {}).get("finished", False)),
             "questionScores": (opp or {}).get("questionScores", []),
-            "currentHint": (opp or {}).get("currentHint"),
-            "currentGameCreatedAt": opp_created_at,
+            "currentHint": _current_hint(state, opp) if opp else None,
+            "currentGameCreatedAt": (opp or {}).get("questionStartedAt"),
         } if opp_id else None,
     }
 
 
+def to_spectator_payload(state: Dict[str, Any]) -> Dict[str, Any]:
+    """What anyone may see without joining: settings, the top of the leaderboard and the
+    result, but no hints. ``state`` comes from ``BattleRepo.view`` without a caller, so
+    only the top players are read."""
+    board = state.get("scoreboard") or scoreboard_view(state, "")
+    return {
+        "matchId": state["matchId"],
+        "status": state.get("status", "waiting"),
+        "version": int(state.get("version", 0)),
+        "mode": state.get("mode", "normal"),
+        "questionCount": int(state.get("questionCount", 0)),
+        "maxPlayers": int(state.get("maxPlayers", 2)),
+        "playerCount": int(board["count"]),
+        "winnerUserId": state.get("winnerUserId"),
+        "isDraw": bool(state.get("isDraw", False)),
+        "leaderboard": _board_entries(state, board["top"], 0),
+    }
+
+
 def to_result_payload(state: Dict[str, Any], user_id: str) -> Dict[str, Any]:
     players = state.get("players", {})
     if user_id not in players:
@@ -346,3 +361,68 @@ def to_result_payload(state: Dict[str, Any], user_id: str) -> Dict[str, Any]:
             for pid, p in players.items()
         ],
     }
+
+
+def final_scores(state: Dict[str, Any]) -> Tuple[Dict[str, int], float]:
+    """Total score per player and the time the last player finished, for rating a finished match."""
+    players = state.get("players", {})
+    scores = {pid: int(p.get("totalScore", 0)) for pid, p in players.items()}
+    finished_at = max((float(p.get("finishedAt") or 0) for p in players.values()), default=0.0)
+    return scores, finished_at or time.time()
+
+
+def _player_summary(user_id: str, progress: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "userId": user_id,
+        "currentQuestion": int(progress.get("currentQuestion", 0)),
+        "totalScore": int(progress.get("totalScore", 0)),
+        "finished": bool(progress.get("finished", False)),
+    }
+
+
+def to_sync_event(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Compact whole-match snapshot sent when a stream opens or has to catch up."""
+    return {
+        "type": "sync",
+        "matchId": state["matchId"],
+        "version": int(state.get("version", 0)),
+        "status": state.get("status", "waiting"),
+        "winnerUserId": state.get("winnerUserId"),
+        "isDraw": bool(state.get("isDraw", False)),
+        "players": [_player_summary(pid, _compact_progress(p, pid)) for pid, p in state.get("players", {}).items()],
+    }
+
+
+def _finished_event(state: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "type": "finished",
+        "version": int(state.get("version", 0)),
+        "status": "finished",
+        "winnerUserId": state.get("winnerUserId"),
+        "isDraw": bool(state.get("isDraw", False)),
+    }
+
+
+def join_events(state: Dict[str, Any], user_id: str) -> List[Dict[str, Any]]:
+    return [{
+        "type": "joined",
+        "version": int(state.get("version", 0)),
+        "status": state.get("status", "waiting"),
+        **_player_summary(user_id, _player(state, user_id)),
+    }]
+
+
+def submit_events(state: Dict[str, Any], user_id: str, result: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """What the other side needs after a guess: ``progress`` (one more guess on the same
+    question), ``questionFinished``, and ``finished`` once the whole match is settled."""
+    progress = _player(state, user_id)
+    events = [{
+        "type": "questionFinished" if result["questionFinished"] else "progress",
+        "version": int(state.get("version", 0)),
+        "questionIndex": result["questionIndex"],
+        "guesses": len(progress.get("guesses", [])),
+        **_player_summary(user_id, progress),
+    }]
+    if state.get("status") == "finished":
+        events.append(_finished_event(state))
+    return events
@@ -0,0 +1,225 @@
+"""Immutable battle question sets, resolved once when a match is created.
+
+A set holds every question of a match: the evaluated hand (guobiao fans included)
+and the hint. Matches only reference ``questionSetId``, derived from the mode and
+hand indices, so matches dealt the same hands share one set. Sets are loaded
+through a process-level LRU like nonogram puzzles, so moving on to the next
+question on the submit path is a tuple lookup.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional, Protocol, Sequence, Tuple
+
+import redis
+
+from app.modules.battle.catalog import hand_for, hint_for
+from app.modules.handle.domain import HandResultData
+
+
+@dataclass(frozen=True)
+class Question:
+    hand_index: int
+    hand: HandResultData
+    hint: Tuple[Tuple[str, str], ...]
+
+    def hint_dict(self) -> Dict[str, str]:
+        return dict(self.hint)
+
+
+@dataclass(frozen=True)
+class QuestionSet:
+    set_id: str
+    mode: str
+    questions: Tuple[Question, ...]
+
+    @property
+    def hand_indices(self) -> List[int]:
+        return [q.hand_index for q in self.questions]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "questionSetId": self.set_id,
+            "mode": self.mode,
+            "questions": [{"handIndex": q.hand_index, "hand": asdict(q.hand), "hint": dict(q.hint)} for q in self.questions],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "QuestionSet":
+        return cls(
+            set_id=data["questionSetId"],
+            mode=data.get("mode", "normal"),
+            questions=tuple(
+                Question(hand_index=int(q["handIndex"]), hand=HandResultData(**q["hand"]), hint=tuple(q["hint"].items()))
+                for q in data["questions"]
+            ),
+        )
+
+
+def question_set_id(mode: str, hand_indices: Sequence[int]) -> str:
+    digest = hashlib.blake2b(digest_size=8)
+    digest.update(mode.encode())
+    digest.update(",".join(str(int(i)) for i in hand_indices).encode())
+    return digest.hexdigest()
+
+
+def _resolve_question(task: Tuple[int, str]) -> Question:
+    """Worker task: evaluate one hand and its hint."""
+    hand_index, mode = task
+    return Question(hand_index=hand_index, hand=hand_for(hand_index, mode), hint=tuple(hint_for(hand_index, mode).items()))
+
+
+class QuestionSetStore(Protocol):
+    def put(self, question_set: QuestionSet) -> None: ...
+    def get(self, set_id: str) -> Optional[QuestionSet]: ...
+    def touch(self, set_id: str) -> None: ...
+
+
+class MemoryQuestionSetStore:
+    def __init__(self, ttl: int = 86400):
+        self.ttl = ttl
+        self.store: Dict[str, Tuple[float, QuestionSet]] = {}
+        self._puts = 0
+
+    def put(self, question_set: QuestionSet) -> None:
+        now = time.time()
+        self.store[question_set.set_id] = (now, question_set)
+        self._puts += 1
+        if self._puts % 256 == 0:
+            for set_id, (stored_at, _) in list(self.store.items()):
+                if now - stored_at > self.ttl:
+                    self.store.pop(set_id, None)
+
+    def get(self, set_id: str) -> Optional[QuestionSet]:
+        value = self.store.get(set_id)
+        return value[1] if value else None
+
+    def touch(self, set_id: str) -> None:
+        value = self.store.get(set_id)
+        if value:
+            self.store[set_id] = (time.time(), value[1])
+
+
+class RedisQuestionSetStore:
+    def __init__(self, url: str, ttl: int, key_prefix: str = "mh:v1:battle-questions"):
+        self.redis = redis.Redis.from_url(url, decode_responses=True)
+        self.ttl = ttl
+        self.key_prefix = key_prefix
+
+    def key(self, set_id: str) -> str:
+        return f"{self.key_prefix}:{set_id}"
+
+    def put(self, question_set: QuestionSet) -> None:
+        # Content never changes; a re-dealt set only gets its expiry extended.
+        key = self.key(question_set.set_id)
+        pipe = self.redis.pipeline()
+        pipe.set(key, json.dumps(question_set.to_dict(), ensure_ascii=False, separators=(",", ":")), nx=True, ex=self.ttl)
+        pipe.expire(key, self.ttl)
+        pipe.execute()
+
+    def get(self, set_id: str) -> Optional[QuestionSet]:
+        raw = self.redis.get(self.key(set_id))
+        return QuestionSet.from_dict(json.loads(raw)) if raw else None
+
+    def touch(self, set_id: str) -> None:
+        self.redis.expire(self.key(set_id), self.ttl)
+
+
+def create_question_set_store_from_env() -> QuestionSetStore:
+    # Sets outlive any single match that uses them.
+    ttl = int(os.getenv("GAME_TTL_SECONDS", "86400")) * 2
+    if os.getenv("GAME_REPO", "memory").lower() == "redis":
+        return RedisQuestionSetStore(os.getenv("REDIS_URL", "redis://localhost:6379/0"), ttl)
+    return MemoryQuestionSetStore(ttl)
+
+
+_CACHE_SIZE = int(os.getenv("BATTLE_QUESTION_CACHE_SIZE", "1024"))
+# Store expiry is refreshed at most this often per set and process.
+_TOUCH_INTERVAL = int(os.getenv("BATTLE_QUESTION_TOUCH_SECONDS", "600"))
+# Hands are evaluated in this many worker processes; 1 evaluates them in the request.
+_WORKERS = int(os.getenv("BATTLE_QUESTION_WORKERS", "1"))
+_cache: "OrderedDict[str, QuestionSet]" = OrderedDict()
+_touched: "OrderedDict[str, float]" = OrderedDict()
+_cache_lock = threading.Lock()
+_store: Optional[QuestionSetStore] = None
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def question_set_store() -> QuestionSetStore:
+    global _store
+    if _store is None:
+        _store = create_question_set_store_from_env()
+    return _store
+
+
+def _executor() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=_WORKERS)
+        return _pool
+
+
+def shutdown() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def _remember(question_set: QuestionSet) -> None:
+    with _cache_lock:
+        _cache[question_set.set_id] = question_set
+        _cache.move_to_end(question_set.set_id)
+        while len(_cache) > _CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def resolve_question_set(mode: str, hand_indices: Sequence[int]) -> QuestionSet:
+    """Evaluate every question of a match, in the worker pool when configured, and store the set."""
+    tasks = [(int(i), mode) for i in hand_indices]
+    if _WORKERS > 1 and len(tasks) > 1:
+        questions = tuple(_executor().map(_resolve_question, tasks))
+    else:
+        questions = tuple(_resolve_question(task) for task in tasks)
+    question_set = QuestionSet(set_id=question_set_id(mode, hand_indices), mode=mode, questions=questions)
+    question_set_store().put(question_set)
+    _remember(question_set)
+    return question_set
+
+
+def touch_question_set(set_id: str) -> None:
+    now = time.monotonic()
+    with _cache_lock:
+        last = _touched.get(set_id)
+        if last is not None and now - last < _TOUCH_INTERVAL:
+            return
+        _touched[set_id] = now
+        _touched.move_to_end(set_id)
+        while len(_touched) > _CACHE_SIZE:
+            _touched.popitem(last=False)
+    question_set_store().touch(set_id)
+
+
+def load_question_set(set_id: str, mode: str, hand_indices: Sequence[int]) -> QuestionSet:
+    """The set behind a match; re-resolved from the hand indices if the stored copy expired."""
+    with _cache_lock:
+        question_set = _cache.get(set_id)
+        if question_set is not None:
+            _cache.move_to_end(set_id)
+    if question_set is None:
+        question_set = question_set_store().get(set_id)
+        if question_set is None:
+            return resolve_question_set(mode, hand_indices)
+        _remember(question_set)
+    touch_question_set(set_id)
+    return question_set
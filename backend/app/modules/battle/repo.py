@@ -1,12 +1,17 @@
 from __future__ import annotations
 
+import copy
 import json
 import os
+import threading
 import time
-from typing import Callable, Dict, Optional, Protocol, TypeVar
+from typing import Any, Callable, Dict, List, Optional, Protocol, Tuple, TypeVar
 
 import redis
 
+from app.modules.battle.domain import NEIGHBOURS, TOP_K, _compact_progress, _ranking, _refresh_match_status
+from app.modules.common.scoreboard import Scoreboard
+
 T = TypeVar("T")
 
 
@@ -16,15 +21,38 @@ class BattleRepo(Protocol):
     def save(self, match_id: str, state: dict) -> None: ...
     def delete(self, match_id: str) -> None: ...
     def update(self, match_id: str, updater: Callable[[dict], T]) -> T: ...
+    def update_player(self, match_id: str, user_id: str, updater: Callable[[dict], T]) -> T: ...
+    def view(self, match_id: str, user_id: str, top_k: int = TOP_K, radius: int = NEIGHBOURS) -> Optional[dict]: ...
+    def version(self, match_id: str) -> Optional[int]: ...
     def ping(self) -> bool: ...
     @property
     def repo_type(self) -> str: ...
 
 
+def _scoreboard(players: Optional[Dict[str, Any]]) -> Scoreboard:
+    return Scoreboard(_ranking(players or {}))
+
+
+def _board(count: int, rank: Optional[int], top: List[Tuple[str, int]], around: List[Tuple[str, int]], start: int) -> Dict[str, Any]:
+    return {"count": count, "rank": rank, "top": top, "around": around, "aroundStart": start}
+
+
 class InMemoryBattleRepo:
+    """Per-player write path mirroring the Redis layout.
+
+    ``update_player`` runs the updater on a private copy of that player's progress under
+    that player's lock, then swaps it in and re-derives the match status under a short
+    per-match lock, so players never block on or overwrite each other. A per-match
+    ``Scoreboard`` is kept in step with every write for ``view``.
+    """
+
     def __init__(self, ttl_seconds: int = 24 * 3600):
         self._ttl = ttl_seconds
         self._store: Dict[str, tuple[float, dict]] = {}
+        self._lock = threading.Lock()
+        self._match_locks: Dict[str, threading.RLock] = {}
+        self._player_locks: Dict[str, Dict[str, threading.RLock]] = {}
+        self._boards: Dict[str, Scoreboard] = {}
 
     @property
     def repo_type(self) -> str:
@@ -34,12 +62,21 @@ class InMemoryBattleRepo:
         now = time.time()
         expired = [mid for mid, (ts, _) in self._store.items() if now - ts > self._ttl]
         for mid in expired:
-            self._store.pop(mid, None)
+            self.delete(mid)
+
+    def _match_lock(self, match_id: str) -> threading.RLock:
+        with self._lock:
+            return self._match_locks.setdefault(match_id, threading.RLock())
+
+    def _player_lock(self, match_id: str, user_id: str) -> threading.RLock:
+        with self._lock:
+            return self._player_locks.setdefault(match_id, {}).setdefault(user_id, threading.RLock())
 
     def create(self, initial: dict) -> dict:
         self._gc()
         mid = initial["matchId"]
         self._store[mid] = (time.time(), initial)
+        self._boards[mid] = _scoreboard(initial.get("players"))
         return initial
 
     def get(self, match_id: str) -> Optional[dict]:
@@ -49,62 +86,366 @@ class InMemoryBattleRepo:
 
     def save(self, match_id: str, state: dict) -> None:
         self._store[match_id] = (time.time(), state)
+        self._boards[match_id] = _scoreboard(state.get("players"))
 
     def delete(self, match_id: str) -> None:
         self._store.pop(match_id, None)
+        self._boards.pop(match_id, None)
+        with self._lock:
+            self._match_locks.pop(match_id, None)
+            self._player_locks.pop(match_id, None)
 
     def update(self, match_id: str, updater: Callable[[dict], T]) -> T:
+        with self._match_lock(match_id):
+            state = self.get(match_id)
+            if state is None:
+                raise KeyError("MATCH_NOT_FOUND")
+            result = updater(state)
+            state["version"] = int(state.get("version", 0)) + 1
+            self.save(match_id, state)
+            return result
+
+    def update_player(self, match_id: str, user_id: str, updater: Callable[[dict], T]) -> T:
+        with self._player_lock(match_id, user_id):
+            with self._match_lock(match_id):
+                state = self.get(match_id)
+                if state is None:
+                    raise KeyError("MATCH_NOT_FOUND")
+                # Only this player's progress is copied; the updater must not rely on the others.
+                players = state.get("players", {})
+                snapshot = {**state, "players": {user_id: copy.deepcopy(players[user_id])} if user_id in players else {}}
+            result = updater(snapshot)
+            progress = snapshot["players"].get(user_id)
+            if progress is None:
+                raise ValueError("USER_NOT_IN_MATCH")
+            with self._match_lock(match_id):
+                state = self.get(match_id)
+                if state is None:
+                    raise KeyError("MATCH_NOT_FOUND")
+                state["players"][user_id] = progress
+                _refresh_match_status(state)
+                state["version"] = int(state.get("version", 0)) + 1
+                self._store[match_id] = (time.time(), state)
+                self._boards.setdefault(match_id, Scoreboard()).set(user_id, int(progress.get("totalScore", 0)))
+                snapshot.update(
+                    status=state["status"],
+                    winnerUserId=state.get("winnerUserId"),
+                    isDraw=state.get("isDraw", False),
+                    version=state["version"],
+                )
+            return result
+
+    def view(self, match_id: str, user_id: str, top_k: int = TOP_K, radius: int = NEIGHBOURS) -> Optional[dict]:
+        with self._match_lock(match_id):
+            state = self.get(match_id)
+            if state is None:
+                return None
+            board = self._boards.get(match_id) or _scoreboard(state.get("players"))
+            rank = board.rank(user_id)
+            start = max(0, (rank or 0) - radius)
+            around = board.range(start, rank + radius) if rank is not None else []
+            top = board.range(0, top_k - 1)
+            players = state.get("players", {})
+            named = [user_id] + [uid for uid, _ in top + around]
+            return {
+                **state,
+                "players": {uid: players[uid] for uid in named if uid in players},
+                "scoreboard": _board(len(board), rank, top, around, start),
+            }
+
+    def version(self, match_id: str) -> Optional[int]:
         state = self.get(match_id)
-        if state is None:
-            raise KeyError("MATCH_NOT_FOUND")
-        result = updater(state)
-        self.save(match_id, state)
-        return result
+        return int(state.get("version", 0)) if state is not None else None
 
     def ping(self) -> bool:
         return True
 
 
+# Writes one player's progress, updates the scoreboard and finished counter, and derives the
+# match status from those alone: finished once every player has, the top score wins and a
+# tie at the top is a draw. This is domain._refresh_match_status; tests compare the two.
+# KEYS: meta hash, this player's hash, scoreboard sorted set.
+# ARGV: expected player rev, ttl, user id, then field/value pairs.
+_PLAYER_SCRIPT = """
+local meta, player, scores = KEYS[1], KEYS[2], KEYS[3]
+if redis.call('EXISTS', meta) == 0 then return {0, 'MATCH_NOT_FOUND'} end
+if (redis.call('HGET', player, 'rev') or '0') ~= ARGV[1] then return {0, 'CONFLICT'} end
+local ttl = tonumber(ARGV[2])
+local was_finished = redis.call('HGET', player, 'finished') == '1'
+for i = 4, #ARGV, 2 do
+  redis.call('HSET', player, ARGV[i], ARGV[i + 1])
+end
+redis.call('HINCRBY', player, 'rev', 1)
+local is_finished = redis.call('HGET', player, 'finished') == '1'
+if is_finished ~= was_finished then
+  redis.call('HINCRBY', meta, 'finishedCount', is_finished and 1 or -1)
+end
+redis.call('ZADD', scores, tonumber(redis.call('HGET', player, 'totalScore') or '0'), ARGV[3])
+local count = redis.call('ZCARD', scores)
+local finished = tonumber(redis.call('HGET', meta, 'finishedCount') or '0')
+local status, winner, draw = 'waiting', '', redis.call('HGET', meta, 'isDraw') or '0'
+if count >= 2 then
+  if finished >= count then
+    status = 'finished'
+    local top = redis.call('ZREVRANGE', scores, 0, 1, 'WITHSCORES')
+    if tonumber(top[2]) == tonumber(top[4]) then
+      draw = '1'
+    else
+      winner, draw = top[1], '0'
+    end
+  else
+    status = 'playing'
+  end
+end
+redis.call('HSET', meta, 'status', status, 'winnerUserId', winner, 'isDraw', draw)
+local version = redis.call('HINCRBY', meta, 'version', 1)
+for i = 1, #KEYS do
+  redis.call('EXPIRE', KEYS[i], ttl)
+end
+return {1, status, winner, draw, version}
+"""
+
+_META_FIELDS = ("matchId", "createdAt", "mode", "questionCount", "maxGuess", "maxPlayers", "questionSetId", "status", "winnerUserId")
+_JSON_PLAYER_FIELDS = ("questionScores", "guesses")
+_FLOAT_PLAYER_FIELDS = ("joinedAt", "finishedAt", "questionStartedAt", "enteredAt")
+
+
+def _encode(value: Any) -> str:
+    return "" if value is None else str(value)
+
+
+def _decode_float(value: Optional[str]) -> Optional[float]:
+    return float(value) if value else None
+
+
+def _player_mapping(progress: dict) -> Dict[str, str]:
+    mapping = {field: _encode(progress.get(field)) for field in _FLOAT_PLAYER_FIELDS}
+    mapping.update({field: json.dumps(progress.get(field) or [], ensure_ascii=False) for field in _JSON_PLAYER_FIELDS})
+    mapping["finished"] = "1" if progress.get("finished") else "0"
+    mapping["currentQuestion"] = str(int(progress.get("currentQuestion", 0)))
+    mapping["totalScore"] = str(int(progress.get("totalScore", 0)))
+    return mapping
+
+
+def _player_from_hash(data: Dict[str, str]) -> dict:
+    progress: Dict[str, Any] = {field: _decode_float(data.get(field)) for field in _FLOAT_PLAYER_FIELDS}
+    progress.update({field: json.loads(data.get(field) or "[]") for field in _JSON_PLAYER_FIELDS})
+    progress["finished"] = data.get("finished") == "1"
+    progress["currentQuestion"] = int(data.get("currentQuestion") or 0)
+    progress["totalScore"] = int(data.get("totalScore") or 0)
+    if progress["enteredAt"] is None:
+        progress.pop("enteredAt")
+    return progress
+
+
 class RedisBattleRepo:
-    def __init__(self, redis_url: str, ttl_seconds: int, prefix: str = "mh:v1:battle:"):
+    """Match metadata in one hash, each player's progress in its own hash, scores in a sorted set.
+
+    ``{id}`` holds the match fields, the JSON list of player ids and ``finishedCount``;
+    ``{id}:player:<userId>`` holds that player's progress plus a ``rev`` counter and
+    ``{id}:scores`` ranks players by total score. Guesses and entries only write the
+    submitting player's hash through ``_PLAYER_SCRIPT``, which keeps the scoreboard and
+    the finished counter in step and derives the match status from them, so a write
+    costs the same in a room of two or a hundred and players never overwrite each other.
+    ``view`` reads the caller, the top-K and the caller's neighbours only.
+    The hash tag keeps a match's keys in one cluster slot for the script.
+    """
+
+    def __init__(self, redis_url: str, ttl_seconds: int, prefix: str = "mh:v1:battle:", key_prefix: str = "mh:v2:battle"):
         self._ttl = ttl_seconds
         self._prefix = prefix
+        self._key_prefix = key_prefix
         self._r = redis.Redis.from_url(redis_url, decode_responses=True)
+        self._player_script = self._r.register_script(_PLAYER_SCRIPT)
 
     @property
     def repo_type(self) -> str:
         return "redis"
 
-    def _key(self, match_id: str) -> str:
+    def _key(self, match_id: str, *parts: str) -> str:
+        return ":".join((f"{self._key_prefix}:{{{match_id}}}",) + parts)
+
+    def _legacy_key(self, match_id: str) -> str:
         return f"{self._prefix}{match_id}"
 
+    def _write(self, pipe: Any, state: dict, user_ids: Optional[List[str]] = None) -> None:
+        """Write the meta hash and the given players (all of them by default)."""
+        match_id = state["matchId"]
+        players = state.get("players", {})
+        meta_key = self._key(match_id)
+        scores_key = self._key(match_id, "scores")
+        mapping = {field: _encode(state.get(field)) for field in _META_FIELDS}
+        mapping["questionHandIndices"] = json.dumps(state.get("questionHandIndices") or [])
+        mapping["isDraw"] = "1" if state.get("isDraw") else "0"
+        mapping["version"] = str(int(state.get("version", 0)))
+        mapping["players"] = json.dumps(list(players), ensure_ascii=False)
+        mapping["finishedCount"] = str(sum(1 for p in players.values() if p.get("finished")))
+        pipe.hset(meta_key, mapping=mapping)
+        pipe.expire(meta_key, self._ttl)
+        if user_ids is None:
+            user_ids = list(players)
+            pipe.delete(scores_key)
+        for user_id in user_ids:
+            progress = players[user_id]
+            player_key = self._key(match_id, "player", user_id)
+            pipe.hset(player_key, mapping=_player_mapping(progress))
+            # Invalidate any in-flight per-player write based on the old progress.
+            pipe.hincrby(player_key, "rev", 1)
+            pipe.expire(player_key, self._ttl)
+            pipe.zadd(scores_key, {user_id: int(progress.get("totalScore", 0))})
+        if players:
+            pipe.expire(scores_key, self._ttl)
+
     def create(self, initial: dict) -> dict:
-        mid = initial["matchId"]
-        raw = json.dumps(initial, ensure_ascii=False)
-        self._r.setex(self._key(mid), self._ttl, raw)
+        pipe = self._r.pipeline()
+        self._write(pipe, initial)
+        pipe.execute()
         return initial
 
-    def get(self, match_id: str) -> Optional[dict]:
-        raw = self._r.get(self._key(match_id))
+    def _migrate_legacy(self, match_id: str) -> Optional[dict]:
+        raw = self._r.get(self._legacy_key(match_id))
         if raw is None:
             return None
-        return json.loads(raw)
+        state = json.loads(raw)
+        for user_id, progress in state.get("players", {}).items():
+            _compact_progress(progress, user_id)
+        self.create(state)
+        self._r.delete(self._legacy_key(match_id))
+        return state
+
+    def _meta(self, match_id: str) -> Optional[Dict[str, str]]:
+        meta = self._r.hgetall(self._key(match_id))
+        if not meta:
+            if self._migrate_legacy(match_id) is None:
+                return None
+            meta = self._r.hgetall(self._key(match_id))
+        if "finishedCount" not in meta:
+            # Written before the scoreboard existed: build it once from the player hashes.
+            state = self._state(match_id, meta, json.loads(meta.get("players") or "[]"))[0]
+            pipe = self._r.pipeline()
+            self._write(pipe, state)
+            pipe.execute()
+            meta = self._r.hgetall(self._key(match_id))
+        return meta
+
+    def _state(self, match_id: str, meta: Dict[str, str], user_ids: List[str]) -> Tuple[dict, Dict[str, str]]:
+        """State holding only ``user_ids`` among the players, plus their revs."""
+        pipe = self._r.pipeline()
+        for user_id in user_ids:
+            pipe.hgetall(self._key(match_id, "player", user_id))
+        hashes = [(user_id, data) for user_id, data in zip(user_ids, pipe.execute()) if data]
+        state = {
+            "matchId": meta["matchId"],
+            "createdAt": _decode_float(meta.get("createdAt")),
+            "mode": meta.get("mode") or "normal",
+            "questionCount": int(meta.get("questionCount") or 0),
+            "maxGuess": int(meta.get("maxGuess") or 6),
+            "maxPlayers": int(meta.get("maxPlayers") or 2),
+            "questionHandIndices": json.loads(meta.get("questionHandIndices") or "[]"),
+            "questionSetId": meta.get("questionSetId") or None,
+            "status": meta.get("status") or "waiting",
+            "winnerUserId": meta.get("winnerUserId") or None,
+            "isDraw": meta.get("isDraw") == "1",
+            "version": int(meta.get("version") or 0),
+            "players": {user_id: _player_from_hash(data) for user_id, data in hashes},
+        }
+        return state, {user_id: data.get("rev", "0") for user_id, data in hashes}
+
+    def get(self, match_id: str) -> Optional[dict]:
+        meta = self._meta(match_id)
+        if meta is None:
+            return None
+        return self._state(match_id, meta, json.loads(meta.get("players") or "[]"))[0]
 
     def save(self, match_id: str, state: dict) -> None:
-        raw = json.dumps(state, ensure_ascii=False)
-        self._r.setex(self._key(match_id), self._ttl, raw)
+        pipe = self._r.pipeline()
+        self._write(pipe, state)
+        pipe.execute()
 
     def delete(self, match_id: str) -> None:
-        self._r.delete(self._key(match_id))
+        user_ids = json.loads(self._r.hget(self._key(match_id), "players") or "[]")
+        keys = [self._key(match_id), self._key(match_id, "scores")]
+        self._r.delete(*keys, *(self._key(match_id, "player", uid) for uid in user_ids))
 
     def update(self, match_id: str, updater: Callable[[dict], T]) -> T:
-        state = self.get(match_id)
-        if state is None:
+        """Optimistic read-modify-write of the whole match, for rare changes such as joining.
+
+        Only players whose progress changed are written back, so a join does not
+        invalidate the other players' in-flight writes.
+        """
+        while True:
+            with self._r.pipeline() as pipe:
+                try:
+                    pipe.watch(self._key(match_id))
+                    meta = self._meta(match_id)
+                    if meta is None:
+                        raise KeyError("MATCH_NOT_FOUND")
+                    state = self._state(match_id, meta, json.loads(meta.get("players") or "[]"))[0]
+                    for user_id in state["players"]:
+                        pipe.watch(self._key(match_id, "player", user_id))
+                    before = {user_id: _player_mapping(p) for user_id, p in state["players"].items()}
+                    result = updater(state)
+                    state["version"] = int(state.get("version", 0)) + 1
+                    changed = [uid for uid, p in state["players"].items() if before.get(uid) != _player_mapping(p)]
+                    pipe.multi()
+                    self._write(pipe, state, changed)
+                    pipe.execute()
+                    return result
+                except redis.WatchError:
+                    continue
+
+    def update_player(self, match_id: str, user_id: str, updater: Callable[[dict], T]) -> T:
+        """Apply ``updater`` to the match with only ``user_id`` loaded and persist that player.
+
+        Other players' writes and joins never conflict with this one. The write is still
+        conditional on the player's ``rev``: if the same player raced with themselves
+        (two tabs), ``CONCURRENT_UPDATE`` is raised and nothing is retried, the client
+        resubmits.
+        """
+        meta = self._meta(match_id)
+        if meta is None:
             raise KeyError("MATCH_NOT_FOUND")
+        state, revs = self._state(match_id, meta, [user_id])
         result = updater(state)
-        self.save(match_id, state)
+        progress = state["players"].get(user_id)
+        if progress is None:
+            raise ValueError("USER_NOT_IN_MATCH")
+        keys = [self._key(match_id), self._key(match_id, "player", user_id), self._key(match_id, "scores")]
+        args: List[Any] = [revs.get(user_id, "0"), self._ttl, user_id]
+        for field, value in _player_mapping(progress).items():
+            args += [field, value]
+        outcome = self._player_script(keys=keys, args=args)
+        if not outcome[0]:
+            raise KeyError("MATCH_NOT_FOUND") if outcome[1] == "MATCH_NOT_FOUND" else ValueError("CONCURRENT_UPDATE")
+        _, status, winner, draw, version = outcome
+        state.update(status=status, winnerUserId=winner or None, isDraw=draw == "1", version=int(version))
         return result
 
+    def view(self, match_id: str, user_id: str, top_k: int = TOP_K, radius: int = NEIGHBOURS) -> Optional[dict]:
+        """Meta, scoreboard slices and just the players they name: O(K + log n) whatever the room size."""
+        meta = self._meta(match_id)
+        if meta is None:
+            return None
+        scores_key = self._key(match_id, "scores")
+        pipe = self._r.pipeline()
+        pipe.zcard(scores_key)
+        pipe.zrevrank(scores_key, user_id)
+        pipe.zrevrange(scores_key, 0, top_k - 1, withscores=True)
+        count, rank, top = pipe.execute()
+        start = max(0, (rank or 0) - radius)
+        around = self._r.zrevrange(scores_key, start, rank + radius, withscores=True) if rank is not None else []
+        top = [(uid, int(score)) for uid, score in top]
+        around = [(uid, int(score)) for uid, score in around]
+        wanted = list(dict.fromkeys([user_id] + [uid for uid, _ in top + around]))
+        state = self._state(match_id, meta, wanted)[0]
+        state["scoreboard"] = _board(int(count), rank, top, around, start)
+        return state
+
+    def version(self, match_id: str) -> Optional[int]:
+        """One hash field, for conditional GETs; None (read the match) for legacy v1 documents."""
+        raw = self._r.hget(self._key(match_id), "version")
+        return int(raw) if raw is not None else None
+
     def ping(self) -> bool:
         try:
             return self._r.ping() is True
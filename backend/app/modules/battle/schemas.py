@@ -22,6 +22,7 @@ class CreateBattleReq(BaseModel):
     mode: Literal["normal", "riichi", "guobiao"] = "normal"
     questionCount: int = Field(1, ge=1, le=5)
     maxGuess: int = Field(6, ge=6, le=8)
+    maxPlayers: int = Field(2, ge=2, le=100)
 
 
 class JoinBattleReq(BaseModel):
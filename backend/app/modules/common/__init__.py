@@ -0,0 +1 @@
+"""Small data structures shared by several game modules."""
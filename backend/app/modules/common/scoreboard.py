@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional, Tuple
+
+Score = float
+
+
+class Scoreboard:
+    """Sorted (score, userId) pairs: O(log n) rank lookups, ranges in ZREVRANGE order.
+
+    The in-memory counterpart of a Redis sorted set: battle repos rank players by total
+    score within a match, the rating store ranks everyone by rating.
+    """
+
+    def __init__(self, entries: Optional[Iterable[Tuple[str, Score]]] = None):
+        self._scores: Dict[str, Score] = {}
+        self._entries: List[Tuple[Score, str]] = []
+        for user_id, score in entries or ():
+            self.set(user_id, score)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def set(self, user_id: str, score: Score) -> None:
+        old = self._scores.get(user_id)
+        if old == score:
+            return
+        if old is not None:
+            del self._entries[bisect_left(self._entries, (old, user_id))]
+        self._scores[user_id] = score
+        insort(self._entries, (score, user_id))
+
+    def rank(self, user_id: str) -> Optional[int]:
+        score = self._scores.get(user_id)
+        if score is None:
+            return None
+        return len(self._entries) - 1 - bisect_left(self._entries, (score, user_id))
+
+    def range(self, start: int, stop: int) -> List[Tuple[str, Score]]:
+        """Ranks ``start`` to ``stop`` inclusive, best first."""
+        last = len(self._entries) - 1
+        return [(self._entries[last - i][1], self._entries[last - i][0]) for i in range(max(0, start), min(stop, last) + 1)]
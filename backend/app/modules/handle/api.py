@@ -5,10 +5,13 @@
 # @Project : mahjong-handle-web
 from __future__ import annotations
 
-from fastapi import APIRouter
+from typing import Union
 
+from fastapi import APIRouter, Request, Response
+
+from app.api.conditional import not_modified, tag_response
 from app.modules.handle.domain import UserProgress, evaluate_guess
-from app.api.deps import log, handle_repo
+from app.api.deps import log, handle_repo, settled_cache
 from app.modules.handle.schemas import ApiError, ApiResponse, GuessReq, ResetReq, StartReq
 
 router = APIRouter()
@@ -192,10 +195,15 @@ def guess(game_id: str, req: GuessReq) -> ApiResponse:
 
 # ✅ 改动：去掉 /game 前缀
 @router.get("/{game_id}/status", response_model=ApiResponse)
-def status(game_id: str, userId: str) -> ApiResponse:
+def status(game_id: str, userId: str, request: Request, response: Response) -> Union[ApiResponse, Response]:
+    cached = not_modified(request, handle_repo.version(game_id), userId)
+    if cached is not None:
+        return cached
+
     g = handle_repo.get(game_id)
     if not g:
         return ApiResponse(ok=False, data=None, error=ApiError(code="GAME_NOT_FOUND", message="gameId 不存在"))
+    tag_response(response, g.version, userId)
 
     p = g.users.get(userId)
     if not p:
@@ -250,8 +258,16 @@ def status(game_id: str, userId: str) -> ApiResponse:
 
 
 @router.get("/{game_id}/answer", response_model=ApiResponse)
-def answer(game_id: str, userId: str) -> ApiResponse:
-    """Return answer payload only after the game is finished."""
+def answer(game_id: str, userId: str, request: Request) -> Union[ApiResponse, Response]:
+    """Return answer payload only after the game is finished.
+
+    结束后答案不再变化，首次构造后由 settled_cache 直接返回缓存的响应体。
+    """
+    key = f"handle:answer:{game_id}:{userId}"
+    cached = settled_cache.respond(request, key)
+    if cached is not None:
+        return cached
+
     g = handle_repo.get(game_id)
     if not g:
         return ApiResponse(ok=False, data=None, error=ApiError(code="GAME_NOT_FOUND", message="gameId 不存在"))
@@ -264,13 +280,14 @@ def answer(game_id: str, userId: str) -> ApiResponse:
         return ApiResponse(ok=False, data=None, error=ApiError(code="GAME_NOT_FINISHED", message="本局未结束"))
 
     payload = _build_answer_payload(g)
-    return ApiResponse(ok=True, data=payload, error=None)
+    return settled_cache.store(request, key, ApiResponse(ok=True, data=payload, error=None))
 
 
 # ✅ 改动：去掉 /game 前缀
 @router.post("/{game_id}/reset", response_model=ApiResponse)
 def reset(game_id: str, req: ResetReq) -> ApiResponse:
     handle_repo.delete(game_id)
+    settled_cache.delete(f"handle:answer:{game_id}:{req.userId}")
     g = handle_repo.create(hand_index=req.handIndex, max_guess=req.maxGuess, rule_mode=req.ruleMode)
 
     handle_repo.update(g.game_id, lambda game: _ensure_user(game, req.userId))
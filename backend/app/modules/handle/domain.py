@@ -320,6 +320,7 @@ class GameState:
     rule_mode: RuleMode
     hand: HandResultData
     users: Dict[str, UserProgress] = field(default_factory=dict)
+    version: int = 0  # 每次写回 +1，用作 status 的 ETag
 
 
 # -------------------------
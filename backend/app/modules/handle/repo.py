@@ -107,6 +107,7 @@ def game_from_dict(d: dict) -> GameState:
         rule_mode=rule_mode,  # type: ignore[arg-type]
         hand=hand,
         users=users,
+        version=int(d.get("version", 0)),
     )
 
 
@@ -120,6 +121,7 @@ class GameRepo(Protocol):
     def save(self, game: GameState) -> None: ...
     def delete(self, game_id: str) -> None: ...
     def update(self, game_id: str, updater: Callable[[GameState], T]) -> T: ...
+    def version(self, game_id: str) -> Optional[int]: ...
     def ping(self) -> bool: ...
     @property
     def repo_type(self) -> str: ...
@@ -155,6 +157,7 @@ class InMemoryGameRepo:
         return self._games.get(game_id)
 
     def save(self, game: GameState) -> None:
+        game.version += 1
         self._games[game.game_id] = game
 
     def delete(self, game_id: str) -> None:
@@ -168,6 +171,10 @@ class InMemoryGameRepo:
         self.save(g)
         return result
 
+    def version(self, game_id: str) -> Optional[int]:
+        g = self.get(game_id)
+        return g.version if g else None
+
     def ping(self) -> bool:
         return True
 
@@ -198,6 +205,10 @@ class RedisGameRepo:
     def _key(self, prefix: str, game_id: str) -> str:
         return f"{prefix}{game_id}"
 
+    def _version_key(self, game_id: str) -> str:
+        # 版本号单独存一个小 key，条件 GET 不必读取/解码整局 JSON
+        return f"{self._prefix}{game_id}:version"
+
     def _all_prefixes(self) -> List[str]:
         return [self._prefix] + self._fallback_prefixes
 
@@ -248,13 +259,18 @@ class RedisGameRepo:
         return None
 
     def save(self, game: GameState) -> None:
+        game.version += 1
         raw = json.dumps(game_to_dict(game), ensure_ascii=False)
-        self._r.setex(self._key(self._prefix, game.game_id), self._ttl, raw)
+        pipe = self._r.pipeline()
+        pipe.setex(self._key(self._prefix, game.game_id), self._ttl, raw)
+        pipe.setex(self._version_key(game.game_id), self._ttl, game.version)
+        pipe.execute()
 
     def delete(self, game_id: str) -> None:
         # ✅ 删除时同时清掉新旧前缀，避免残留
         for pfx in self._all_prefixes():
             self._r.delete(self._key(pfx, game_id))
+        self._r.delete(self._version_key(game_id))
 
     def update(self, game_id: str, updater: Callable[[GameState], T]) -> T:
         g = self.get(game_id)
@@ -276,6 +292,11 @@ class RedisGameRepo:
         self.save(g)
         return result
 
+    def version(self, game_id: str) -> Optional[int]:
+        """只读版本号；旧数据（还没有版本 key）返回 None，调用方走完整读取。"""
+        raw = self._r.get(self._version_key(game_id))
+        return int(raw) if raw is not None else None
+
     def ping(self) -> bool:
         try:
             return self._r.ping() is True
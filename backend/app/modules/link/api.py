@@ -5,12 +5,18 @@
 # @Project : mahjong-handle-web
 from __future__ import annotations
 
-from fastapi import APIRouter
+from typing import Union
 
-from app.api.deps import link_repo, log
+from fastapi import APIRouter, Request, Response
+
+from app.api.conditional import etag, not_modified, tag_response
+from app.api.deps import link_repo, log, settled_cache
 from app.modules.link.domain import (
+    MoveRejected,
+    apply_moves,
     create_game,
     pick_tile,
+    replay_move_log,
     set_assist_options,
     to_status_payload,
     undo_tile,
@@ -20,8 +26,10 @@ from app.modules.link.schemas import (
     ApiResponse,
     AssistReq,
     PickReq,
+    PicksReq,
     ResetReq,
     StartReq,
+    SubmitReq,
     UndoReq,
 )
 
@@ -34,6 +42,7 @@ def start(req: StartReq) -> ApiResponse:
     try:
         state = create_game(
             hand_index=req.handIndex,
+            deal_seed=int(req.dealSeed) if req.dealSeed else None,
             temp_limit=req.tempLimit,
             undo_unlimited=req.undoUnlimited,
         )
@@ -68,6 +77,22 @@ def pick(game_id: str, req: PickReq) -> ApiResponse:
     return ApiResponse(ok=True, data=result, error=None)
 
 
+@router.post("/{game_id}/picks", response_model=ApiResponse)
+def picks(game_id: str, req: PicksReq) -> ApiResponse:
+    """在一次存储更新内按顺序执行一批取牌/撤回，遇错或结束即停止。"""
+    moves = [m.as_move() for m in req.moves]
+    try:
+        result = link_repo.update(game_id, lambda state: apply_moves(state, moves))
+    except KeyError:
+        return ApiResponse(ok=False, data=None, error=ApiError(code="GAME_NOT_FOUND", message="gameId 不存在"))
+
+    log.info(
+        "link_picks gameId=%s userId=%s moves=%s applied=%s stopReason=%s",
+        game_id, req.userId, len(moves), result["applied"], result["stopReason"],
+    )
+    return ApiResponse(ok=True, data=result, error=None)
+
+
 @router.post("/{game_id}/undo", response_model=ApiResponse)
 def undo(game_id: str, req: UndoReq) -> ApiResponse:
     """从暂存区撤回一张牌，返还到其来源列。"""
@@ -83,6 +108,27 @@ def undo(game_id: str, req: UndoReq) -> ApiResponse:
     return ApiResponse(ok=True, data=result, error=None)
 
 
+@router.post("/{game_id}/submit", response_model=ApiResponse)
+def submit(game_id: str, req: SubmitReq) -> ApiResponse:
+    """客户端本地对局结束后一次性提交走法，服务端重放校验并结算。"""
+    try:
+        result = link_repo.update(game_id, lambda state: replay_move_log(state, req.moves))
+    except KeyError:
+        return ApiResponse(ok=False, data=None, error=ApiError(code="GAME_NOT_FOUND", message="gameId 不存在"))
+    except MoveRejected as e:
+        return ApiResponse(
+            ok=False,
+            data=None,
+            error=ApiError(code=e.code, message=e.code, detail={"moveIndex": e.index}),
+        )
+
+    log.info(
+        "link_submit gameId=%s userId=%s moves=%s finish=%s win=%s",
+        game_id, req.userId, result["applied"], result["finish"], result["win"],
+    )
+    return ApiResponse(ok=True, data=result, error=None)
+
+
 @router.post("/{game_id}/assist", response_model=ApiResponse)
 def assist(game_id: str, req: AssistReq) -> ApiResponse:
     """更新辅助功能配置。"""
@@ -99,24 +145,41 @@ def assist(game_id: str, req: AssistReq) -> ApiResponse:
 
 
 @router.get("/{game_id}/status", response_model=ApiResponse)
-def status(game_id: str, userId: str) -> ApiResponse:
-    """获取当前游戏状态。"""
+def status(game_id: str, userId: str, request: Request, response: Response) -> Union[ApiResponse, Response]:
+    """获取当前游戏状态；带 If-None-Match 且版本未变时返回 304，已结束的对局直接返回缓存的响应体。"""
+    key = f"link:status:{game_id}"
+    cached = settled_cache.respond(request, key, private=True)
+    if cached is not None:
+        return cached
+    cached = not_modified(request, link_repo.version(game_id))
+    if cached is not None:
+        return cached
+
     state = link_repo.get(game_id)
     if not state:
         return ApiResponse(ok=False, data=None, error=ApiError(code="GAME_NOT_FOUND", message="gameId 不存在"))
 
+    version = int(state.get("version", 0))
+    if state.get("finish"):
+        return settled_cache.store(request, key, ApiResponse(ok=True, data=to_status_payload(state), error=None), etag(version), private=True)
+    tag_response(response, version)
     return ApiResponse(ok=True, data=to_status_payload(state), error=None)
 
 
 @router.post("/{game_id}/reset", response_model=ApiResponse)
 def reset(game_id: str, req: ResetReq) -> ApiResponse:
     """重开游戏。"""
+    try:
+        state = create_game(
+            hand_index=req.handIndex,
+            deal_seed=int(req.dealSeed) if req.dealSeed else None,
+            temp_limit=req.tempLimit,
+            undo_unlimited=req.undoUnlimited,
+        )
+    except Exception as e:
+        return ApiResponse(ok=False, data=None, error=ApiError(code="RESET_FAILED", message=str(e)))
     link_repo.delete(game_id)
-    state = create_game(
-        hand_index=req.handIndex,
-        temp_limit=req.tempLimit,
-        undo_unlimited=req.undoUnlimited,
-    )
+    settled_cache.delete(f"link:status:{game_id}")
     link_repo.create(state)
 
     log.info("link_reset oldGameId=%s newGameId=%s userId=%s", game_id, state["gameId"], req.userId)
@@ -0,0 +1,227 @@
+# _*_ coding : utf-8 _*_
+# @Time : 2026/10/19
+# @Author : Yoln
+# @File : deals
+# @Project : mahjong-handle-web
+"""连连看牌局来源。
+
+局面中只保存牌局引用（``{"source": "catalog", "index": i}`` 或
+``{"source": "seed", "seed": s}``）与各列剩余高度，完整牌面按引用即时还原并缓存在 LRU 中。
+"""
+from __future__ import annotations
+
+import logging
+import os
+import random
+import secrets
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from typing import Any, Deque, Dict, List, Optional, Protocol, Tuple
+
+from app.modules.link.utils.generator import TOTAL_TILES, generate_hand_line, line_to_columns
+from app.modules.link.utils.solver import solve_columns
+
+log = logging.getLogger("mahjong.link.deals")
+
+Columns = Tuple[Tuple[str, ...], ...]
+
+# 题库文件路径（相对本模块）
+_HANDS_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "assets", "hands.txt"))
+_DEAL_CACHE_SIZE = int(os.getenv("LINK_DEAL_CACHE_SIZE", "512"))
+
+_hands_cache: Optional[List[str]] = None
+
+
+def load_hands() -> List[str]:
+    """加载题库文件，按需缓存到内存。"""
+    global _hands_cache
+    if _hands_cache is not None:
+        return _hands_cache
+
+    if not os.path.exists(_HANDS_PATH):
+        raise FileNotFoundError(f"hands file not found: {_HANDS_PATH}")
+
+    with open(_HANDS_PATH, "r", encoding="utf-8") as f:
+        lines = [ln.strip() for ln in f.readlines() if ln.strip()]
+
+    _hands_cache = lines
+    return _hands_cache
+
+
+def _line_columns(line: str) -> Columns:
+    if len(line) != TOTAL_TILES * 2:
+        raise ValueError(f"hand line length invalid: {len(line)}")
+    return tuple(tuple(col) for col in line_to_columns(line))
+
+
+def seed_line(seed: int) -> str:
+    """由 64 位 seed 派生一局牌面；与 generator.hand_line_at(s, i) 的第 i 题即 seed=derive_seed(s, i)。"""
+    return generate_hand_line(random.Random(seed))
+
+
+@lru_cache(maxsize=_DEAL_CACHE_SIZE)
+def _catalog_columns(index: int) -> Columns:
+    hands = load_hands()
+    if index < 0 or index >= len(hands):
+        raise ValueError("hand_index out of range")
+    return _line_columns(hands[index])
+
+
+@lru_cache(maxsize=_DEAL_CACHE_SIZE)
+def _seed_columns(seed: int) -> Columns:
+    return _line_columns(seed_line(seed))
+
+
+def deal_columns(deal: Dict[str, Any]) -> Columns:
+    """按牌局引用还原完整的 17 列（只读，栈顶在末尾）。"""
+    source = deal.get("source")
+    if source == "seed":
+        return _seed_columns(int(deal["seed"]))
+    if source == "catalog":
+        return _catalog_columns(int(deal["index"]))
+    raise ValueError("DEAL_SOURCE_UNKNOWN")
+
+
+def catalog_deal(index: int) -> Dict[str, Any]:
+    hands = load_hands()
+    if not hands:
+        raise ValueError("hands file is empty")
+    if index < 0 or index >= len(hands):
+        raise ValueError("hand_index out of range")
+    return {"source": "catalog", "index": index}
+
+
+def seed_deal(seed: int) -> Dict[str, Any]:
+    if seed < 0 or seed >= 1 << 64:
+        raise ValueError("deal_seed out of range")
+    return {"source": "seed", "seed": seed}
+
+
+class DealSource(Protocol):
+    def next_deal(self, temp_limit: int) -> Dict[str, Any]: ...
+    @property
+    def source_type(self) -> str: ...
+
+
+class CatalogDealSource:
+    """从固定题库中随机抽题。"""
+
+    @property
+    def source_type(self) -> str:
+        return "catalog"
+
+    def next_deal(self, temp_limit: int) -> Dict[str, Any]:
+        hands = load_hands()
+        if not hands:
+            raise ValueError("hands file is empty")
+        return catalog_deal(random.randrange(len(hands)))
+
+
+def _screen_seeds(task: Tuple[List[int], int]) -> List[int]:
+    """进程池任务：返回求解器确认可全消的 seed。"""
+    seeds, temp_limit = task
+    return [s for s in seeds if solve_columns(_seed_columns(s), temp_limit=temp_limit).solvable]
+
+
+class SeededDealSource:
+    """由随机 64 位 seed 即时生成牌局，不占用题库内存。
+
+    prescreen 开启时，后台进程池持续用求解器筛出可解的 seed 放入队列，
+    开局时优先取用；队列为空时退化为未经筛选的随机 seed，不阻塞请求。
+    """
+
+    def __init__(
+        self,
+        *,
+        prescreen: bool = False,
+        screen_temp_limit: int = 7,
+        target_depth: int = 64,
+        batch_size: int = 16,
+        workers: int = 1,
+    ):
+        self._prescreen = prescreen
+        self._screen_temp_limit = screen_temp_limit
+        self._target_depth = target_depth
+        self._batch_size = batch_size
+        self._workers = workers
+        self._queue: Deque[int] = deque()
+        self._lock = threading.Lock()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._inflight = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def source_type(self) -> str:
+        return "seed"
+
+    @property
+    def depth(self) -> int:
+        return len(self._queue)
+
+    def next_deal(self, temp_limit: int) -> Dict[str, Any]:
+        seed: Optional[int] = None
+        # 暂存区更大时更容易，按较小上限筛出的 seed 依然可解
+        if self._prescreen and temp_limit >= self._screen_temp_limit:
+            try:
+                seed = self._queue.popleft()
+                self.hits += 1
+            except IndexError:
+                self.misses += 1
+            self._refill()
+        if seed is None:
+            seed = secrets.randbits(64)
+        return seed_deal(seed)
+
+    def _refill(self) -> None:
+        futures: List[Future] = []
+        with self._lock:
+            want = self._target_depth - len(self._queue) - self._inflight * self._batch_size
+            if want <= 0:
+                return
+            try:
+                if self._pool is None:
+                    self._pool = ProcessPoolExecutor(max_workers=self._workers)
+                while want > 0:
+                    seeds = [secrets.randbits(64) for _ in range(self._batch_size)]
+                    futures.append(self._pool.submit(_screen_seeds, (seeds, self._screen_temp_limit)))
+                    self._inflight += 1
+                    want -= self._batch_size
+            except BrokenProcessPool:
+                # 工作进程异常退出（OOM / SIGKILL）后池不可再用：丢弃并在下次补充时重建，开局照常用随机 seed。
+                log.exception("link_deal_prescreen_pool_broken")
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+                self._inflight = 0
+                futures = []
+        # 批次可能已完成，此时回调会在当前线程立即执行并获取锁，因此必须在释放锁之后再挂回调。
+        for fut in futures:
+            fut.add_done_callback(self._on_screened)
+
+    def _on_screened(self, fut: Future) -> None:
+        with self._lock:
+            # 池重建时 _inflight 已清零，旧池批次的回调不能把它减成负数。
+            self._inflight = max(0, self._inflight - 1)
+        try:
+            self._queue.extend(fut.result())
+        except Exception:
+            log.exception("link_deal_prescreen_failed")
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+def create_deal_source_from_env() -> DealSource:
+    source = os.getenv("LINK_DEAL_SOURCE", "catalog").lower()
+    if source == "seed":
+        return SeededDealSource(
+            prescreen=os.getenv("LINK_DEAL_PRESCREEN", "").lower() in ("1", "true", "yes", "on"),
+            target_depth=int(os.getenv("LINK_DEAL_PRESCREEN_DEPTH", "64")),
+            workers=int(os.getenv("LINK_DEAL_PRESCREEN_WORKERS", "1")),
+        )
+    return CatalogDealSource()
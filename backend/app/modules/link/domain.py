@@ -5,12 +5,18 @@
 # @Project : mahjong-handle-web
 from __future__ import annotations
 
-import os
-import random
 import time
 import uuid
 from typing import Any, Dict, List, Optional, Tuple
 
+from app.modules.link.deals import (
+    DealSource,
+    catalog_deal,
+    create_deal_source_from_env,
+    deal_columns,
+    seed_deal,
+)
+
 # 基本常量：8 行 17 列，共 136 张
 ROWS = 8
 COLS = 17
@@ -19,50 +25,59 @@ TOTAL_TILES = ROWS * COLS
 # 默认临时格子容量（后续可由题库分析结果覆盖）
 DEFAULT_TEMP_LIMIT = 7
 
-# 题库文件路径（相对本模块）
-_HANDS_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "assets", "hands.txt"))
-
-_hands_cache: Optional[List[str]] = None
-
+_deal_source: Optional[DealSource] = None
 
-def _load_hands() -> List[str]:
-    """加载题库文件，按需缓存到内存。"""
-    global _hands_cache
-    if _hands_cache is not None:
-        return _hands_cache
 
-    if not os.path.exists(_HANDS_PATH):
-        raise FileNotFoundError(f"hands file not found: {_HANDS_PATH}")
+def _default_deal_source() -> DealSource:
+    """按环境变量惰性创建牌局来源（题库 / seed 派生）。"""
+    global _deal_source
+    if _deal_source is None:
+        _deal_source = create_deal_source_from_env()
+    return _deal_source
 
-    with open(_HANDS_PATH, "r", encoding="utf-8") as f:
-        lines = [ln.strip() for ln in f.readlines() if ln.strip()]
 
-    _hands_cache = lines
-    return _hands_cache
+def _columns(state: Dict[str, Any]) -> List[List[str]]:
+    """当前各列（栈顶在末尾）：由牌局引用与各列剩余高度还原。"""
+    if "columns" in state:
+        # 旧局面：完整列数据直接存于状态中
+        return state["columns"]
+    full = deal_columns(state["deal"])
+    return [list(col[:h]) for col, h in zip(full, state["columnCounts"])]
 
 
-def _parse_hand_line(line: str) -> List[str]:
-    """将一行题库字符串拆成 136 张牌（每张 2 字符）。"""
-    if len(line) != TOTAL_TILES * 2:
-        raise ValueError(f"hand line length invalid: {len(line)}")
-    return [line[i:i + 2] for i in range(0, len(line), 2)]
+def _pop_column(state: Dict[str, Any], column: int) -> str:
+    """取走指定列栈顶牌。"""
+    if "columns" in state:
+        stack = state["columns"][column]
+        if not stack:
+            raise ValueError("COLUMN_EMPTY")
+        return stack.pop()
+    counts: List[int] = state["columnCounts"]
+    height = counts[column]
+    if height <= 0:
+        raise ValueError("COLUMN_EMPTY")
+    counts[column] = height - 1
+    return deal_columns(state["deal"])[column][height - 1]
 
 
-def _tiles_to_columns(tiles: List[str]) -> List[List[str]]:
-    """将 136 张牌按 8x17 的行列放入 17 个栈。
+def _push_column(state: Dict[str, Any], column: int, tile: str) -> None:
+    """将牌放回指定列栈顶。"""
+    if "columns" not in state:
+        counts: List[int] = state["columnCounts"]
+        full = deal_columns(state["deal"])[column]
+        if counts[column] < len(full) and full[counts[column]] == tile:
+            counts[column] += 1
+            return
+        # 撤回的不是该列最近取走的牌时，列顺序已偏离原牌局，改为显式保存各列
+        state["columns"] = _columns(state)
+        del state["columnCounts"]
+    state["columns"][column].append(tile)
 
-    约定：行 0 为底部，行 7 为顶部；每列栈顶在列表末尾。
-    """
-    if len(tiles) != TOTAL_TILES:
-        raise ValueError(f"tiles length invalid: {len(tiles)}")
 
-    columns: List[List[str]] = [[] for _ in range(COLS)]
-    idx = 0
-    for r in range(ROWS):
-        for c in range(COLS):
-            columns[c].append(tiles[idx])
-            idx += 1
-    return columns
+def _tiles_in_columns(state: Dict[str, Any]) -> int:
+    if "columns" in state:
+        return sum(len(c) for c in state["columns"])
+    return sum(state["columnCounts"])
 
 
 def _top_tiles(columns: List[List[str]]) -> List[Optional[str]]:
@@ -122,30 +137,30 @@ def _can_undo(state: Dict[str, Any]) -> bool:
 def create_game(
     *,
     hand_index: Optional[int] = None,
+    deal_seed: Optional[int] = None,
     temp_limit: Optional[int] = None,
     undo_unlimited: Optional[bool] = None,
+    deal_source: Optional[DealSource] = None,
 ) -> Dict[str, Any]:
-    """创建新游戏状态。"""
-    hands = _load_hands()
-    if not hands:
-        raise ValueError("hands file is empty")
+    """创建新游戏状态。
+
+    指定 hand_index 时取题库对应题目，指定 deal_seed 时由 seed 派生牌局，
+    否则由牌局来源（默认按环境变量配置）提供。
+    """
+    limit = temp_limit if (temp_limit and temp_limit > 0) else DEFAULT_TEMP_LIMIT
 
     if hand_index is not None:
-        if hand_index < 0 or hand_index >= len(hands):
-            raise ValueError("hand_index out of range")
-        line = hands[hand_index]
+        deal = catalog_deal(hand_index)
+    elif deal_seed is not None:
+        deal = seed_deal(deal_seed)
     else:
-        line = random.choice(hands)
-
-    tiles = _parse_hand_line(line)
-    columns = _tiles_to_columns(tiles)
-
-    limit = temp_limit if (temp_limit and temp_limit > 0) else DEFAULT_TEMP_LIMIT
+        deal = (deal_source or _default_deal_source()).next_deal(limit)
 
     return {
         "gameId": uuid.uuid4().hex,
         "createdAt": time.time(),
-        "columns": columns,
+        "deal": deal,
+        "columnCounts": [len(col) for col in deal_columns(deal)],
         "tempSlots": [],
         "tempSlotOrigins": [],
         "tempSlotSeqs": [],
@@ -157,22 +172,19 @@ def create_game(
         "finish": False,
         "win": False,
         "failReason": None,
+        "version": 0,
     }
 
 
-def pick_tile(state: Dict[str, Any], column: int) -> Dict[str, Any]:
-    """从指定列栈顶取牌，并按规则放入临时格子与消除。"""
+def _apply_pick(state: Dict[str, Any], column: int) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """取牌核心逻辑：只修改状态，返回 (取到的牌, 消除信息)。"""
     if state.get("finish"):
         raise ValueError("GAME_FINISHED")
 
     if column < 0 or column >= COLS:
         raise ValueError("COLUMN_OUT_OF_RANGE")
 
-    columns: List[List[str]] = state["columns"]
-    if not columns[column]:
-        raise ValueError("COLUMN_EMPTY")
-
-    tile = columns[column].pop()
+    tile = _pop_column(state, column)
 
     temp_slots, temp_slot_origins, temp_slot_seqs = _ensure_temp_tracking(state)
     pick_seq = int(state.get("pickSeq", 0)) + 1
@@ -203,7 +215,7 @@ def pick_tile(state: Dict[str, Any], column: int) -> Dict[str, Any]:
         state["failReason"] = "SLOTS_FULL_DISTINCT"
 
     # 成功条件：所有牌都消除
-    remain = _remain_tiles(columns, temp_slots)
+    remain = _tiles_in_columns(state) + len(temp_slots)
     if remain == 0:
         state["finish"] = True
         state["win"] = True
@@ -212,25 +224,21 @@ def pick_tile(state: Dict[str, Any], column: int) -> Dict[str, Any]:
     # 默认每一步只能撤回一次；若开启无限撤回，则不受此预算限制
     state["undoBudget"] = 1
 
+    return tile, removed
+
+
+def pick_tile(state: Dict[str, Any], column: int) -> Dict[str, Any]:
+    """从指定列栈顶取牌，并按规则放入临时格子与消除。"""
+    tile, removed = _apply_pick(state, column)
     return {
         "picked": {"column": column, "tile": tile},
         "removed": removed,
-        "columns": columns,
-        "topTiles": _top_tiles(columns),
-        "columnCounts": _column_counts(columns),
-        "tempSlots": temp_slots,
-        "tempLimit": temp_limit,
-        "remainTiles": remain,
-        "finish": state["finish"],
-        "win": state["win"],
-        "failReason": state.get("failReason"),
-        "undoUnlimited": bool(state.get("undoUnlimited", False)),
-        "canUndo": _can_undo(state),
+        **_board_payload(state),
     }
 
 
-def undo_tile(state: Dict[str, Any], slot_index: int) -> Dict[str, Any]:
-    """将暂存区指定位置的牌返还到原列顶部。"""
+def _apply_undo(state: Dict[str, Any], slot_index: int) -> Tuple[str, int]:
+    """撤回核心逻辑：只修改状态，返回 (撤回的牌, 返还的列)。"""
     if state.get("finish"):
         raise ValueError("GAME_FINISHED")
 
@@ -246,35 +254,121 @@ def undo_tile(state: Dict[str, Any], slot_index: int) -> Dict[str, Any]:
     if temp_slot_seqs[slot_index] <= last_elim_seq:
         raise ValueError("UNDO_BLOCKED_BY_ELIMINATION")
 
+    # 旧数据中来源列可能为 -1；先校验再改动状态，批量接口失败时才不会丢牌。
+    origin_column = temp_slot_origins[slot_index]
+    if origin_column < 0 or origin_column >= COLS:
+        raise ValueError("UNDO_SOURCE_UNKNOWN")
+
     if not state.get("undoUnlimited", False):
         if int(state.get("undoBudget", 0)) <= 0:
             raise ValueError("UNDO_NOT_ALLOWED")
         state["undoBudget"] = 0
 
     tile = temp_slots.pop(slot_index)
-    origin_column = temp_slot_origins.pop(slot_index)
+    temp_slot_origins.pop(slot_index)
     temp_slot_seqs.pop(slot_index)
 
-    if origin_column < 0 or origin_column >= COLS:
-        raise ValueError("UNDO_SOURCE_UNKNOWN")
+    _push_column(state, origin_column, tile)
+    return tile, origin_column
 
-    columns: List[List[str]] = state["columns"]
-    columns[origin_column].append(tile)
 
-    remain = _remain_tiles(columns, temp_slots)
+def undo_tile(state: Dict[str, Any], slot_index: int) -> Dict[str, Any]:
+    """将暂存区指定位置的牌返还到原列顶部。"""
+    tile, origin_column = _apply_undo(state, slot_index)
     return {
         "undone": {"slotIndex": slot_index, "tile": tile, "column": origin_column},
-        "columns": columns,
-        "topTiles": _top_tiles(columns),
-        "columnCounts": _column_counts(columns),
-        "tempSlots": temp_slots,
-        "tempLimit": int(state.get("tempLimit", DEFAULT_TEMP_LIMIT)),
-        "remainTiles": remain,
-        "finish": state.get("finish", False),
-        "win": state.get("win", False),
-        "failReason": state.get("failReason"),
-        "undoUnlimited": bool(state.get("undoUnlimited", False)),
-        "canUndo": _can_undo(state),
+        **_board_payload(state),
+    }
+
+
+class MoveRejected(ValueError):
+    """走法序列中某一步不合法；str(e) 为错误码，index 为出错步序号。"""
+
+    def __init__(self, code: str, index: int):
+        super().__init__(code)
+        self.code = code
+        self.index = index
+
+
+def parse_move_log(move_log: str) -> List[Tuple[str, int]]:
+    """解析紧凑走法串：a..q 为从第 0..16 列取牌，A..T 为撤回暂存区第 0..19 格。"""
+    moves: List[Tuple[str, int]] = []
+    for index, ch in enumerate(move_log):
+        if "a" <= ch <= "q":
+            moves.append(("pick", ord(ch) - ord("a")))
+        elif "A" <= ch <= "T":
+            moves.append(("undo", ord(ch) - ord("A")))
+        else:
+            raise MoveRejected("MOVE_LOG_INVALID", index)
+    return moves
+
+
+def encode_move_log(moves: List[Tuple[str, int]]) -> str:
+    """parse_move_log 的逆过程。"""
+    return "".join(chr(ord("a" if kind == "pick" else "A") + arg) for kind, arg in moves)
+
+
+def _clone_state(state: Dict[str, Any]) -> Dict[str, Any]:
+    """复制局面中会被走法修改的可变部分。"""
+    clone = dict(state)
+    if "columns" in state:
+        clone["columns"] = [col[:] for col in state["columns"]]
+    else:
+        clone["columnCounts"] = list(state["columnCounts"])
+    for key in ("tempSlots", "tempSlotOrigins", "tempSlotSeqs"):
+        clone[key] = list(state.get(key, []))
+    return clone
+
+
+def replay_move_log(state: Dict[str, Any], move_log: str) -> Dict[str, Any]:
+    """按 pick_tile/undo_tile 规则重放客户端本地对局的完整走法并结算。
+
+    任意一步不合法时整体拒绝（抛出 MoveRejected），原状态保持不变。
+    """
+    moves = parse_move_log(move_log)
+    work = _clone_state(state)
+    for index, (kind, arg) in enumerate(moves):
+        try:
+            _apply_move(work, kind, arg)
+        except ValueError as e:
+            raise MoveRejected(str(e), index) from None
+
+    state.clear()
+    state.update(work)
+    return {"applied": len(moves), **to_status_payload(state)}
+
+
+def _apply_move(state: Dict[str, Any], kind: str, arg: int) -> Dict[str, Any]:
+    """执行单步取牌/撤回，返回该步的精简结果。"""
+    if kind == "pick":
+        tile, removed = _apply_pick(state, arg)
+        return {"picked": {"column": arg, "tile": tile}, "removed": removed}
+    tile, column = _apply_undo(state, arg)
+    return {"undone": {"slotIndex": arg, "tile": tile, "column": column}}
+
+
+def apply_moves(state: Dict[str, Any], moves: List[Tuple[str, int]]) -> Dict[str, Any]:
+    """按顺序批量执行走法，遇到非法步或对局结束即停止，已执行部分保留。
+
+    返回每步结果 steps、实际执行步数 applied，以及停止位置 stoppedAt 与原因 stopReason
+    （全部执行完时二者为 None）。
+    """
+    steps: List[Dict[str, Any]] = []
+    stopped_at: Optional[int] = None
+    stop_reason: Optional[str] = None
+    for index, (kind, arg) in enumerate(moves):
+        try:
+            steps.append(_apply_move(state, kind, arg))
+        except ValueError as e:
+            stopped_at, stop_reason = index, str(e)
+            break
+
+    return {
+        "applied": len(steps),
+        "stoppedAt": stopped_at,
+        "stopReason": stop_reason,
+        "steps": steps,
+        **to_status_payload(state),
     }
 
 
@@ -289,14 +383,23 @@ def set_assist_options(state: Dict[str, Any], undo_unlimited: Optional[bool]) ->
 
 def to_status_payload(state: Dict[str, Any]) -> Dict[str, Any]:
     """构造 status 接口返回数据。"""
-    columns: List[List[str]] = state["columns"]
+    deal = state.get("deal") or {}
+    return {
+        "gameId": state["gameId"],
+        "createdAt": state["createdAt"],
+        "dealSeed": str(deal["seed"]) if deal.get("source") == "seed" else None,
+        **_board_payload(state),
+    }
+
+
+def _board_payload(state: Dict[str, Any]) -> Dict[str, Any]:
+    """各接口共用的牌面/暂存区/结算字段。"""
+    columns = _columns(state)
     temp_slots: List[str] = state["tempSlots"]
     temp_limit = int(state.get("tempLimit", DEFAULT_TEMP_LIMIT))
     remain = _remain_tiles(columns, temp_slots)
 
     return {
-        "gameId": state["gameId"],
-        "createdAt": state["createdAt"],
         "columns": columns,
         "topTiles": _top_tiles(columns),
         "columnCounts": _column_counts(columns),
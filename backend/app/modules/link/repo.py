@@ -17,12 +17,19 @@ T = TypeVar("T")
 log = logging.getLogger("mahjong.link.repo")
 
 
+def _bump_version(state: dict) -> int:
+    """每次写回版本 +1，status 接口据此生成 ETag。"""
+    state["version"] = int(state.get("version", 0)) + 1
+    return state["version"]
+
+
 class LinkRepo(Protocol):
     def create(self, initial: dict) -> dict: ...
     def get(self, game_id: str) -> Optional[dict]: ...
     def save(self, game_id: str, state: dict) -> None: ...
     def delete(self, game_id: str) -> None: ...
     def update(self, game_id: str, updater: Callable[[dict], T]) -> T: ...
+    def version(self, game_id: str) -> Optional[int]: ...
     def ping(self) -> bool: ...
     @property
     def repo_type(self) -> str: ...
@@ -56,6 +63,7 @@ class InMemoryLinkRepo:
         return v[1] if v else None
 
     def save(self, game_id: str, state: dict) -> None:
+        _bump_version(state)
         self._store[game_id] = (time.time(), state)
 
     def delete(self, game_id: str) -> None:
@@ -69,6 +77,10 @@ class InMemoryLinkRepo:
         self.save(game_id, st)
         return result
 
+    def version(self, game_id: str) -> Optional[int]:
+        st = self.get(game_id)
+        return int(st.get("version", 0)) if st is not None else None
+
     def ping(self) -> bool:
         return True
 
@@ -86,10 +98,19 @@ class RedisLinkRepo:
     def _key(self, game_id: str) -> str:
         return f"{self._prefix}{game_id}"
 
+    def _version_key(self, game_id: str) -> str:
+        # 版本号单独存一个小 key，条件 GET 不必读取/解码整局 JSON
+        return f"{self._prefix}{game_id}:version"
+
+    def _write(self, game_id: str, state: dict) -> None:
+        raw = json.dumps(state, ensure_ascii=False)
+        pipe = self._r.pipeline()
+        pipe.setex(self._key(game_id), self._ttl, raw)
+        pipe.setex(self._version_key(game_id), self._ttl, int(state.get("version", 0)))
+        pipe.execute()
+
     def create(self, initial: dict) -> dict:
-        gid = initial["gameId"]
-        raw = json.dumps(initial, ensure_ascii=False)
-        self._r.setex(self._key(gid), self._ttl, raw)
+        self._write(initial["gameId"], initial)
         return initial
 
     def get(self, game_id: str) -> Optional[dict]:
@@ -99,11 +120,11 @@ class RedisLinkRepo:
         return json.loads(raw)
 
     def save(self, game_id: str, state: dict) -> None:
-        raw = json.dumps(state, ensure_ascii=False)
-        self._r.setex(self._key(game_id), self._ttl, raw)
+        _bump_version(state)
+        self._write(game_id, state)
 
     def delete(self, game_id: str) -> None:
-        self._r.delete(self._key(game_id))
+        self._r.delete(self._key(game_id), self._version_key(game_id))
 
     def update(self, game_id: str, updater: Callable[[dict], T]) -> T:
         st = self.get(game_id)
@@ -113,6 +134,11 @@ class RedisLinkRepo:
         self.save(game_id, st)
         return result
 
+    def version(self, game_id: str) -> Optional[int]:
+        """只读版本号；旧数据（还没有版本 key）返回 None，调用方走完整读取。"""
+        raw = self._r.get(self._version_key(game_id))
+        return int(raw) if raw is not None else None
+
     def ping(self) -> bool:
         try:
             return self._r.ping() is True
@@ -5,9 +5,9 @@
 # @Project : mahjong-handle-web
 from __future__ import annotations
 
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 
 
 class ApiError(BaseModel):
@@ -31,6 +31,7 @@ class StartReq(BaseModel):
 
     userId: str = Field(..., min_length=1)
     handIndex: Optional[int] = None
+    dealSeed: Optional[str] = Field(None, pattern=r"^\d{1,20}$")
     tempLimit: Optional[int] = Field(None, ge=1, le=20)
     undoUnlimited: Optional[bool] = None
 
@@ -49,6 +50,38 @@ class UndoReq(BaseModel):
     slotIndex: int = Field(..., ge=0, le=19)
 
 
+class LinkMove(BaseModel):
+    """批量操作中的一步：column 为取牌列，undoSlot 为撤回格，二者取其一。"""
+
+    column: Optional[int] = Field(None, ge=0, le=16)
+    undoSlot: Optional[int] = Field(None, ge=0, le=19)
+
+    @model_validator(mode="after")
+    def _exactly_one(self) -> "LinkMove":
+        if (self.column is None) == (self.undoSlot is None):
+            raise ValueError("exactly one of column/undoSlot is required")
+        return self
+
+    def as_move(self) -> tuple[str, int]:
+        if self.column is not None:
+            return "pick", self.column
+        return "undo", int(self.undoSlot)  # type: ignore[arg-type]
+
+
+class PicksReq(BaseModel):
+    """按顺序批量取牌/撤回（客户端缓冲的连续点击）。"""
+
+    userId: str = Field(..., min_length=1)
+    moves: List[LinkMove] = Field(..., min_length=1, max_length=256)
+
+
+class SubmitReq(BaseModel):
+    """提交本地对局的完整走法（a..q 取第 0..16 列，A..T 撤回第 0..19 格）。"""
+
+    userId: str = Field(..., min_length=1)
+    moves: str = Field(..., max_length=4096, pattern=r"^[a-qA-T]*$")
+
+
 class AssistReq(BaseModel):
     """更新辅助功能配置。"""
 
@@ -61,5 +94,6 @@ class ResetReq(BaseModel):
 
     userId: str = Field(..., min_length=1)
     handIndex: Optional[int] = None
+    dealSeed: Optional[str] = Field(None, pattern=r"^\d{1,20}$")
     tempLimit: Optional[int] = Field(None, ge=1, le=20)
     undoUnlimited: Optional[bool] = None
@@ -8,13 +8,23 @@ from __future__ import annotations
 import argparse
 import os
 import random
-from typing import List
+from typing import Iterator, List, Optional, Tuple
+
+from app.modules.link.utils.parallel import Progress, ordered_map
+from app.modules.link.utils.solver import DIFFICULTIES, solve_columns
 
 
 # 基本常量：34 种牌、每种 4 张，总计 136 张
 TILE_TYPES = 34
 TILES_PER_TYPE = 4
 TOTAL_TILES = TILE_TYPES * TILES_PER_TYPE  # 136
+# 与 domain 一致：按 8 行 17 列逐行摆放
+COLS = 17
+
+DEFAULT_CHUNK_SIZE = 1000
+# 按难度筛选时，每道目标题最多尝试的候选数；超过即认为条件无法满足
+DEFAULT_ATTEMPTS_PER_HAND = 1000
+_MASK64 = (1 << 64) - 1
 
 
 def _id_to_tile(tile_id: int) -> str:
@@ -49,11 +59,15 @@ def _id_to_tile(tile_id: int) -> str:
     return f"{type_idx - 26}z"
 
 
+# 编号 -> 牌面查表（下标 0 占位）
+_TILE_BY_ID = [""] + [_id_to_tile(tid) for tid in range(1, TOTAL_TILES + 1)]
+
+
 def generate_hand_line(rng: random.Random) -> str:
     """生成单行题目：随机打乱 136 张牌并拼成 272 字符串。"""
     ids = list(range(1, TOTAL_TILES + 1))
     rng.shuffle(ids)
-    tiles = [_id_to_tile(tid) for tid in ids]
+    tiles = [_TILE_BY_ID[tid] for tid in ids]
     line = "".join(tiles)
     # 长度校验（每张牌 2 字符）
     if len(line) != TOTAL_TILES * 2:
@@ -61,21 +75,116 @@ def generate_hand_line(rng: random.Random) -> str:
     return line
 
 
-def generate_hands(count: int, seed: int | None = None) -> List[str]:
+def derive_seed(seed: int, index: int) -> int:
+    """由基础 seed 与题目序号派生独立的 64 位 seed（splitmix64）。
+
+    每题只依赖 (seed, index)，因此并行分块的输出与进程数、分块大小无关。
+    """
+    z = (seed + (index + 1) * 0x9E3779B97F4A7C15) & _MASK64
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return z ^ (z >> 31)
+
+
+def hand_line_at(seed: int, index: int) -> str:
+    """生成 seed 序列中第 index 题。"""
+    return generate_hand_line(random.Random(derive_seed(seed, index)))
+
+
+def line_to_columns(line: str) -> List[List[str]]:
+    """将一行题目按 8x17 摆放拆成 17 个列栈（栈顶在末尾）。"""
+    tiles = [line[i:i + 2] for i in range(0, len(line), 2)]
+    return [tiles[c::COLS] for c in range(COLS)]
+
+
+def rate_line(line: str, temp_limit: int = 7) -> Optional[str]:
+    """用求解器评估题目难度；不可解或超出搜索预算时返回 None。"""
+    return solve_columns(line_to_columns(line), temp_limit=temp_limit).difficulty
+
+
+def _accepts(rating: Optional[str], difficulty: str) -> bool:
+    if difficulty == "solvable":
+        return rating is not None
+    return rating == difficulty
+
+
+def _generate_chunk(task: Tuple[int, int, int, Optional[str], int]) -> List[str]:
+    """进程池任务：生成 [start, stop) 序号区间内通过筛选的题目。"""
+    seed, start, stop, difficulty, temp_limit = task
+    lines: List[str] = []
+    for index in range(start, stop):
+        line = hand_line_at(seed, index)
+        if difficulty and not _accepts(rate_line(line, temp_limit), difficulty):
+            continue
+        lines.append(line)
+    return lines
+
+
+def iter_hands(
+    count: int,
+    seed: int | None = None,
+    *,
+    difficulty: Optional[str] = None,
+    temp_limit: int = 7,
+    workers: int = 1,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    progress: Optional[Progress] = None,
+    max_attempts: Optional[int] = None,
+) -> Iterator[str]:
+    """流式生成题目：按序号分块并行生成，结果按序号顺序产出。
+
+    指定 difficulty（solvable/easy/normal/hard）时，逐块筛选直到凑满 count 题；
+    最多检查 max_attempts 个候选（默认 count * DEFAULT_ATTEMPTS_PER_HAND），
+    仍凑不满则抛出 RuntimeError。
+    """
+    if seed is None:
+        seed = random.SystemRandom().getrandbits(64)
+    limit = count
+    if difficulty:
+        limit = max_attempts if max_attempts is not None else count * DEFAULT_ATTEMPTS_PER_HAND
+
+    def tasks() -> Iterator[Tuple[int, int, int, Optional[str], int]]:
+        start = 0
+        while start < limit:
+            stop = min(start + chunk_size, limit)
+            yield seed, start, stop, difficulty, temp_limit
+            start = stop
+
+    produced = 0
+    for lines in ordered_map(_generate_chunk, tasks(), workers=workers):
+        batch = lines[:count - produced]
+        for line in batch:
+            yield line
+        produced += len(batch)
+        if progress is not None:
+            progress.advance(len(batch))
+        if produced >= count:
+            return
+    if produced < count:
+        raise RuntimeError(
+            f"only {produced}/{count} hands matched difficulty={difficulty} "
+            f"(temp_limit={temp_limit}) within {limit} attempts"
+        )
+
+
+def generate_hands(count: int, seed: int | None = None, **kwargs) -> List[str]:
     """生成多行题库内容，支持固定 seed 以便复现。"""
-    rng = random.Random(seed)
-    return [generate_hand_line(rng) for _ in range(count)]
+    return list(iter_hands(count, seed, **kwargs))
 
 
-def write_hands(path: str, count: int, seed: int | None = None) -> None:
-    """将题库写入指定路径，一行一题。"""
-    lines = generate_hands(count=count, seed=seed)
-    os.makedirs(os.path.dirname(path), exist_ok=True)
+def write_hands(path: str, count: int, seed: int | None = None, **kwargs) -> int:
+    """将题库流式写入指定路径，一行一题；返回写入行数。"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    written = 0
     with open(path, "w", encoding="utf-8") as f:
-        for i, line in enumerate(lines):
-            if i:
+        for line in iter_hands(count, seed, **kwargs):
+            if written:
                 f.write("\n")
             f.write(line)
+            written += 1
+    return written
 
 
 def main() -> None:
@@ -83,6 +192,16 @@ def main() -> None:
     parser = argparse.ArgumentParser(description="Generate link hands dataset.")
     parser.add_argument("--count", type=int, default=1000, help="number of hands (lines)")
     parser.add_argument("--seed", type=int, default=None, help="random seed")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="hands per worker task")
+    parser.add_argument(
+        "--difficulty",
+        choices=("solvable", *DIFFICULTIES),
+        default=None,
+        help="keep only hands the solver rates at this difficulty",
+    )
+    parser.add_argument("--temp-limit", type=int, default=7, help="temp slot limit used by the solver filter")
+    parser.add_argument("--max-attempts", type=int, default=None, help="candidates to try before giving up on --difficulty")
     # 默认写入 link/assets/hands.txt
     default_out = os.path.abspath(
         os.path.join(os.path.dirname(__file__), "..", "assets", "hands.txt")
@@ -95,7 +214,19 @@ def main() -> None:
     )
     args = parser.parse_args()
 
-    write_hands(path=args.out, count=args.count, seed=args.seed)
+    progress = Progress("generate", total=args.count)
+    write_hands(
+        path=args.out,
+        count=args.count,
+        seed=args.seed,
+        difficulty=args.difficulty,
+        temp_limit=args.temp_limit,
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+        progress=progress,
+        max_attempts=args.max_attempts,
+    )
+    progress.report()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,76 @@
+# _*_ coding : utf-8 _*_
+# @Time : 2026/10/19
+# @Author : Yoln
+# @File : parallel
+# @Project : mahjong-handle-web
+from __future__ import annotations
+
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Deque, Iterable, Iterator, Optional, TextIO, TypeVar
+
+A = TypeVar("A")
+R = TypeVar("R")
+
+
+def ordered_map(fn: Callable[[A], R], tasks: Iterable[A], workers: int = 1, max_pending: Optional[int] = None) -> Iterator[R]:
+    """按提交顺序产出结果的进程池 map。
+
+    与 ``Pool.imap`` 不同，最多只有 ``max_pending`` 个任务在途，
+    因此 tasks 可以是惰性甚至无限的生成器，内存占用与总量无关。
+    workers <= 1 时直接在当前进程执行。
+    """
+    if workers <= 1:
+        for task in tasks:
+            yield fn(task)
+        return
+
+    limit = max_pending or workers * 2
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending: Deque = deque()
+        it = iter(tasks)
+        try:
+            for task in it:
+                pending.append(pool.submit(fn, task))
+                if len(pending) >= limit:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for fut in pending:
+                fut.cancel()
+
+
+class Progress:
+    """按时间间隔向 stderr 输出进度与吞吐。"""
+
+    def __init__(self, label: str, total: Optional[int] = None, interval: float = 2.0, stream: TextIO = sys.stderr):
+        self.label = label
+        self.total = total
+        self.interval = interval
+        self.stream = stream
+        self.done = 0
+        self.started = time.perf_counter()
+        self._last = self.started
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    @property
+    def rate(self) -> float:
+        return self.done / self.elapsed if self.elapsed > 0 else 0.0
+
+    def advance(self, n: int = 1) -> None:
+        self.done += n
+        now = time.perf_counter()
+        if now - self._last >= self.interval:
+            self._last = now
+            self.report()
+
+    def report(self) -> None:
+        total = f"/{self.total}" if self.total else ""
+        self.stream.write(f"{self.label}: {self.done}{total} ({self.rate:.0f}/s, {self.elapsed:.1f}s)\n")
+        self.stream.flush()
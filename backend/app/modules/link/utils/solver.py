@@ -0,0 +1,122 @@
+# _*_ coding : utf-8 _*_
+# @Time : 2026/10/19
+# @Author : Yoln
+# @File : solver
+# @Project : mahjong-handle-web
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import List, Optional, Sequence
+
+# 难度阈值（按搜索节点数划分）：一路贪心无回溯即为 easy
+EASY_MAX_NODES = 136
+NORMAL_MAX_NODES = 136 * 4
+DEFAULT_NODE_LIMIT = 20000
+
+DIFFICULTIES = ("easy", "normal", "hard")
+
+
+@dataclass
+class SolveResult:
+    """求解结果：solvable 为 None 表示超出搜索预算、无法判定。"""
+
+    solvable: Optional[bool]
+    nodes: int
+    moves: List[int] = field(default_factory=list)
+
+    @property
+    def difficulty(self) -> Optional[str]:
+        if not self.solvable:
+            return None
+        if self.nodes <= EASY_MAX_NODES:
+            return "easy"
+        if self.nodes <= NORMAL_MAX_NODES:
+            return "normal"
+        return "hard"
+
+
+class _Budget(Exception):
+    pass
+
+
+def solve_columns(
+    columns: Sequence[Sequence[str]],
+    temp_limit: int = 7,
+    node_limit: int = DEFAULT_NODE_LIMIT,
+) -> SolveResult:
+    """深度优先求解连连看局面，返回是否可全消及一条取牌序列。
+
+    暂存区内的牌总是互不相同，因此局面完全由各列剩余高度决定：
+    某种牌被取走奇数张时，恰有一张留在暂存区。失败局面按高度编码记忆化。
+    """
+    codes = {}
+    cols: List[List[int]] = [[codes.setdefault(t, len(codes)) for t in col] for col in columns]
+    n = len(cols)
+    heights = [len(col) for col in cols]
+    temp = [False] * max(1, len(codes))
+    temp_size = 0
+    remain = sum(heights)
+    failed = set()
+    moves: List[int] = []
+    nodes = 0
+
+    def next_copy_depth(c: int) -> int:
+        # 与栈顶同种的下一张牌离各列栈顶最近的距离，越近越优先
+        tile = cols[c][heights[c] - 1]
+        best = 99
+        for o in range(n):
+            col = cols[o]
+            h = heights[o] - 1 if o == c else heights[o]
+            for d in range(min(h, best)):
+                if col[h - 1 - d] == tile:
+                    best = d
+                    break
+        return best
+
+    def dfs() -> bool:
+        nonlocal nodes, temp_size, remain
+        if remain == 0:
+            return True
+        key = 0
+        for h in heights:
+            key = key * 9 + h
+        if key in failed:
+            return False
+        nodes += 1
+        if nodes > node_limit:
+            raise _Budget()
+
+        pairs: List[int] = []
+        others: List[int] = []
+        for c in range(n):
+            if heights[c]:
+                (pairs if temp[cols[c][heights[c] - 1]] else others).append(c)
+        if temp_size + 1 >= temp_limit:
+            others = []
+        elif len(others) > 1:
+            others.sort(key=next_copy_depth)
+
+        for c in pairs + others:
+            h = heights[c]
+            tile = cols[c][h - 1]
+            paired = temp[tile]
+            heights[c] = h - 1
+            temp[tile] = not paired
+            temp_size += -1 if paired else 1
+            remain -= 1
+            moves.append(c)
+            if dfs():
+                return True
+            moves.pop()
+            remain += 1
+            temp_size += 1 if paired else -1
+            temp[tile] = paired
+            heights[c] = h
+        failed.add(key)
+        return False
+
+    try:
+        ok = dfs()
+    except _Budget:
+        return SolveResult(solvable=None, nodes=nodes)
+    return SolveResult(solvable=ok, nodes=nodes, moves=moves if ok else [])
@@ -7,7 +7,10 @@ from __future__ import annotations
 
 import argparse
 import os
-from collections import Counter
+from itertools import islice
+from typing import Iterator, List, Tuple
+
+from app.modules.link.utils.parallel import Progress, ordered_map
 
 
 # 34 种牌面定义
@@ -20,6 +23,9 @@ TILE_TYPES = [
 # 每种牌必须出现 4 次；总长度 272
 EXPECTED_COUNTS = {t: 4 for t in TILE_TYPES}
 EXPECTED_LINE_LEN = 136 * 2
+# 牌面 -> 计数向量下标
+TILE_INDEX = {t: i for i, t in enumerate(TILE_TYPES)}
+DEFAULT_CHUNK_SIZE = 5000
 
 
 def parse_line(line: str) -> list[str]:
@@ -36,20 +42,72 @@ def validate_line(line: str, line_no: int) -> list[str]:
         errors.append(f"line {line_no}: length {len(line)} != {EXPECTED_LINE_LEN}")
         return errors
 
-    tiles = parse_line(line)
-    counts = Counter(tiles)
-
-    for t in TILE_TYPES:
-        if counts.get(t, 0) != 4:
-            errors.append(f"line {line_no}: tile {t} count {counts.get(t, 0)} != 4")
+    # 34 维计数向量；非法牌面单独收集（保持首次出现顺序）
+    counts = [0] * len(TILE_TYPES)
+    invalid: dict[str, None] = {}
+    index = TILE_INDEX
+    for i in range(0, EXPECTED_LINE_LEN, 2):
+        token = line[i:i + 2]
+        idx = index.get(token)
+        if idx is None:
+            invalid[token] = None
+        else:
+            counts[idx] += 1
+
+    for t, c in zip(TILE_TYPES, counts):
+        if c != 4:
+            errors.append(f"line {line_no}: tile {t} count {c} != 4")
     # 检查非法牌面
-    for t in counts.keys():
-        if t not in EXPECTED_COUNTS:
-            errors.append(f"line {line_no}: invalid tile token {t}")
+    for t in invalid:
+        errors.append(f"line {line_no}: invalid tile token {t}")
 
     return errors
 
 
+def _validate_chunk(chunk: List[Tuple[int, str]]) -> Tuple[int, int, List[str]]:
+    """进程池任务：校验一组 (行号, 内容)，返回 (行数, 坏行数, 错误列表)。"""
+    bad = 0
+    errors: List[str] = []
+    for line_no, line in chunk:
+        errs = validate_line(line, line_no)
+        if errs:
+            bad += 1
+            errors.extend(errs)
+    return len(chunk), bad, errors
+
+
+def _iter_chunks(path: str, chunk_size: int) -> Iterator[List[Tuple[int, str]]]:
+    """流式读取题库，按块产出非空行及其行号。"""
+    with open(path, "r", encoding="utf-8") as f:
+        numbered = ((idx, raw.strip()) for idx, raw in enumerate(f, 1))
+        lines = ((idx, line) for idx, line in numbered if line)
+        while True:
+            chunk = list(islice(lines, chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+
+def validate_file(
+    path: str,
+    *,
+    workers: int = 1,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    progress: Progress | None = None,
+) -> Tuple[int, int, List[str]]:
+    """分块并行校验整个题库文件，返回 (总行数, 坏行数, 错误列表)。"""
+    total = 0
+    bad = 0
+    errors: List[str] = []
+    for n, b, errs in ordered_map(_validate_chunk, _iter_chunks(path, chunk_size), workers=workers):
+        total += n
+        bad += b
+        errors.extend(errs)
+        if progress is not None:
+            progress.advance(n)
+    return total, bad, errors
+
+
 def main() -> None:
     """CLI 入口：批量校验题库文件。"""
     parser = argparse.ArgumentParser(description="Validate link hands dataset.")
@@ -63,25 +121,21 @@ def main() -> None:
         default=default_path,
         help="hands file path",
     )
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="lines per worker task")
     args = parser.parse_args()
 
     if not os.path.exists(args.path):
         raise SystemExit(f"file not found: {args.path}")
 
-    total = 0
-    bad = 0
-    errors: list[str] = []
-
-    with open(args.path, "r", encoding="utf-8") as f:
-        for idx, raw in enumerate(f, 1):
-            line = raw.strip()
-            if not line:
-                continue
-            total += 1
-            errs = validate_line(line, idx)
-            if errs:
-                bad += 1
-                errors.extend(errs)
+    progress = Progress("validate")
+    total, bad, errors = validate_file(
+        args.path,
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+        progress=progress,
+    )
+    progress.report()
 
     if errors:
         print("INVALID")
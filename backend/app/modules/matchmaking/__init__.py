@@ -0,0 +1 @@
+"""Quick-match queues that pair waiting players into battle and nonogram-battle matches."""
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+from fastapi import APIRouter
+
+from app.api.deps import battle_repo, log, matchmaker, nonogram_battle_repo, nonogram_recent_puzzles
+from app.modules.battle.domain import create_battle, join_battle
+from app.modules.matchmaking.schemas import ApiError, ApiResponse, CancelReq, EnqueueReq
+from app.modules.nonogram_battle.api import pick_puzzle
+from app.modules.nonogram_battle.domain import create_match, join_match
+from app.modules.nonogram_battle.schemas import CreateReq
+
+router = APIRouter()
+
+
+def pool_name(req: EnqueueReq) -> str:
+    if req.game == "battle":
+        return f"battle:{req.mode}:{req.questionCount}"
+    return f"nonogram-battle:{req.size}:{req.difficulty}"
+
+
+def start_match(pool: str, first: str, second: str) -> str:
+    """Create a match for a popped pair; the longer waiter is the creator."""
+    game, option, value = pool.split(":")
+    if game == "battle":
+        state = create_battle(creator_user_id=first, mode=option, question_count=int(value))  # type: ignore[arg-type]
+        join_battle(state, second)
+        battle_repo.create(state)
+    else:
+        _, bank_id, puzzle = pick_puzzle(CreateReq(userId=first, size=int(option), difficulty=value))  # type: ignore[arg-type]
+        state = create_match(first, int(option), value, puzzle=puzzle)
+        if bank_id is not None:
+            state["bankPuzzleId"] = bank_id
+            nonogram_recent_puzzles.add(first, bank_id)
+            nonogram_recent_puzzles.add(second, bank_id)
+        join_match(state, second)
+        nonogram_battle_repo.create(state)
+    log.info("matchmaking_match pool=%s matchId=%s users=%s,%s", pool, state["matchId"], first, second)
+    return state["matchId"]
+
+
+def _ticket_payload(ticket: dict) -> dict:
+    game = ticket["pool"].split(":", 1)[0]
+    return {"game": game, "depth": matchmaker.queue.depth(ticket["pool"]), **ticket}
+
+
+@router.post("/enqueue", response_model=ApiResponse)
+def enqueue(req: EnqueueReq) -> ApiResponse:
+    """Join the quick-match queue for these settings; pairs right away if someone is waiting."""
+    pool = pool_name(req)
+    matchmaker.enqueue(pool, req.userId)
+    matchmaker.tick(pool, start_match)
+    log.info("matchmaking_enqueue pool=%s userId=%s", pool, req.userId)
+    return ApiResponse(ok=True, data=_ticket_payload(matchmaker.ticket(req.userId) or {}), error=None)
+
+
+@router.get("/status", response_model=ApiResponse)
+def status(userId: str) -> ApiResponse:
+    """Poll a ticket: ``waiting`` (also ticks the pool), ``matched`` with ``matchId``, or ``expired``."""
+    ticket = matchmaker.ticket(userId)
+    if ticket is None:
+        return ApiResponse(ok=False, data=None, error=ApiError(code="TICKET_NOT_FOUND", message="未在匹配队列中"))
+    if ticket["state"] == "waiting":
+        matchmaker.tick(ticket["pool"], start_match)
+        ticket = matchmaker.ticket(userId) or ticket
+    return ApiResponse(ok=True, data=_ticket_payload(ticket), error=None)
+
+
+@router.post("/cancel", response_model=ApiResponse)
+def cancel(req: CancelReq) -> ApiResponse:
+    return ApiResponse(ok=True, data={"cancelled": matchmaker.cancel(req.userId)}, error=None)
+
+
+@router.get("/stats", response_model=ApiResponse)
+def stats() -> ApiResponse:
+    """Queue depth per pool plus this process's depth and wait-time histograms."""
+    return ApiResponse(ok=True, data=matchmaker.stats(), error=None)
@@ -0,0 +1,309 @@
+"""Quick-match queues: waiting players per pool, paired oldest-first.
+
+A pool is one set of match settings (``battle:normal:3``, ``nonogram-battle:10:hard``).
+Entries are ordered by enqueue time, so the longest waiters pair first; anyone who
+waited past ``timeout`` is dropped on the next tick. Pairs are popped atomically, so
+several API processes can tick the same Redis pool without matching a player twice.
+There is no background loop: enqueueing and polling tick the player's pool, and a
+tick creates at most ``max_pairs`` matches.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Protocol, Sequence, Tuple
+
+import redis
+
+log = logging.getLogger("mahjong.matchmaking")
+
+WAIT_BUCKETS = (1, 2, 5, 10, 30, 60, 120, 300)
+DEPTH_BUCKETS = (0, 1, 2, 5, 10, 50, 100, 500, 1000, 5000)
+
+Entry = Tuple[str, float]
+Pair = Tuple[Entry, Entry]
+StartMatch = Callable[[str, str, str], str]
+
+
+class MatchQueue(Protocol):
+    store_type: str
+    def enqueue(self, pool: str, user_id: str, now: float) -> float: ...
+    def cancel(self, pool: str, user_id: str) -> bool: ...
+    def contains(self, pool: str, user_id: str) -> bool: ...
+    def pop_pairs(self, pool: str, limit: int, expire_before: float) -> Tuple[List[Pair], int]: ...
+    def requeue(self, pool: str, entries: Sequence[Entry]) -> None: ...
+    def depth(self, pool: str) -> int: ...
+    def set_ticket(self, user_id: str, ticket: Dict[str, Any], ttl: int) -> None: ...
+    def get_ticket(self, user_id: str) -> Optional[Dict[str, Any]]: ...
+    def clear_ticket(self, user_id: str) -> None: ...
+
+
+def _pairs(entries: List[Entry]) -> List[Pair]:
+    return [(entries[i], entries[i + 1]) for i in range(0, len(entries) - 1, 2)]
+
+
+class MemoryMatchQueue:
+    """Insertion-ordered dicts per pool: O(1) enqueue, cancel and pop for a single process."""
+
+    store_type = "memory"
+
+    def __init__(self) -> None:
+        self._pools: Dict[str, "OrderedDict[str, float]"] = {}
+        self._tickets: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        self._swept_at = 0.0
+        self._lock = threading.Lock()
+
+    def enqueue(self, pool: str, user_id: str, now: float) -> float:
+        with self._lock:
+            # Re-enqueueing keeps the original place in line.
+            return self._pools.setdefault(pool, OrderedDict()).setdefault(user_id, now)
+
+    def cancel(self, pool: str, user_id: str) -> bool:
+        with self._lock:
+            return self._pools.get(pool, {}).pop(user_id, None) is not None
+
+    def contains(self, pool: str, user_id: str) -> bool:
+        return user_id in self._pools.get(pool, ())
+
+    def pop_pairs(self, pool: str, limit: int, expire_before: float) -> Tuple[List[Pair], int]:
+        with self._lock:
+            waiting = self._pools.get(pool)
+            if not waiting:
+                return [], 0
+            expired = 0
+            while waiting and next(iter(waiting.values())) < expire_before:
+                waiting.popitem(last=False)
+                expired += 1
+            count = min(limit * 2, len(waiting)) // 2 * 2
+            entries = [waiting.popitem(last=False) for _ in range(count)]
+            return _pairs(entries), expired
+
+    def requeue(self, pool: str, entries: Sequence[Entry]) -> None:
+        with self._lock:
+            waiting = self._pools.setdefault(pool, OrderedDict())
+            for user_id, enqueued_at in reversed(entries):
+                waiting[user_id] = enqueued_at
+                waiting.move_to_end(user_id, last=False)
+
+    def depth(self, pool: str) -> int:
+        return len(self._pools.get(pool, ()))
+
+    def set_ticket(self, user_id: str, ticket: Dict[str, Any], ttl: int) -> None:
+        now = time.time()
+        with self._lock:
+            self._tickets[user_id] = (now + ttl, ticket)
+            if now - self._swept_at > 60:
+                self._swept_at = now
+                for stale in [uid for uid, (expires, _) in self._tickets.items() if expires < now]:
+                    del self._tickets[stale]
+
+    def get_ticket(self, user_id: str) -> Optional[Dict[str, Any]]:
+        value = self._tickets.get(user_id)
+        if value is None or value[0] < time.time():
+            return None
+        return value[1]
+
+    def clear_ticket(self, user_id: str) -> None:
+        self._tickets.pop(user_id, None)
+
+
+# Drops timed-out waiters, then pops the oldest even number of entries (at most 2 * ARGV[1]).
+# An odd leftover goes straight back with its original score.
+_POP_PAIRS_SCRIPT = """
+local expired = redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', '(' .. ARGV[2])
+local popped = redis.call('ZPOPMIN', KEYS[1], tonumber(ARGV[1]) * 2)
+if (#popped / 2) % 2 == 1 then
+  redis.call('ZADD', KEYS[1], popped[#popped], popped[#popped - 1])
+  table.remove(popped)
+  table.remove(popped)
+end
+return {expired, popped}
+"""
+
+
+class RedisMatchQueue:
+    """One sorted set per pool scored by enqueue time: O(log n) enqueue, cancel and pop,
+    shared by every API process."""
+
+    store_type = "redis"
+
+    def __init__(self, url: str, key_prefix: str = "mh:v1:matchmaking"):
+        self.redis = redis.Redis.from_url(url, decode_responses=True)
+        self.key_prefix = key_prefix
+        self._pop_pairs = self.redis.register_script(_POP_PAIRS_SCRIPT)
+
+    def key(self, *parts: str) -> str:
+        return ":".join((self.key_prefix,) + parts)
+
+    def enqueue(self, pool: str, user_id: str, now: float) -> float:
+        pipe = self.redis.pipeline()
+        pipe.zadd(self.key("pool", pool), {user_id: now}, nx=True)
+        pipe.zscore(self.key("pool", pool), user_id)
+        return float(pipe.execute()[1])
+
+    def cancel(self, pool: str, user_id: str) -> bool:
+        return bool(self.redis.zrem(self.key("pool", pool), user_id))
+
+    def contains(self, pool: str, user_id: str) -> bool:
+        return self.redis.zscore(self.key("pool", pool), user_id) is not None
+
+    def pop_pairs(self, pool: str, limit: int, expire_before: float) -> Tuple[List[Pair], int]:
+        expired, popped = self._pop_pairs(keys=[self.key("pool", pool)], args=[limit, expire_before])
+        entries = [(popped[i], float(popped[i + 1])) for i in range(0, len(popped), 2)]
+        return _pairs(entries), int(expired)
+
+    def requeue(self, pool: str, entries: Sequence[Entry]) -> None:
+        if entries:
+            self.redis.zadd(self.key("pool", pool), {user_id: enqueued_at for user_id, enqueued_at in entries})
+
+    def depth(self, pool: str) -> int:
+        return int(self.redis.zcard(self.key("pool", pool)))
+
+    def set_ticket(self, user_id: str, ticket: Dict[str, Any], ttl: int) -> None:
+        self.redis.set(self.key("ticket", user_id), json.dumps(ticket, ensure_ascii=False), ex=ttl)
+
+    def get_ticket(self, user_id: str) -> Optional[Dict[str, Any]]:
+        raw = self.redis.get(self.key("ticket", user_id))
+        return json.loads(raw) if raw else None
+
+    def clear_ticket(self, user_id: str) -> None:
+        self.redis.delete(self.key("ticket", user_id))
+
+
+def _histogram(buckets: Sequence[float]) -> Dict[str, Any]:
+    # counts[i] holds values <= buckets[i]; the extra last slot is everything above.
+    return {"buckets": list(buckets), "counts": [0] * (len(buckets) + 1), "sum": 0.0, "count": 0}
+
+
+def _observe(histogram: Dict[str, Any], value: float) -> None:
+    histogram["counts"][bisect_left(histogram["buckets"], value)] += 1
+    histogram["sum"] += value
+    histogram["count"] += 1
+
+
+class Matchmaker:
+    """Tickets and ticks over a ``MatchQueue``.
+
+    A ticket is what a player polls: ``waiting`` (with the pool) until a tick pairs them,
+    then ``matched`` with the ``matchId``. ``start`` creates the match for a popped pair
+    and returns its id; if it raises, the pair goes back to the front of the queue.
+    Histograms count this process's ticks only; depth is read from the shared queue.
+    """
+
+    def __init__(self, queue: MatchQueue, *, timeout: float = 120.0, max_pairs: int = 32, ticket_ttl: int = 600):
+        self.queue = queue
+        self.timeout = timeout
+        self.max_pairs = max_pairs
+        self.ticket_ttl = ticket_ttl
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[str, Any]] = {}
+
+    def _counter(self, pool: str) -> Dict[str, Any]:
+        counter = self._counters.get(pool)
+        if counter is None:
+            counter = self._counters[pool] = {
+                "matched": 0,
+                "expired": 0,
+                "failed": 0,
+                "depth": _histogram(DEPTH_BUCKETS),
+                "waitSeconds": _histogram(WAIT_BUCKETS),
+            }
+        return counter
+
+    def enqueue(self, pool: str, user_id: str) -> Dict[str, Any]:
+        previous = self.queue.get_ticket(user_id)
+        if previous and previous.get("state") == "waiting" and previous.get("pool") != pool:
+            self.queue.cancel(previous["pool"], user_id)
+        enqueued_at = self.queue.enqueue(pool, user_id, time.time())
+        ticket = {"state": "waiting", "pool": pool, "enqueuedAt": enqueued_at}
+        self.queue.set_ticket(user_id, ticket, self.ticket_ttl)
+        return ticket
+
+    def cancel(self, user_id: str) -> bool:
+        ticket = self.queue.get_ticket(user_id)
+        if not ticket or ticket.get("state") != "waiting":
+            return False
+        self.queue.clear_ticket(user_id)
+        return self.queue.cancel(ticket["pool"], user_id)
+
+    def ticket(self, user_id: str) -> Optional[Dict[str, Any]]:
+        ticket = self.queue.get_ticket(user_id)
+        if ticket and ticket.get("state") == "waiting" and not self.queue.contains(ticket["pool"], user_id):
+            # Popped by a tick that is still creating the match, or dropped after the timeout.
+            if time.time() - ticket["enqueuedAt"] >= self.timeout:
+                return {**ticket, "state": "expired"}
+        return ticket
+
+    def tick(self, pool: str, start: StartMatch) -> int:
+        now = time.time()
+        pairs, expired = self.queue.pop_pairs(pool, self.max_pairs, now - self.timeout)
+        depth = self.queue.depth(pool)
+        matched = 0
+        waits: List[float] = []
+        failed: List[Entry] = []
+        for first, second in pairs:
+            try:
+                match_id = start(pool, first[0], second[0])
+            except Exception:
+                log.exception("matchmaking_start_failed pool=%s users=%s,%s", pool, first[0], second[0])
+                failed += [first, second]
+                continue
+            matched += 1
+            for (user_id, enqueued_at), (opponent, _) in ((first, second), (second, first)):
+                waits.append(now - enqueued_at)
+                self.queue.set_ticket(user_id, {
+                    "state": "matched",
+                    "pool": pool,
+                    "enqueuedAt": enqueued_at,
+                    "matchId": match_id,
+                    "opponentUserId": opponent,
+                    "waitedSeconds": round(now - enqueued_at, 3),
+                }, self.ticket_ttl)
+        if failed:
+            self.queue.requeue(pool, failed)
+        with self._lock:
+            counter = self._counter(pool)
+            counter["matched"] += matched
+            counter["expired"] += expired
+            counter["failed"] += len(failed) // 2
+            _observe(counter["depth"], depth)
+            for waited in waits:
+                _observe(counter["waitSeconds"], waited)
+        return matched
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pools = {
+                pool: {
+                    "depth": self.queue.depth(pool),
+                    "matched": counter["matched"],
+                    "expired": counter["expired"],
+                    "failed": counter["failed"],
+                    "depthHistogram": dict(counter["depth"], counts=list(counter["depth"]["counts"])),
+                    "waitSeconds": dict(counter["waitSeconds"], counts=list(counter["waitSeconds"]["counts"])),
+                }
+                for pool, counter in sorted(self._counters.items())
+            }
+        return {
+            "storage": self.queue.store_type,
+            "timeoutSeconds": self.timeout,
+            "maxPairsPerTick": self.max_pairs,
+            "pools": pools,
+        }
+
+
+def create_matchmaker_from_env() -> Matchmaker:
+    if os.getenv("GAME_REPO", "memory").lower() == "redis":
+        queue: MatchQueue = RedisMatchQueue(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+    else:
+        queue = MemoryMatchQueue()
+    return Matchmaker(
+        queue,
+        timeout=float(os.getenv("MATCHMAKING_TIMEOUT_SECONDS", "120")),
+        max_pairs=int(os.getenv("MATCHMAKING_PAIRS_PER_TICK", "32")),
+    )
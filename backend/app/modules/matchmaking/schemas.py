@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Literal, Optional
+
+from pydantic import BaseModel, Field
+
+
+class ApiError(BaseModel):
+    code: str
+    message: str
+    detail: Optional[Dict[str, Any]] = None
+
+
+class ApiResponse(BaseModel):
+    ok: bool
+    data: Optional[Dict[str, Any]] = None
+    error: Optional[ApiError] = None
+
+
+class EnqueueReq(BaseModel):
+    userId: str = Field(..., min_length=1)
+    game: Literal["battle", "nonogram-battle"]
+    # battle
+    mode: Literal["normal", "riichi", "guobiao"] = "normal"
+    questionCount: int = Field(1, ge=1, le=5)
+    # nonogram-battle
+    size: int = Field(10, ge=5, le=25)
+    difficulty: Literal["easy", "normal", "hard"] = "normal"
+
+
+class CancelReq(BaseModel):
+    userId: str = Field(..., min_length=1)
@@ -0,0 +1 @@
+"""Stateless helpers for the single-player nonogram game."""
@@ -0,0 +1,17 @@
+from __future__ import annotations
+
+from fastapi import APIRouter
+
+from app.modules.nonogram_battle.hint import board_hint
+from app.modules.nonogram_battle.schemas import ApiError, ApiResponse, HintReq
+
+router = APIRouter()
+
+
+@router.post("/hint", response_model=ApiResponse)
+def hint(req: HintReq) -> ApiResponse:
+    """Next forced cell for a board the client holds; the puzzle is never stored server-side."""
+    try:
+        return ApiResponse(ok=True, data=board_hint(req.rowClues, req.columnClues, req.board), error=None)
+    except ValueError as exc:
+        return ApiResponse(ok=False, data=None, error=ApiError(code=str(exc), message=str(exc)))
@@ -1,71 +1,243 @@
 from __future__ import annotations
 
-from fastapi import APIRouter
+from typing import Optional, Union
 
-from app.api.deps import log, nonogram_battle_repo
-from app.modules.nonogram_battle.domain import apply_move, clear_board, create_match, join_match, status_payload
-from app.modules.nonogram_battle.schemas import ApiError, ApiResponse, CreateReq, JoinReq, MoveReq
+from fastapi import APIRouter, Request
+from fastapi.responses import Response
+
+from app.api.conditional import etag, not_modified, tag_response
+from app.api.deps import (
+    event_broker,
+    log,
+    match_snapshots,
+    nonogram_battle_repo,
+    nonogram_puzzle_bank,
+    nonogram_puzzle_pool,
+    nonogram_recent_puzzles,
+    settled_cache,
+)
+from app.modules.nonogram_battle.domain import (
+    change_events,
+    clear_board,
+    create_match,
+    join_match,
+    move_events,
+    progress_percent,
+    spectator_payload,
+    status_payload,
+    sync_event,
+)
+from app.modules.nonogram_battle.hint import battle_hint
+from app.modules.nonogram_battle.puzzles import load_puzzle
+from app.modules.nonogram_battle.schemas import ApiError, ApiResponse, CreateReq, JoinReq, MoveReq, MovesReq
+from app.modules.push.broker import publish
+from app.modules.push.sse import last_version, stream_response
 
 router = APIRouter()
 
 
+def channel(match_id: str) -> str:
+    return f"nonogram-battle:{match_id}"
+
+
 def error(code: str) -> ApiResponse:
     return ApiResponse(ok=False, data=None, error=ApiError(code=code, message=code))
 
 
+def not_found(exc: KeyError) -> ApiResponse:
+    """A missing shared puzzle is reported as such, not as a missing match."""
+    return error("PUZZLE_NOT_FOUND" if exc.args and exc.args[0] == "PUZZLE_NOT_FOUND" else "MATCH_NOT_FOUND")
+
+
+def pick_puzzle(req: CreateReq):
+    """Bank first (no repeats for the creator), then the background pool; None means generate inline."""
+    if nonogram_puzzle_bank is not None:
+        picked = nonogram_puzzle_bank.sample(
+            req.size,
+            req.difficulty,
+            req.scoreMin,
+            req.scoreMax,
+            exclude=nonogram_recent_puzzles.seen(req.userId),
+        )
+        if picked is not None:
+            return "bank", picked[0], picked[1]
+    puzzle = nonogram_puzzle_pool.draw(req.size, req.difficulty)
+    return ("pool" if puzzle is not None else "generated"), None, puzzle
+
+
 @router.post("/create", response_model=ApiResponse)
 def create(req: CreateReq) -> ApiResponse:
     try:
-        state = create_match(req.userId, req.size, req.difficulty)
+        source, bank_id, puzzle = pick_puzzle(req)
+        state = create_match(req.userId, req.size, req.difficulty, puzzle=puzzle)
+        if bank_id is not None:
+            state["bankPuzzleId"] = bank_id
+            nonogram_recent_puzzles.add(req.userId, bank_id)
         nonogram_battle_repo.create(state)
-        log.info("nonogram_battle_create matchId=%s size=%s", state["matchId"], req.size)
+        log.info("nonogram_battle_create matchId=%s size=%s source=%s", state["matchId"], req.size, source)
         return ApiResponse(ok=True, data=status_payload(state, req.userId), error=None)
     except Exception as exc:
         return error(str(exc) or "CREATE_FAILED")
 
 
+@router.get("/pool", response_model=ApiResponse)
+def pool_stats() -> ApiResponse:
+    return ApiResponse(ok=True, data=nonogram_puzzle_pool.stats(), error=None)
+
+
+@router.get("/puzzles/{puzzle_id}", response_model=ApiResponse)
+def puzzle(puzzle_id: str) -> ApiResponse:
+    """Static clues for a ``puzzleId``; immutable, so clients fetch them once per match."""
+    try:
+        return ApiResponse(ok=True, data=load_puzzle(puzzle_id).public_dict(), error=None)
+    except KeyError:
+        return error("PUZZLE_NOT_FOUND")
+
+
 @router.post("/{match_id}/join", response_model=ApiResponse)
 def join(match_id: str, req: JoinReq) -> ApiResponse:
     try:
         state = nonogram_battle_repo.update(match_id, lambda current: join_match(current, req.userId))
+        publish(event_broker, channel(match_id), *change_events(state, req.userId, "joined"))
+        if state.get("bankPuzzleId") is not None:
+            nonogram_recent_puzzles.add(req.userId, state["bankPuzzleId"])
         return ApiResponse(ok=True, data=status_payload(state, req.userId), error=None)
-    except KeyError:
-        return error("MATCH_NOT_FOUND")
+    except KeyError as exc:
+        return not_found(exc)
     except ValueError as exc:
         return error(str(exc))
 
 
 @router.get("/{match_id}/status", response_model=ApiResponse)
-def status(match_id: str, userId: str) -> ApiResponse:
+def status(match_id: str, userId: str, request: Request, response: Response, clues: bool = True) -> Union[ApiResponse, Response]:
+    """Per-player view; a finished match's response is served from ``settled_cache``."""
+    key = f"nonogram-battle:status:{match_id}:{userId}:{int(clues)}"
+    cached = settled_cache.respond(request, key, private=True)
+    if cached is not None:
+        return cached
+    cached = not_modified(request, nonogram_battle_repo.version(match_id), userId, clues)
+    if cached is not None:
+        return cached
     state = nonogram_battle_repo.get(match_id)
     if state is None:
         return error("MATCH_NOT_FOUND")
     try:
-        return ApiResponse(ok=True, data=status_payload(state, userId), error=None)
+        payload = status_payload(state, userId, include_clues=clues)
+        if state["status"] == "finished":
+            tag = etag(state.get("version", 0), userId, clues)
+            return settled_cache.store(request, key, ApiResponse(ok=True, data=payload, error=None), tag, private=True)
+        tag_response(response, state.get("version", 0), userId, clues)
+        return ApiResponse(ok=True, data=payload, error=None)
+    except KeyError:
+        return error("PUZZLE_NOT_FOUND")
     except ValueError as exc:
         return error(str(exc))
 
 
+@router.get("/{match_id}/spectate", response_model=ApiResponse)
+def spectate(match_id: str, request: Request, response: Response) -> Union[ApiResponse, Response]:
+    """Spectator view, no ``userId`` needed. Built once per match version and shared by
+    every viewer in the process; ``/events`` pushes the same match live."""
+
+    def build():
+        state = nonogram_battle_repo.get(match_id)
+        return spectator_payload(state) if state else None
+
+    try:
+        payload = match_snapshots.get(f"spectate:{channel(match_id)}", lambda: nonogram_battle_repo.version(match_id), build)
+    except KeyError as exc:
+        return not_found(exc)
+    if payload is None:
+        return error("MATCH_NOT_FOUND")
+    cached = not_modified(request, payload["version"], "spectate")
+    if cached is not None:
+        return cached
+    tag_response(response, payload["version"], "spectate")
+    return ApiResponse(ok=True, data=payload, error=None)
+
+
+@router.get("/{match_id}/hint", response_model=ApiResponse)
+def hint(match_id: str, userId: str) -> ApiResponse:
+    """Next cell forced by one row/column of the caller's board, plus whether the board has mistakes."""
+    state = nonogram_battle_repo.get(match_id)
+    if state is None:
+        return error("MATCH_NOT_FOUND")
+    try:
+        return ApiResponse(ok=True, data=battle_hint(state, userId), error=None)
+    except KeyError:
+        return error("PUZZLE_NOT_FOUND")
+    except ValueError as exc:
+        return error(str(exc))
+
+
+@router.get("/{match_id}/events", response_model=None)
+def events(match_id: str, request: Request, lastVersion: Optional[int] = None) -> Union[ApiResponse, Response]:
+    """Server-sent ``sync``/``joined``/``progress``/``finished`` events keyed by match version."""
+
+    def build():
+        state = nonogram_battle_repo.get(match_id)
+        return sync_event(state) if state else None
+
+    def snapshot():
+        # Shared by every stream on this match; never older than the current version.
+        return match_snapshots.get(f"sync:{channel(match_id)}", lambda: nonogram_battle_repo.version(match_id), build, fresh_seconds=0)
+
+    try:
+        current = snapshot()
+    except KeyError as exc:
+        return not_found(exc)
+    if current is None:
+        return error("MATCH_NOT_FOUND")
+    return stream_response(request, event_broker, channel(match_id), snapshot, last_version(request, lastVersion), current)
+
+
 @router.post("/{match_id}/move", response_model=ApiResponse)
 def move(match_id: str, req: MoveReq) -> ApiResponse:
     try:
-        state = nonogram_battle_repo.update(
-            match_id,
-            lambda current: apply_move(current, req.userId, req.row, req.column, req.state),
-        )
+        result = nonogram_battle_repo.move(match_id, req.userId, [(req.row, req.column, req.state)])
+        publish(event_broker, channel(match_id), *move_events(req.userId, result))
+        state = nonogram_battle_repo.get(match_id)
+        if state is None:
+            return error("MATCH_NOT_FOUND")
         return ApiResponse(ok=True, data=status_payload(state, req.userId), error=None)
-    except KeyError:
-        return error("MATCH_NOT_FOUND")
+    except KeyError as exc:
+        return not_found(exc)
+    except ValueError as exc:
+        return error(str(exc))
+
+
+@router.post("/{match_id}/moves", response_model=ApiResponse)
+def moves(match_id: str, req: MovesReq) -> ApiResponse:
+    """Apply a stroke of cell edits at once and acknowledge with version/progress only."""
+    try:
+        result = nonogram_battle_repo.move(match_id, req.userId, [(cell.row, cell.column, cell.state) for cell in req.cells])
+        publish(event_broker, channel(match_id), *move_events(req.userId, result))
+    except KeyError as exc:
+        return not_found(exc)
     except ValueError as exc:
         return error(str(exc))
+    return ApiResponse(
+        ok=True,
+        data={
+            "matchId": match_id,
+            "version": result["version"],
+            "applied": len(req.cells),
+            "progress": progress_percent(result["answered"], result["size"]),
+            "finished": result["finished"],
+            "status": result["status"],
+            "winnerUserId": result["winnerUserId"],
+        },
+        error=None,
+    )
 
 
 @router.post("/{match_id}/clear", response_model=ApiResponse)
 def clear(match_id: str, req: JoinReq) -> ApiResponse:
     try:
         state = nonogram_battle_repo.update(match_id, lambda current: clear_board(current, req.userId))
+        publish(event_broker, channel(match_id), *change_events(state, req.userId))
         return ApiResponse(ok=True, data=status_payload(state, req.userId), error=None)
-    except KeyError:
-        return error("MATCH_NOT_FOUND")
+    except KeyError as exc:
+        return not_found(exc)
     except ValueError as exc:
         return error(str(exc))
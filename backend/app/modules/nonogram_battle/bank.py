@@ -0,0 +1,338 @@
+"""Offline nonogram puzzle bank.
+
+Build a bank once with worker processes, then sample puzzles at match creation
+without any generation cost::
+
+    python -m app.modules.nonogram_battle.bank build --out puzzle_bank.bin --per-key 200 --workers 4
+    python -m app.modules.nonogram_battle.bank inspect puzzle_bank.bin
+
+File layout (little endian): ``b"NGBK"``, version ``u16``, section count ``u32``;
+then one ``(size u8, difficulty u8, count u32, offset u32)`` entry per section;
+then the records. Records within a section are sorted by score and have a fixed
+width (``score u8`` + the solution as row-major packed bits), so a record is
+located by offset arithmetic and a score range by binary search.
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import os
+import random
+import secrets
+import struct
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Deque, Dict, Iterable, List, Optional, Protocol, Set, Tuple
+
+import redis
+
+from app.modules.nonogram_battle.domain import _logical_difficulty_score, generate_puzzle, solution_clues
+
+DIFFICULTIES = ("easy", "normal", "hard")
+MAGIC = b"NGBK"
+VERSION = 1
+_HEADER = struct.Struct("<4sHI")
+_SECTION = struct.Struct("<BBII")
+
+Solution = List[List[bool]]
+SectionKey = Tuple[int, str]
+Puzzle = Tuple[Solution, List[List[int]], List[List[int]]]
+
+
+def _record_size(size: int) -> int:
+    return 1 + (size * size + 7) // 8
+
+
+def pack_solution(solution: Solution) -> bytes:
+    size = len(solution)
+    value = 0
+    for row in solution:
+        for cell in row:
+            value = value << 1 | bool(cell)
+    return value.to_bytes((size * size + 7) // 8, "big")
+
+
+def unpack_solution(data: bytes, size: int) -> Solution:
+    value = int.from_bytes(data, "big")
+    cells = size * size
+    return [[bool(value >> (cells - 1 - row * size - column) & 1) for column in range(size)] for row in range(size)]
+
+
+def _variants(solution: Solution) -> Iterable[Solution]:
+    grid = [list(row) for row in solution]
+    for _ in range(4):
+        yield grid
+        yield [row[::-1] for row in grid]
+        grid = [list(row) for row in zip(*grid[::-1])]
+
+
+def canonical_hash(solution: Solution) -> bytes:
+    """Hash shared by a solution and all of its rotations and mirror images."""
+    canonical = min(pack_solution(variant) for variant in _variants(solution))
+    return hashlib.blake2b(bytes([len(solution)]) + canonical, digest_size=8).digest()
+
+
+def _generate_batch(task: Tuple[int, str, int, int]) -> Tuple[int, str, List[Tuple[bytes, int, bytes]]]:
+    """Worker task: ``count`` puzzles as ``(canonical hash, score, packed solution)``."""
+    size, difficulty, count, seed = task
+    random.seed(seed)
+    records = []
+    for _ in range(count):
+        solution, rows, columns = generate_puzzle(size, difficulty)
+        score = _logical_difficulty_score(rows, columns)
+        if score is not None:
+            records.append((canonical_hash(solution), score, pack_solution(solution)))
+    return size, difficulty, records
+
+
+def write_bank(path: str, sections: Dict[SectionKey, List[Tuple[int, bytes]]]) -> int:
+    keys = sorted(sections, key=lambda key: (key[0], DIFFICULTIES.index(key[1])))
+    table = []
+    offset = 0
+    for size, difficulty in keys:
+        count = len(sections[(size, difficulty)])
+        table.append(_SECTION.pack(size, DIFFICULTIES.index(difficulty), count, offset))
+        offset += count * _record_size(size)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, len(keys)))
+        f.write(b"".join(table))
+        for key in keys:
+            for score, packed in sorted(sections[key], key=lambda record: record[0]):
+                f.write(bytes([score]) + packed)
+    os.replace(tmp, path)
+    return sum(len(records) for records in sections.values())
+
+
+class PuzzleBank:
+    """Read-only view of a bank file, loaded fully into memory."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._data = f.read()
+        magic, version, count = _HEADER.unpack_from(self._data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"not a nonogram bank file: {path}")
+        base = _HEADER.size + count * _SECTION.size
+        # (size, difficulty) -> (first puzzle id, count, byte offset, record size)
+        self.sections: Dict[SectionKey, Tuple[int, int, int, int]] = {}
+        first_id = 0
+        for i in range(count):
+            size, difficulty, records, offset = _SECTION.unpack_from(self._data, _HEADER.size + i * _SECTION.size)
+            self.sections[(size, DIFFICULTIES[difficulty])] = (first_id, records, base + offset, _record_size(size))
+            first_id += records
+        self.total = first_id
+
+    def _score(self, offset: int, record: int, index: int) -> int:
+        return self._data[offset + index * record]
+
+    def _bound(self, key: SectionKey, score: int) -> int:
+        """First index in the section whose score is >= ``score``."""
+        _, count, offset, record = self.sections[key]
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._score(offset, record, mid) < score:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _record(self, key: SectionKey, index: int) -> Tuple[int, Puzzle]:
+        _, _, offset, record = self.sections[key]
+        start = offset + index * record
+        solution = unpack_solution(self._data[start + 1:start + record], key[0])
+        rows, columns = solution_clues(solution)
+        return self._data[start], (solution, rows, columns)
+
+    def score_range(self, key: SectionKey) -> Optional[Tuple[int, int]]:
+        _, count, offset, record = self.sections[key]
+        if not count:
+            return None
+        return self._score(offset, record, 0), self._score(offset, record, count - 1)
+
+    def get(self, puzzle_id: int) -> Tuple[int, Puzzle]:
+        """Return ``(score, puzzle)`` for a puzzle id."""
+        for key, (first_id, count, _, _) in self.sections.items():
+            if first_id <= puzzle_id < first_id + count:
+                return self._record(key, puzzle_id - first_id)
+        raise KeyError(puzzle_id)
+
+    def sample(
+        self,
+        size: int,
+        difficulty: str,
+        score_min: Optional[int] = None,
+        score_max: Optional[int] = None,
+        exclude: Set[int] = frozenset(),
+        rng: Optional[random.Random] = None,
+    ) -> Optional[Tuple[int, Puzzle]]:
+        """Pick a random puzzle in the score range, avoiding ``exclude`` while any other choice exists."""
+        key = (size, difficulty)
+        if key not in self.sections:
+            return None
+        rng = rng or random
+        first_id, count, _, _ = self.sections[key]
+        lo = self._bound(key, score_min) if score_min is not None else 0
+        hi = self._bound(key, score_max + 1) if score_max is not None else count
+        if lo >= hi:
+            return None
+        index = rng.randrange(lo, hi)
+        for _ in range(8):
+            if first_id + index not in exclude:
+                break
+            index = rng.randrange(lo, hi)
+        else:
+            start = index
+            while first_id + index in exclude:
+                index = lo + (index + 1 - lo) % (hi - lo)
+                if index == start:
+                    break
+        return first_id + index, self._record(key, index)[1]
+
+
+class RecentPuzzles(Protocol):
+    def seen(self, user_id: str) -> Set[int]: ...
+    def add(self, user_id: str, puzzle_id: int) -> None: ...
+
+
+class MemoryRecentPuzzles:
+    def __init__(self, window: int = 50):
+        self.window = window
+        self._recent: Dict[str, Deque[int]] = {}
+
+    def seen(self, user_id: str) -> Set[int]:
+        return set(self._recent.get(user_id, ()))
+
+    def add(self, user_id: str, puzzle_id: int) -> None:
+        self._recent.setdefault(user_id, deque(maxlen=self.window)).append(puzzle_id)
+
+
+class RedisRecentPuzzles:
+    def __init__(self, url: str, window: int = 50, ttl: int = 30 * 86400, key_prefix: str = "mh:v1:nonogram-recent"):
+        self.redis = redis.Redis.from_url(url, decode_responses=True)
+        self.window = window
+        self.ttl = ttl
+        self.key_prefix = key_prefix
+
+    def key(self, user_id: str) -> str:
+        return f"{self.key_prefix}:{user_id}"
+
+    def seen(self, user_id: str) -> Set[int]:
+        return {int(value) for value in self.redis.lrange(self.key(user_id), 0, self.window - 1)}
+
+    def add(self, user_id: str, puzzle_id: int) -> None:
+        key = self.key(user_id)
+        pipe = self.redis.pipeline()
+        pipe.lpush(key, puzzle_id)
+        pipe.ltrim(key, 0, self.window - 1)
+        pipe.expire(key, self.ttl)
+        pipe.execute()
+
+
+def create_bank_from_env() -> Optional[PuzzleBank]:
+    path = os.getenv("NONOGRAM_BANK_FILE")
+    return PuzzleBank(path) if path else None
+
+
+def create_recent_puzzles_from_env() -> RecentPuzzles:
+    window = int(os.getenv("NONOGRAM_BANK_REPEAT_WINDOW", "50"))
+    if os.getenv("GAME_REPO", "memory").lower() == "redis":
+        return RedisRecentPuzzles(os.getenv("REDIS_URL", "redis://localhost:6379/0"), window)
+    return MemoryRecentPuzzles(window)
+
+
+def build_bank(
+    sizes: Iterable[int],
+    difficulties: Iterable[str],
+    per_key: int,
+    *,
+    workers: int = 1,
+    batch_size: int = 8,
+    seed: Optional[int] = None,
+    max_rounds: int = 20,
+) -> Dict[SectionKey, List[Tuple[int, bytes]]]:
+    """Generate until every (size, difficulty) has ``per_key`` distinct puzzles, or stops finding new ones."""
+    rng = random.Random(seed if seed is not None else secrets.randbits(64))
+    seen: Set[bytes] = set()
+    sections: Dict[SectionKey, List[Tuple[int, bytes]]] = {(s, d): [] for s in sizes for d in difficulties}
+    stalled: Set[SectionKey] = set()
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=max(1, workers)) as pool:
+        for round_no in range(1, max_rounds + 1):
+            tasks = []
+            for key, records in sections.items():
+                missing = per_key - len(records)
+                if missing > 0 and key not in stalled:
+                    batches = -(-missing // batch_size)
+                    tasks += [(key[0], key[1], batch_size, rng.getrandbits(64)) for _ in range(batches)]
+            if not tasks:
+                break
+            added: Dict[SectionKey, int] = {}
+            for size, difficulty, records in pool.map(_generate_batch, tasks):
+                key = (size, difficulty)
+                for digest, score, packed in records:
+                    if digest in seen or len(sections[key]) >= per_key:
+                        continue
+                    seen.add(digest)
+                    sections[key].append((score, packed))
+                    added[key] = added.get(key, 0) + 1
+            for key in sections:
+                if len(sections[key]) < per_key and not added.get(key):
+                    stalled.add(key)
+            total = sum(len(records) for records in sections.values())
+            print(f"round {round_no}: {total} puzzles ({time.perf_counter() - started:.1f}s)", file=sys.stderr)
+    return sections
+
+
+def _parse_sizes(text: str) -> List[int]:
+    sizes: List[int] = []
+    for part in text.split(","):
+        if "-" in part:
+            low, high = part.split("-")
+            sizes += range(int(low), int(high) + 1)
+        elif part.strip():
+            sizes.append(int(part))
+    return sizes
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build or inspect an offline nonogram puzzle bank.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build")
+    build.add_argument("--out", required=True)
+    build.add_argument("--sizes", default="5-25", help="e.g. 5-25 or 5,10,15")
+    build.add_argument("--difficulties", default=",".join(DIFFICULTIES))
+    build.add_argument("--per-key", type=int, default=200, help="distinct puzzles per (size, difficulty)")
+    build.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    build.add_argument("--batch-size", type=int, default=8)
+    build.add_argument("--seed", type=int)
+    inspect = commands.add_parser("inspect")
+    inspect.add_argument("path")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        sections = build_bank(
+            _parse_sizes(args.sizes),
+            [d for d in args.difficulties.split(",") if d],
+            args.per_key,
+            workers=args.workers,
+            batch_size=args.batch_size,
+            seed=args.seed,
+        )
+        total = write_bank(args.out, sections)
+        print(f"wrote {total} puzzles to {args.out} ({os.path.getsize(args.out)} bytes)")
+        return
+
+    bank = PuzzleBank(args.path)
+    for (size, difficulty), (_, count, _, _) in bank.sections.items():
+        scores = bank.score_range((size, difficulty))
+        if scores:
+            print(f"{size:>2} {difficulty:<6} {count:>6}  score {scores[0]}-{scores[1]}")
+    print(f"total {bank.total}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,10 @@ from __future__ import annotations
 import random
 import time
 import uuid
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.modules.nonogram_battle.puzzles import Grid, Puzzle, load_puzzle, make_puzzle, save_puzzle
+from app.modules.nonogram_battle.solver import Dirty, MaskGrid, blank_dirty, propagate, propagate_round
 
 
 def line_clues(line: List[bool]) -> List[int]:
@@ -27,120 +30,48 @@ def solution_clues(solution: List[List[bool]]) -> tuple[List[List[int]], List[Li
     return rows, columns
 
 
-def _patterns(length: int, raw_clues: List[int]) -> List[List[bool]]:
-    clues = [value for value in raw_clues if value > 0]
-    if not clues:
-        return [[False] * length]
-    result: List[List[bool]] = []
-
-    def place(index: int, cursor: int, line: List[bool]) -> None:
-        if index >= len(clues):
-            result.append(line[:])
-            return
-        clue = clues[index]
-        remaining = sum(clues[index + 1:]) + max(0, len(clues) - index - 1)
-        latest = length - clue - remaining
-        for start in range(cursor, latest + 1):
-            next_line = line[:]
-            for offset in range(clue):
-                next_line[start + offset] = True
-            place(index + 1, start + clue + 1, next_line)
-
-    place(0, 0, [False] * length)
-    return result
-
-
 def count_solutions(row_clues: List[List[int]], column_clues: List[List[int]], limit: int = 2) -> int:
     size = len(row_clues)
-    base_rows = [_patterns(size, clue) for clue in row_clues]
-    base_columns = [_patterns(size, clue) for clue in column_clues]
-
-    def matches(pattern: List[bool], known: List[Optional[bool]]) -> bool:
-        return all(value is None or pattern[index] == value for index, value in enumerate(known))
-
-    def search(grid: List[List[Optional[bool]]], rows: List[List[List[bool]]], columns: List[List[List[bool]]]) -> int:
-        changed = True
-        while changed:
-            changed = False
-            for row in range(size):
-                valid = [pattern for pattern in rows[row] if matches(pattern, grid[row])]
-                if not valid:
-                    return 0
-                rows[row] = valid
-                for column in range(size):
-                    value = valid[0][column]
-                    if grid[row][column] is None and all(pattern[column] == value for pattern in valid):
-                        grid[row][column] = value
-                        changed = True
-            for column in range(size):
-                known = [grid[row][column] for row in range(size)]
-                valid = [pattern for pattern in columns[column] if matches(pattern, known)]
-                if not valid:
-                    return 0
-                columns[column] = valid
-                for row in range(size):
-                    value = valid[0][row]
-                    if grid[row][column] is None and all(pattern[row] == value for pattern in valid):
-                        grid[row][column] = value
-                        changed = True
-
-        target = next(((row, column) for row in range(size) for column in range(size) if grid[row][column] is None), None)
+
+    def search(grid: MaskGrid, dirty: Optional[Dirty] = None) -> int:
+        if not propagate(grid, row_clues, column_clues, dirty):
+            return 0
+        target = grid.first_unknown()
         if target is None:
             return 1
         row, column = target
         total = 0
         for value in (False, True):
-            next_grid = [line[:] for line in grid]
-            next_grid[row][column] = value
-            total += search(next_grid, [[p[:] for p in domain] for domain in rows], [[p[:] for p in domain] for domain in columns])
+            next_grid = grid.copy()
+            next_grid.set(row, column, value)
+            next_dirty = ([False] * size, [False] * size)
+            next_dirty[0][row] = next_dirty[1][column] = True
+            total += search(next_grid, next_dirty)
             if total >= limit:
                 return total
         return total
 
-    return search([[None] * size for _ in range(size)], base_rows, base_columns)
+    return search(MaskGrid(size))
 
 
 def _logical_difficulty_score(row_clues: List[List[int]], column_clues: List[List[int]]) -> Optional[int]:
     size = len(row_clues)
-    grid: List[List[Optional[bool]]] = [[None] * size for _ in range(size)]
-    rows = [_patterns(size, clue) for clue in row_clues]
-    columns = [_patterns(size, clue) for clue in column_clues]
+    grid = MaskGrid(size)
+    dirty = blank_dirty(size)
     rounds = 0
     initial_forced = 0
 
-    def matches(pattern: List[bool], known: List[Optional[bool]]) -> bool:
-        return all(value is None or pattern[index] == value for index, value in enumerate(known))
-
     while True:
-        deduced = 0
-        for row in range(size):
-            valid = [pattern for pattern in rows[row] if matches(pattern, grid[row])]
-            if not valid:
-                return None
-            rows[row] = valid
-            for column in range(size):
-                value = valid[0][column]
-                if grid[row][column] is None and all(pattern[column] == value for pattern in valid):
-                    grid[row][column] = value
-                    deduced += 1
-        for column in range(size):
-            known = [grid[row][column] for row in range(size)]
-            valid = [pattern for pattern in columns[column] if matches(pattern, known)]
-            if not valid:
-                return None
-            columns[column] = valid
-            for row in range(size):
-                value = valid[0][row]
-                if grid[row][column] is None and all(pattern[row] == value for pattern in valid):
-                    grid[row][column] = value
-                    deduced += 1
+        deduced = propagate_round(grid, row_clues, column_clues, dirty)
+        if deduced is None:
+            return None
         if not deduced:
             break
         rounds += 1
         if rounds == 1:
             initial_forced = deduced
 
-    if any(cell is None for line in grid for cell in line):
+    if not grid.is_complete():
         return None
     all_clues = row_clues + column_clues
     values = [value for clues in all_clues for value in clues if value > 0]
@@ -173,11 +104,20 @@ def _random_solution(size: int, difficulty: str) -> List[List[bool]]:
     return solution
 
 
-def generate_puzzle(size: int, difficulty: str = "normal") -> tuple[List[List[bool]], List[List[int]], List[List[int]]]:
+def generate_puzzle(
+    size: int,
+    difficulty: str = "normal",
+    stats: Optional[Dict[str, Any]] = None,
+) -> tuple[List[List[bool]], List[List[int]], List[List[int]]]:
+    """``stats``, when given, receives ``attempts``, ``score`` and ``outcome``
+    (``inRange``, ``closest`` or ``triangle`` for the fallback grid)."""
     ranges = {"easy": (0, 54, 38), "normal": (55, 71, 63), "hard": (72, 100, 82)}
     low, high, target = ranges.get(difficulty, ranges["normal"])
-    closest: Optional[tuple[int, List[List[bool]], List[List[int]], List[List[int]]]] = None
-    for _ in range(240):
+    closest: Optional[tuple[int, List[List[bool]], List[List[int]], List[List[int]], int]] = None
+    if stats is None:
+        stats = {}
+    for attempt in range(1, 241):
+        stats["attempts"] = attempt
         solution = _random_solution(size, difficulty)
         filled = sum(sum(1 for cell in row if cell) for row in solution)
         if filled < size or filled > size * size - size:
@@ -190,24 +130,101 @@ def generate_puzzle(size: int, difficulty: str = "normal") -> tuple[List[List[bo
             continue
         distance = abs(score - target)
         if closest is None or distance < closest[0]:
-            closest = (distance, solution, rows, columns)
+            closest = (distance, solution, rows, columns, score)
         if low <= score <= high:
+            stats.update(outcome="inRange", score=score)
             return solution, rows, columns
 
     if closest is not None:
+        stats.update(outcome="closest", score=closest[4])
         return closest[1], closest[2], closest[3]
 
     solution = [[column <= row for column in range(size)] for row in range(size)]
     rows, columns = solution_clues(solution)
+    stats.update(outcome="triangle", score=_logical_difficulty_score(rows, columns))
     return solution, rows, columns
 
 
-def _empty_board(size: int) -> List[List[str]]:
-    return [["unknown"] * size for _ in range(size)]
+# Boards are stored as one int per row with 2 bits per cell (cell c at bits 2c..2c+1).
+CELL_STATES = ("unknown", "filled", "marked")
+CELL_CODES = {name: code for code, name in enumerate(CELL_STATES)}
+UNKNOWN, FILLED, MARKED = 0, 1, 2
+
+
+def match_puzzle(state: Dict[str, Any]) -> Puzzle:
+    """The static puzzle behind a match: cached by ``puzzleId``, or rebuilt from a legacy inline state."""
+    puzzle_id = state.get("puzzleId")
+    if puzzle_id:
+        return load_puzzle(puzzle_id)
+    return make_puzzle(state["solution"], state["rowClues"], state["columnClues"], state.get("difficulty", "normal"))
+
+
+def detach_puzzle(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Move an inline solution/clues (states written before puzzles were shared) into the puzzle store."""
+    if "solution" in state:
+        puzzle = save_puzzle(match_puzzle(state))
+        for field in ("solution", "rowClues", "columnClues"):
+            state.pop(field, None)
+        state["puzzleId"] = puzzle.puzzle_id
+    return state
+
+
+def match_solution(state: Dict[str, Any]) -> Grid:
+    return match_puzzle(state).solution
+
+
+def _new_player(solution: Grid) -> Dict[str, Any]:
+    # An empty board is wrong exactly where the solution is filled.
+    return {
+        "rows": [0] * len(solution),
+        "answered": 0,
+        "mismatches": sum(cell for row in solution for cell in row),
+        "finishedAt": None,
+    }
 
 
-def create_match(user_id: str, size: int, difficulty: str = "normal") -> Dict[str, Any]:
-    solution, row_clues, column_clues = generate_puzzle(size, difficulty)
+def _ensure_packed(player: Dict[str, Any], solution: Grid) -> Dict[str, Any]:
+    """Convert a player stored with the old ``board`` string grid to packed rows and counters."""
+    board = player.pop("board", None)
+    if board is None:
+        return player
+    player.update(_new_player(solution))
+    for row, line in enumerate(board):
+        for column, name in enumerate(line):
+            _set_cell(player, solution, row, column, CELL_CODES.get(name, UNKNOWN))
+    return player
+
+
+def _get_cell(player: Dict[str, Any], row: int, column: int) -> int:
+    return player["rows"][row] >> (2 * column) & 3
+
+
+def _set_cell(player: Dict[str, Any], solution: Grid, row: int, column: int, code: int) -> int:
+    """Write one cell and keep ``answered``/``mismatches`` in step; returns the previous code."""
+    rows = player["rows"]
+    shift = 2 * column
+    old = rows[row] >> shift & 3
+    if old == code:
+        return old
+    rows[row] = rows[row] & ~(3 << shift) | code << shift
+    player["answered"] += (code != UNKNOWN) - (old != UNKNOWN)
+    expected = solution[row][column]
+    player["mismatches"] += ((code == FILLED) != expected) - ((old == FILLED) != expected)
+    return old
+
+
+def board_lists(player: Dict[str, Any], size: int) -> List[List[str]]:
+    return [[CELL_STATES[row >> (2 * column) & 3] for column in range(size)] for row in player["rows"]]
+
+
+def create_match(
+    user_id: str,
+    size: int,
+    difficulty: str = "normal",
+    puzzle: Optional[tuple[List[List[bool]], List[List[int]], List[List[int]]]] = None,
+) -> Dict[str, Any]:
+    solution, row_clues, column_clues = puzzle if puzzle is not None else generate_puzzle(size, difficulty)
+    static = save_puzzle(make_puzzle(solution, row_clues, column_clues, difficulty))
     return {
         "matchId": uuid.uuid4().hex[:10],
         "createdAt": time.time(),
@@ -216,11 +233,10 @@ def create_match(user_id: str, size: int, difficulty: str = "normal") -> Dict[st
         "status": "waiting",
         "size": size,
         "difficulty": difficulty,
-        "solution": solution,
-        "rowClues": row_clues,
-        "columnClues": column_clues,
+        "puzzleId": static.puzzle_id,
         "winnerUserId": None,
-        "players": {user_id: {"board": _empty_board(size), "finishedAt": None}},
+        "version": 0,
+        "players": {user_id: _new_player(static.solution)},
     }
 
 
@@ -232,21 +248,19 @@ def join_match(state: Dict[str, Any], user_id: str) -> Dict[str, Any]:
         raise ValueError("MATCH_FULL")
     if state["status"] != "waiting":
         raise ValueError("MATCH_STARTED")
-    players[user_id] = {"board": _empty_board(state["size"]), "finishedAt": None}
+    players[user_id] = _new_player(match_solution(state))
     state["status"] = "playing"
     state["startedAt"] = time.time()
+    _bump_version(state)
     return state
 
 
-def _is_solved(board: List[List[str]], solution: List[List[bool]]) -> bool:
-    return all(
-        (board[row][column] == "filled") == solution[row][column]
-        for row in range(len(solution))
-        for column in range(len(solution))
-    )
+def _bump_version(state: Dict[str, Any]) -> int:
+    state["version"] = state.get("version", 0) + 1
+    return state["version"]
 
 
-def apply_move(state: Dict[str, Any], user_id: str, row: int, column: int, cell_state: str) -> Dict[str, Any]:
+def _playing_player(state: Dict[str, Any], user_id: str) -> Dict[str, Any]:
     if state["status"] != "playing":
         raise ValueError("MATCH_NOT_PLAYING")
     player = state["players"].get(user_id)
@@ -254,57 +268,150 @@ def apply_move(state: Dict[str, Any], user_id: str, row: int, column: int, cell_
         raise ValueError("USER_NOT_IN_MATCH")
     if player.get("finishedAt"):
         raise ValueError("PLAYER_ALREADY_FINISHED")
+    return _ensure_packed(player, match_solution(state))
+
+
+def _finish_if_solved(state: Dict[str, Any], user_id: str, player: Dict[str, Any]) -> None:
+    if player["mismatches"]:
+        return
+    now = time.time()
+    player["finishedAt"] = now
+    if state.get("winnerUserId") is None:
+        state["winnerUserId"] = user_id
+    if all(entry.get("finishedAt") for entry in state["players"].values()):
+        state["status"] = "finished"
+        state["finishedAt"] = now
+
+
+def apply_moves(state: Dict[str, Any], user_id: str, cells: List[Tuple[int, int, str]]) -> Dict[str, Any]:
+    """Apply several cell edits as one update: all cells are checked first, completion once at the end."""
+    player = _playing_player(state, user_id)
     size = state["size"]
-    if row < 0 or column < 0 or row >= size or column >= size:
+    if any(row < 0 or column < 0 or row >= size or column >= size for row, column, _ in cells):
         raise ValueError("CELL_OUT_OF_RANGE")
-    player["board"][row][column] = cell_state
-    if _is_solved(player["board"], state["solution"]):
-        now = time.time()
-        player["finishedAt"] = now
-        if state.get("winnerUserId") is None:
-            state["winnerUserId"] = user_id
-        if all(entry.get("finishedAt") for entry in state["players"].values()):
-            state["status"] = "finished"
-            state["finishedAt"] = now
+    solution = match_solution(state)
+    for row, column, cell_state in cells:
+        _set_cell(player, solution, row, column, CELL_CODES[cell_state])
+    _finish_if_solved(state, user_id, player)
+    _bump_version(state)
     return state
 
 
+def apply_move(state: Dict[str, Any], user_id: str, row: int, column: int, cell_state: str) -> Dict[str, Any]:
+    return apply_moves(state, user_id, [(row, column, cell_state)])
+
+
 def clear_board(state: Dict[str, Any], user_id: str) -> Dict[str, Any]:
-    if state["status"] != "playing":
-        raise ValueError("MATCH_NOT_PLAYING")
-    player = state["players"].get(user_id)
-    if player is None:
-        raise ValueError("USER_NOT_IN_MATCH")
-    if player.get("finishedAt"):
-        raise ValueError("PLAYER_ALREADY_FINISHED")
-    player["board"] = _empty_board(state["size"])
+    player = _playing_player(state, user_id)
+    player.update(_new_player(match_solution(state)))
+    _bump_version(state)
     return state
 
 
-def _progress(player: Optional[Dict[str, Any]], solution: List[List[bool]]) -> int:
+def progress_percent(answered: int, size: int) -> int:
+    return min(100, round(answered / (size * size or 1) * 100))
+
+
+def _progress(player: Optional[Dict[str, Any]], solution: Grid) -> int:
     if not player:
         return 0
-    total = len(solution) * len(solution) or 1
-    answered = sum(cell != "unknown" for row in player["board"] for cell in row)
-    return min(100, round(answered / total * 100))
+    _ensure_packed(player, solution)
+    return progress_percent(player["answered"], len(solution))
 
 
-def status_payload(state: Dict[str, Any], user_id: str) -> Dict[str, Any]:
+def status_payload(state: Dict[str, Any], user_id: str, include_clues: bool = True) -> Dict[str, Any]:
+    """Per-player view. Clues never change, so polling clients can pass ``include_clues=False``
+    and fetch them once via ``puzzleId``."""
     players = state["players"]
     me = players.get(user_id)
     if me is None:
         raise ValueError("USER_NOT_IN_MATCH")
     opponent_id = next((pid for pid in players if pid != user_id), None)
     opponent = players.get(opponent_id) if opponent_id else None
+    puzzle = match_puzzle(state)
+    solution = puzzle.solution
+    _ensure_packed(me, solution)
+    payload = {
+        "matchId": state["matchId"],
+        "status": state["status"],
+        "size": state["size"],
+        "difficulty": state.get("difficulty", "normal"),
+        "puzzleId": puzzle.puzzle_id,
+        "startedAt": state["startedAt"],
+        "winnerUserId": state["winnerUserId"],
+        "version": state.get("version", 0),
+        "my": {"userId": user_id, "board": board_lists(me, state["size"]), "progress": _progress(me, solution), "finished": bool(me.get("finishedAt"))},
+        "opponent": {"userId": opponent_id, "progress": _progress(opponent, solution), "finished": bool(opponent.get("finishedAt"))} if opponent_id else None,
+    }
+    if include_clues:
+        payload["rowClues"] = [list(clues) for clues in puzzle.row_clues]
+        payload["columnClues"] = [list(clues) for clues in puzzle.column_clues]
+    return payload
+
+
+def spectator_payload(state: Dict[str, Any]) -> Dict[str, Any]:
+    """The view for anyone watching: clues and each player's progress. Boards are only
+    shown once the match is finished, so a player cannot watch the opponent's board."""
+    puzzle = match_puzzle(state)
+    finished = state["status"] == "finished"
+    players = []
+    for user_id, player in state["players"].items():
+        entry = _player_event(state, user_id, puzzle.solution)
+        if finished:
+            entry["board"] = board_lists(_ensure_packed(player, puzzle.solution), state["size"])
+        players.append(entry)
     return {
         "matchId": state["matchId"],
         "status": state["status"],
         "size": state["size"],
         "difficulty": state.get("difficulty", "normal"),
-        "rowClues": state["rowClues"],
-        "columnClues": state["columnClues"],
+        "puzzleId": puzzle.puzzle_id,
         "startedAt": state["startedAt"],
+        "finishedAt": state.get("finishedAt"),
+        "winnerUserId": state["winnerUserId"],
+        "version": state.get("version", 0),
+        "rowClues": [list(clues) for clues in puzzle.row_clues],
+        "columnClues": [list(clues) for clues in puzzle.column_clues],
+        "players": players,
+    }
+
+
+def _player_event(state: Dict[str, Any], user_id: str, solution: Grid) -> Dict[str, Any]:
+    player = state["players"].get(user_id)
+    return {"userId": user_id, "progress": _progress(player, solution), "finished": bool(player and player.get("finishedAt"))}
+
+
+def sync_event(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Compact snapshot for event streams: progress only, never boards."""
+    solution = match_solution(state)
+    return {
+        "type": "sync",
+        "matchId": state["matchId"],
+        "version": state.get("version", 0),
+        "status": state["status"],
         "winnerUserId": state["winnerUserId"],
-        "my": {"userId": user_id, "board": me["board"], "progress": _progress(me, state["solution"]), "finished": bool(me.get("finishedAt"))},
-        "opponent": {"userId": opponent_id, "progress": _progress(opponent, state["solution"]), "finished": bool(opponent.get("finishedAt"))} if opponent_id else None,
+        "players": [_player_event(state, user_id, solution) for user_id in state["players"]],
     }
+
+
+def change_events(state: Dict[str, Any], user_id: str, kind: str = "progress") -> List[Dict[str, Any]]:
+    """``kind`` (``joined``/``progress``) for ``user_id``, plus ``finished`` once the match is settled."""
+    events = [{"type": kind, "version": state.get("version", 0), "status": state["status"], **_player_event(state, user_id, match_solution(state))}]
+    if state["status"] == "finished":
+        events.append({"type": "finished", "version": state.get("version", 0), "status": "finished", "winnerUserId": state["winnerUserId"]})
+    return events
+
+
+def move_events(user_id: str, result: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Events from a repo ``move`` result, which carries counters rather than the state."""
+    events = [{
+        "type": "progress",
+        "version": result["version"],
+        "status": result["status"],
+        "userId": user_id,
+        "progress": progress_percent(result["answered"], result["size"]),
+        "finished": result["finished"],
+    }]
+    if result["status"] == "finished":
+        events.append({"type": "finished", "version": result["version"], "status": "finished", "winnerUserId": result["winnerUserId"]})
+    return events
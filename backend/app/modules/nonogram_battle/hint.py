@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.modules.nonogram_battle.domain import CELL_STATES, FILLED, MARKED, _ensure_packed, match_puzzle
+from app.modules.nonogram_battle.solver import MaskGrid, solve_line_mask
+
+Clues = Sequence[Sequence[int]]
+
+# Board rows are stacked into one big int, one 64-bit lane per row, so unpacking a whole
+# board is a handful of big-int operations instead of a loop per cell.
+_LANE = 64
+_LANE_FULL = (1 << _LANE) - 1
+
+
+def _repeat(pattern: int, size: int) -> int:
+    return sum(pattern << (_LANE * row) for row in range(size))
+
+
+@lru_cache(maxsize=None)
+def _lane_masks(size: int) -> Tuple[int, ...]:
+    return tuple(
+        _repeat(pattern, size)
+        for pattern in (
+            0x5555555555555555,
+            0x3333333333333333,
+            0x0F0F0F0F0F0F0F0F,
+            0x00FF00FF00FF00FF,
+            0x0000FFFF0000FFFF,
+            0x00000000FFFFFFFF,
+        )
+    )
+
+
+@lru_cache(maxsize=1 << 16)
+def _solve_line(clues: Tuple[int, ...], length: int, filled: int, known: int) -> Optional[Tuple[int, int]]:
+    # Polling clients ask again with mostly unchanged lines, so repeats are dictionary hits.
+    return solve_line_mask(clues, length, filled, known)
+
+
+def stack_rows(rows: Sequence[int]) -> int:
+    return int.from_bytes(b"".join(row.to_bytes(8, "little") for row in rows), "little")
+
+
+def unstack_rows(stacked: int, size: int) -> List[int]:
+    return [stacked >> (_LANE * row) & _LANE_FULL for row in range(size)]
+
+
+def transpose(rows: Sequence[int], size: int) -> List[int]:
+    """Column masks of row masks. Rows are formatted bottom row first so each
+    column string already reads from bit size-1 down to bit 0."""
+    pattern = f"0{size}b"
+    strings = [format(row, pattern) for row in reversed(rows)]
+    columns = [int("".join(column), 2) for column in zip(*strings)]
+    columns.reverse()
+    return columns
+
+
+def split_packed_rows(rows: Sequence[int]) -> Tuple[int, int]:
+    """Stacked ``(filled, marked)`` bitmasks of 2-bit packed board rows."""
+    size = len(rows)
+    even, *steps = _lane_masks(size)
+    packed = stack_rows(rows)
+    low = packed & even
+    high = packed >> 1 & even
+    filled, marked = low & ~high, high & ~low
+    for index, mask in enumerate(steps):
+        shift = 1 << index
+        filled = (filled | filled >> shift) & mask
+        marked = (marked | marked >> shift) & mask
+    return filled, marked
+
+
+def grid_from_stacked(size: int, filled: int, marked: int) -> MaskGrid:
+    grid = MaskGrid(size)
+    known = filled | marked
+    grid.row_filled = unstack_rows(filled, size)
+    grid.row_known = unstack_rows(known, size)
+    grid.column_filled = transpose(grid.row_filled, size)
+    grid.column_known = transpose(grid.row_known, size)
+    return grid
+
+
+def next_hint(grid: MaskGrid, row_clues: Clues, column_clues: Clues, validate: bool = False) -> Dict[str, Any]:
+    """Find one cell forced by a single row or column of ``grid``.
+
+    Lines are tried rows first, then columns, and the first line that forces an
+    unknown cell wins. With ``validate`` every line is checked so that a line
+    contradicting its clues is reported even after a hint has been found; the
+    contradicting line is returned instead of a cell.
+    """
+    size = grid.size
+    full = (1 << size) - 1
+    hint: Optional[Dict[str, Any]] = None
+    complete = True
+    axes = (
+        ("row", row_clues, grid.row_filled, grid.row_known),
+        ("column", column_clues, grid.column_filled, grid.column_known),
+    )
+    for axis, clues, filled_lines, known_lines in axes:
+        for index in range(size):
+            known = known_lines[index]
+            if known == full:
+                if not validate:
+                    continue
+            else:
+                complete = False
+            line_clues = tuple(clues[index])
+            solved = _solve_line(line_clues, size, filled_lines[index], known)
+            if solved is None:
+                return {"cell": None, "line": _line(axis, index, line_clues), "contradiction": True, "complete": False}
+            if hint is not None:
+                continue
+            new = solved[1] & ~known
+            if not new:
+                continue
+            position = (new & -new).bit_length() - 1
+            row, column = (index, position) if axis == "row" else (position, index)
+            hint = {
+                "cell": {"row": row, "column": column, "state": "filled" if solved[0] >> position & 1 else "marked"},
+                "line": _line(axis, index, line_clues),
+                "contradiction": False,
+                "complete": False,
+            }
+            if not validate:
+                return hint
+    return hint or {"cell": None, "line": None, "contradiction": False, "complete": complete}
+
+
+def _line(axis: str, index: int, clues: Tuple[int, ...]) -> Dict[str, Any]:
+    return {"axis": axis, "index": index, "clues": list(clues)}
+
+
+def battle_hint(state: Dict[str, Any], user_id: str) -> Dict[str, Any]:
+    """Hint for a battle player. Wrong cells are left out so the hint is always correct;
+    ``mistakes`` only says that the board has some, not where."""
+    player = state["players"].get(user_id)
+    if player is None:
+        raise ValueError("USER_NOT_IN_MATCH")
+    puzzle = match_puzzle(state)
+    _ensure_packed(player, puzzle.solution)
+    filled, marked = split_packed_rows(player["rows"])
+    expected = stack_rows(puzzle.row_masks)
+    right_filled, right_marked = filled & expected, marked & ~expected
+    mistakes = right_filled != filled or right_marked != marked
+    grid = grid_from_stacked(puzzle.size, right_filled, right_marked)
+    result = next_hint(grid, puzzle.row_clues, puzzle.column_clues)
+    return {"cell": result["cell"], "line": result["line"], "mistakes": mistakes, "complete": result["complete"] and not mistakes}
+
+
+# Board rows arrive as strings of cell codes; reversed and mapped to binary digits they parse as row masks.
+_FILLED_DIGITS = str.maketrans({str(code): "1" if code == FILLED else "0" for code in range(len(CELL_STATES))})
+_MARKED_DIGITS = str.maketrans({str(code): "1" if code == MARKED else "0" for code in range(len(CELL_STATES))})
+
+
+def board_hint(row_clues: Clues, column_clues: Clues, board: Sequence[str]) -> Dict[str, Any]:
+    """Hint for a client-held board (rows of cell codes ``"0"``/``"1"``/``"2"``) with no known solution.
+
+    ``mistakes`` is set when some line can no longer match its clues; that line is
+    returned so the player can look there.
+    """
+    size = len(board)
+    if len(row_clues) != size or len(column_clues) != size or any(len(line) != size for line in board):
+        raise ValueError("BOARD_SIZE_MISMATCH")
+    filled = stack_rows([int(line[::-1].translate(_FILLED_DIGITS), 2) for line in board])
+    marked = stack_rows([int(line[::-1].translate(_MARKED_DIGITS), 2) for line in board])
+    grid = grid_from_stacked(size, filled, marked)
+    result = next_hint(grid, row_clues, column_clues, validate=True)
+    return {"cell": result["cell"], "line": result["line"], "mistakes": result["contradiction"], "complete": result["complete"]}
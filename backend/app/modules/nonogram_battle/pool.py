@@ -0,0 +1,379 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import random
+import secrets
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Deque, Dict, Iterable, List, Optional, Protocol, Set, Tuple
+
+import redis
+
+from app.modules.nonogram_battle.domain import generate_puzzle
+
+log = logging.getLogger("mahjong.nonogram_battle.pool")
+
+DIFFICULTIES = ("easy", "normal", "hard")
+
+Puzzle = Tuple[List[List[bool]], List[List[int]], List[List[int]]]
+
+
+def pool_key(size: int, difficulty: str) -> str:
+    return f"{size}:{difficulty}"
+
+
+def pack_puzzle(solution: List[List[bool]], row_clues: List[List[int]], column_clues: List[List[int]]) -> Dict[str, Any]:
+    return {
+        "solution": ["".join("1" if cell else "0" for cell in row) for row in solution],
+        "rowClues": row_clues,
+        "columnClues": column_clues,
+    }
+
+
+def unpack_puzzle(item: Dict[str, Any]) -> Puzzle:
+    solution = [[char == "1" for char in row] for row in item["solution"]]
+    return solution, item["rowClues"], item["columnClues"]
+
+
+def _generate_batch(task: Tuple[int, str, int, int]) -> Tuple[List[Dict[str, Any]], float]:
+    """Worker task: generate ``count`` puzzles and report the time spent."""
+    size, difficulty, count, seed = task
+    # Forked workers inherit the parent's random state; reseed so batches differ.
+    random.seed(seed)
+    started = time.perf_counter()
+    items = [pack_puzzle(*generate_puzzle(size, difficulty)) for _ in range(count)]
+    return items, time.perf_counter() - started
+
+
+class PoolStore(Protocol):
+    store_type: str
+    def pop(self, key: str) -> Optional[Dict[str, Any]]: ...
+    def push(self, key: str, items: List[Dict[str, Any]]) -> None: ...
+    def depth(self, key: str) -> int: ...
+    def claim_refill(self, key: str) -> bool: ...
+    def release_refill(self, key: str) -> None: ...
+    def close(self) -> None: ...
+
+
+class LocalPoolStore:
+    """In-process queues, optionally snapshotted to a JSON file.
+
+    Pushes and pops only mark the queues dirty; a background thread writes the
+    snapshot every ``save_interval`` seconds and ``close`` writes the last one, so a
+    restart re-serves at most the puzzles drawn since the last snapshot.
+    """
+
+    store_type = "memory"
+
+    def __init__(self, path: Optional[str] = None, save_interval: float = 30.0):
+        self.path = path
+        self.save_interval = save_interval
+        self._queues: Dict[str, Deque[Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._stop = threading.Event()
+        self._saver: Optional[threading.Thread] = None
+        if path and os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    saved = json.load(f)
+                self._queues = {key: deque(items) for key, items in saved.items()}
+            except (OSError, ValueError):
+                log.exception("nonogram_pool_load_failed path=%s", path)
+
+    def _touch(self) -> None:
+        self._dirty = True
+        if self.path and self._saver is None:
+            self._saver = threading.Thread(target=self._save_loop, name="nonogram-pool-save", daemon=True)
+            self._saver.start()
+
+    def _save_loop(self) -> None:
+        while not self._stop.wait(self.save_interval):
+            try:
+                self.save()
+            except OSError:
+                log.exception("nonogram_pool_save_failed path=%s", self.path)
+
+    def pop(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            try:
+                item = self._queues[key].popleft()
+            except (KeyError, IndexError):
+                return None
+            self._touch()
+            return item
+
+    def push(self, key: str, items: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            self._queues.setdefault(key, deque()).extend(items)
+            self._touch()
+
+    def depth(self, key: str) -> int:
+        return len(self._queues.get(key, ()))
+
+    def claim_refill(self, key: str) -> bool:
+        # Only this process fills the queues; PuzzlePool's own lock is enough.
+        return True
+
+    def release_refill(self, key: str) -> None:
+        pass
+
+    def save(self) -> None:
+        """Write the snapshot if anything changed since the last one."""
+        if not self.path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            snapshot = {key: list(items) for key, items in self._queues.items()}
+            self._dirty = False
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, separators=(",", ":"))
+        os.replace(tmp, self.path)
+
+    def close(self) -> None:
+        self._stop.set()
+        self.save()
+
+
+class RedisPoolStore:
+    """One Redis list per (size, difficulty); survives restarts and is shared by all API processes."""
+
+    store_type = "redis"
+
+    def __init__(self, url: str, key_prefix: str = "mh:v1:nonogram-pool", refill_lock_seconds: int = 120):
+        self.redis = redis.Redis.from_url(url, decode_responses=True)
+        self.key_prefix = key_prefix
+        self.refill_lock_seconds = refill_lock_seconds
+        self._refill_locks: Dict[str, Any] = {}
+
+    def key(self, key: str) -> str:
+        return f"{self.key_prefix}:{key}"
+
+    def pop(self, key: str) -> Optional[Dict[str, Any]]:
+        raw = self.redis.lpop(self.key(key))
+        return json.loads(raw) if raw else None
+
+    def push(self, key: str, items: List[Dict[str, Any]]) -> None:
+        if items:
+            self.redis.rpush(self.key(key), *(json.dumps(item, separators=(",", ":")) for item in items))
+
+    def depth(self, key: str) -> int:
+        return int(self.redis.llen(self.key(key)))
+
+    def claim_refill(self, key: str) -> bool:
+        """Every API process runs a pool; only the one holding this lock tops up ``key``,
+        so the shared list does not overshoot its target depth. The timeout frees the
+        lock if the holder dies mid-refill."""
+        # Released from the worker callback thread, so the token must not be thread-local.
+        lock = self.redis.lock(f"{self.key(key)}:refill", timeout=self.refill_lock_seconds, thread_local=False)
+        if not lock.acquire(blocking=False):
+            return False
+        self._refill_locks[key] = lock
+        return True
+
+    def release_refill(self, key: str) -> None:
+        lock = self._refill_locks.pop(key, None)
+        if lock is None:
+            return
+        try:
+            lock.release()
+        except redis.exceptions.LockError:
+            pass
+
+    def close(self) -> None:
+        for key in list(self._refill_locks):
+            self.release_refill(key)
+
+
+class PuzzlePool:
+    """Pre-generated puzzles per (size, difficulty), topped up by background worker processes.
+
+    ``draw`` only pops from the store; whenever a queue falls below ``target_depth``
+    a refill batch is submitted. A miss returns ``None`` and the caller generates inline.
+    """
+
+    def __init__(
+        self,
+        store: PoolStore,
+        *,
+        enabled: bool = True,
+        target_depth: int = 8,
+        batch_size: int = 4,
+        workers: int = 1,
+        warm_sizes: Iterable[int] = (),
+    ):
+        self.store = store
+        self.enabled = enabled
+        self.target_depth = target_depth
+        self.batch_size = batch_size
+        self.workers = workers
+        self.warm_sizes = tuple(warm_sizes)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[str, float]] = {}
+        # Refill claims held by this pool, and a counter bumped whenever the executor is dropped.
+        self._claimed: Set[str] = set()
+        self._generation = 0
+
+    def _counter(self, key: str) -> Dict[str, float]:
+        counter = self._counters.get(key)
+        if counter is None:
+            counter = self._counters[key] = {
+                "hits": 0,
+                "misses": 0,
+                "inflight": 0,
+                "generated": 0,
+                "generateSeconds": 0.0,
+                "refillSeconds": 0.0,
+                "refillSince": 0.0,
+            }
+        return counter
+
+    def draw(self, size: int, difficulty: str) -> Optional[Puzzle]:
+        """A pooled puzzle, or None (the caller generates inline); never raises for a failed refill."""
+        if not self.enabled:
+            return None
+        key = pool_key(size, difficulty)
+        item = self.store.pop(key)
+        counter = self._counter(key)
+        if item is None:
+            counter["misses"] += 1
+        else:
+            counter["hits"] += 1
+        try:
+            self._refill(size, difficulty)
+        except Exception:
+            log.exception("nonogram_pool_refill_failed key=%s", key)
+        return unpack_puzzle(item) if item is not None else None
+
+    def warm(self) -> None:
+        if not self.enabled:
+            return
+        for size in self.warm_sizes:
+            for difficulty in DIFFICULTIES:
+                self._refill(size, difficulty)
+
+    def _refill(self, size: int, difficulty: str) -> None:
+        key = pool_key(size, difficulty)
+        futures: List[Future] = []
+        with self._lock:
+            counter = self._counter(key)
+            want = self.target_depth - self.store.depth(key) - counter["inflight"] * self.batch_size
+            if want <= 0:
+                return
+            if not counter["inflight"]:
+                if not self.store.claim_refill(key):
+                    return
+                self._claimed.add(key)
+                counter["refillSince"] = time.monotonic()
+            generation = self._generation
+            try:
+                if self._pool is None:
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers)
+                while want > 0:
+                    task = (size, difficulty, self.batch_size, secrets.randbits(64))
+                    futures.append(self._pool.submit(_generate_batch, task))
+                    counter["inflight"] += 1
+                    want -= self.batch_size
+            except BrokenProcessPool:
+                # A worker died (OOM, SIGKILL); the executor is unusable. Drop it and its
+                # batches so the next refill starts a new one.
+                log.exception("nonogram_pool_broken key=%s", key)
+                self._reset_pool()
+                futures = []
+        # A batch may already be done, and then its callback runs right here and takes the lock.
+        for future in futures:
+            future.add_done_callback(lambda fut, key=key, generation=generation: self._on_batch(key, fut, generation))
+
+    def _reset_pool(self) -> None:
+        """Forget the executor and every in-flight batch; called with ``_lock`` held."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+        self._generation += 1
+        now = time.monotonic()
+        for key, counter in self._counters.items():
+            if counter["inflight"] or key in self._claimed:
+                counter["refillSeconds"] += now - counter["refillSince"]
+                counter["inflight"] = 0
+                self.store.release_refill(key)
+        self._claimed.clear()
+
+    def _on_batch(self, key: str, future: Future, generation: int) -> None:
+        items: List[Dict[str, Any]] = []
+        seconds = 0.0
+        if not future.cancelled():
+            try:
+                items, seconds = future.result()
+                self.store.push(key, items)
+            except Exception:
+                log.exception("nonogram_pool_refill_failed key=%s", key)
+                items = []
+        with self._lock:
+            counter = self._counter(key)
+            counter["generated"] += len(items)
+            counter["generateSeconds"] += seconds
+            if generation != self._generation:
+                # Batch of a pool dropped by _reset_pool, which already settled its counters.
+                return
+            counter["inflight"] -= 1
+            if not counter["inflight"]:
+                counter["refillSeconds"] += time.monotonic() - counter["refillSince"]
+                self._claimed.discard(key)
+                self.store.release_refill(key)
+
+    def stats(self) -> Dict[str, Any]:
+        keys = sorted(set(self._counters) | {pool_key(s, d) for s in self.warm_sizes for d in DIFFICULTIES})
+        pools = {}
+        for key in keys:
+            counter = self._counter(key)
+            # Wall-clock time spent with at least one batch in flight, however many workers ran.
+            wall = counter["refillSeconds"]
+            if counter["inflight"]:
+                wall += time.monotonic() - counter["refillSince"]
+            busy = counter["generateSeconds"]
+            pools[key] = {
+                "depth": self.store.depth(key),
+                "hits": int(counter["hits"]),
+                "misses": int(counter["misses"]),
+                "inflight": int(counter["inflight"]),
+                "generated": int(counter["generated"]),
+                "refillPerSec": round(counter["generated"] / wall, 2) if wall else None,
+                "workerPerSec": round(counter["generated"] / busy, 2) if busy else None,
+            }
+        return {
+            "enabled": self.enabled,
+            "storage": self.store.store_type,
+            "targetDepth": self.target_depth,
+            "workers": self.workers,
+            "pools": pools,
+        }
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+        self.store.close()
+
+
+def create_puzzle_pool_from_env() -> PuzzlePool:
+    enabled = os.getenv("NONOGRAM_POOL", "").lower() in ("1", "true", "yes", "on")
+    if os.getenv("GAME_REPO", "memory").lower() == "redis":
+        store: PoolStore = RedisPoolStore(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+    else:
+        store = LocalPoolStore(os.getenv("NONOGRAM_POOL_FILE") or None, float(os.getenv("NONOGRAM_POOL_SAVE_SECONDS", "30")))
+    return PuzzlePool(
+        store,
+        enabled=enabled,
+        target_depth=int(os.getenv("NONOGRAM_POOL_DEPTH", "8")),
+        batch_size=int(os.getenv("NONOGRAM_POOL_BATCH", "4")),
+        workers=int(os.getenv("NONOGRAM_POOL_WORKERS", "1")),
+        warm_sizes=[int(s) for s in os.getenv("NONOGRAM_POOL_SIZES", "5,10,15,20,25").split(",") if s.strip()],
+    )
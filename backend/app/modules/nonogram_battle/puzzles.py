@@ -0,0 +1,211 @@
+"""Immutable nonogram puzzles stored once under a content-derived id.
+
+Match state only references ``puzzleId``; the solution and clues are loaded
+through a process-level LRU, which never goes stale because puzzles never change.
+Reads and match writes touch the stored puzzle so it lives as long as the matches using it.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Any, Dict, List, Optional, Protocol, Tuple
+
+import redis
+
+Grid = Tuple[Tuple[bool, ...], ...]
+Clues = Tuple[Tuple[int, ...], ...]
+
+
+@dataclass(frozen=True)
+class Puzzle:
+    puzzle_id: str
+    size: int
+    difficulty: str
+    solution: Grid
+    row_clues: Clues
+    column_clues: Clues
+
+    @cached_property
+    def row_masks(self) -> Tuple[int, ...]:
+        """Solution rows as bitmasks, bit c set when column c is filled."""
+        return tuple(sum(1 << column for column, cell in enumerate(row) if cell) for row in self.solution)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "puzzleId": self.puzzle_id,
+            "size": self.size,
+            "difficulty": self.difficulty,
+            "solution": ["".join("1" if cell else "0" for cell in row) for row in self.solution],
+            "rowClues": [list(clues) for clues in self.row_clues],
+            "columnClues": [list(clues) for clues in self.column_clues],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Puzzle":
+        return cls(
+            puzzle_id=data["puzzleId"],
+            size=int(data["size"]),
+            difficulty=data.get("difficulty", "normal"),
+            solution=tuple(tuple(char == "1" for char in row) for row in data["solution"]),
+            row_clues=tuple(tuple(clues) for clues in data["rowClues"]),
+            column_clues=tuple(tuple(clues) for clues in data["columnClues"]),
+        )
+
+    def public_dict(self) -> Dict[str, Any]:
+        """Everything a client may see: no solution."""
+        return {
+            "puzzleId": self.puzzle_id,
+            "size": self.size,
+            "difficulty": self.difficulty,
+            "rowClues": [list(clues) for clues in self.row_clues],
+            "columnClues": [list(clues) for clues in self.column_clues],
+        }
+
+
+def make_puzzle(
+    solution: List[List[bool]],
+    row_clues: List[List[int]],
+    column_clues: List[List[int]],
+    difficulty: str,
+) -> Puzzle:
+    grid = tuple(tuple(bool(cell) for cell in row) for row in solution)
+    digest = hashlib.blake2b(digest_size=8)
+    digest.update(difficulty.encode())
+    for row in grid:
+        digest.update(bytes(row) + b"|")
+    return Puzzle(
+        puzzle_id=digest.hexdigest(),
+        size=len(grid),
+        difficulty=difficulty,
+        solution=grid,
+        row_clues=tuple(tuple(clues) for clues in row_clues),
+        column_clues=tuple(tuple(clues) for clues in column_clues),
+    )
+
+
+class PuzzleStore(Protocol):
+    def put(self, puzzle: Puzzle) -> None: ...
+    def get(self, puzzle_id: str) -> Optional[Puzzle]: ...
+    def touch(self, puzzle_id: str) -> None: ...
+
+
+class MemoryPuzzleStore:
+    def __init__(self, ttl: int = 86400):
+        self.ttl = ttl
+        self.store: Dict[str, Tuple[float, Puzzle]] = {}
+        self._puts = 0
+
+    def put(self, puzzle: Puzzle) -> None:
+        now = time.time()
+        self.store[puzzle.puzzle_id] = (now, puzzle)
+        self._puts += 1
+        if self._puts % 256 == 0:
+            for puzzle_id, (stored_at, _) in list(self.store.items()):
+                if now - stored_at > self.ttl:
+                    self.store.pop(puzzle_id, None)
+
+    def get(self, puzzle_id: str) -> Optional[Puzzle]:
+        value = self.store.get(puzzle_id)
+        return value[1] if value else None
+
+    def touch(self, puzzle_id: str) -> None:
+        value = self.store.get(puzzle_id)
+        if value:
+            self.store[puzzle_id] = (time.time(), value[1])
+
+
+class RedisPuzzleStore:
+    def __init__(self, url: str, ttl: int, key_prefix: str = "mh:v2:nonogram-puzzle"):
+        self.redis = redis.Redis.from_url(url, decode_responses=True)
+        self.ttl = ttl
+        self.key_prefix = key_prefix
+
+    def key(self, puzzle_id: str) -> str:
+        return f"{self.key_prefix}:{puzzle_id}"
+
+    def put(self, puzzle: Puzzle) -> None:
+        # Content never changes; a re-used puzzle only gets its expiry extended.
+        key = self.key(puzzle.puzzle_id)
+        pipe = self.redis.pipeline()
+        pipe.set(key, json.dumps(puzzle.to_dict(), separators=(",", ":")), nx=True, ex=self.ttl)
+        pipe.expire(key, self.ttl)
+        pipe.execute()
+
+    def get(self, puzzle_id: str) -> Optional[Puzzle]:
+        raw = self.redis.get(self.key(puzzle_id))
+        return Puzzle.from_dict(json.loads(raw)) if raw else None
+
+    def touch(self, puzzle_id: str) -> None:
+        self.redis.expire(self.key(puzzle_id), self.ttl)
+
+
+def create_puzzle_store_from_env() -> PuzzleStore:
+    # Puzzles outlive any single match that uses them.
+    ttl = int(os.getenv("GAME_TTL_SECONDS", "86400")) * 2
+    if os.getenv("GAME_REPO", "memory").lower() == "redis":
+        return RedisPuzzleStore(os.getenv("REDIS_URL", "redis://localhost:6379/0"), ttl)
+    return MemoryPuzzleStore(ttl)
+
+
+_CACHE_SIZE = int(os.getenv("NONOGRAM_PUZZLE_CACHE_SIZE", "512"))
+# Store expiry is refreshed at most this often per puzzle and process.
+_TOUCH_INTERVAL = int(os.getenv("NONOGRAM_PUZZLE_TOUCH_SECONDS", "600"))
+_cache: "OrderedDict[str, Puzzle]" = OrderedDict()
+_touched: "OrderedDict[str, float]" = OrderedDict()
+_cache_lock = threading.Lock()
+_store: Optional[PuzzleStore] = None
+
+
+def puzzle_store() -> PuzzleStore:
+    global _store
+    if _store is None:
+        _store = create_puzzle_store_from_env()
+    return _store
+
+
+def _remember(puzzle: Puzzle) -> None:
+    with _cache_lock:
+        _cache[puzzle.puzzle_id] = puzzle
+        _cache.move_to_end(puzzle.puzzle_id)
+        while len(_cache) > _CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def save_puzzle(puzzle: Puzzle) -> Puzzle:
+    puzzle_store().put(puzzle)
+    _remember(puzzle)
+    return puzzle
+
+
+def touch_puzzle(puzzle_id: str) -> None:
+    """Extend the stored puzzle's expiry; called on reads and match writes."""
+    now = time.monotonic()
+    with _cache_lock:
+        last = _touched.get(puzzle_id)
+        if last is not None and now - last < _TOUCH_INTERVAL:
+            return
+        _touched[puzzle_id] = now
+        _touched.move_to_end(puzzle_id)
+        while len(_touched) > _CACHE_SIZE:
+            _touched.popitem(last=False)
+    puzzle_store().touch(puzzle_id)
+
+
+def load_puzzle(puzzle_id: str) -> Puzzle:
+    with _cache_lock:
+        puzzle = _cache.get(puzzle_id)
+        if puzzle is not None:
+            _cache.move_to_end(puzzle_id)
+    if puzzle is None:
+        puzzle = puzzle_store().get(puzzle_id)
+        if puzzle is None:
+            raise KeyError("PUZZLE_NOT_FOUND")
+        _remember(puzzle)
+    touch_puzzle(puzzle_id)
+    return puzzle
@@ -2,24 +2,46 @@ from __future__ import annotations
 
 import json
 import os
+import threading
 import time
-from typing import Callable, Dict, Optional, Protocol, TypeVar
+from typing import Any, Callable, Dict, List, Optional, Protocol, Sequence, Tuple, TypeVar
 
 import redis
 
+from app.modules.nonogram_battle.domain import CELL_CODES, _ensure_packed, apply_moves, detach_puzzle, match_solution
+from app.modules.nonogram_battle.puzzles import Puzzle, make_puzzle, save_puzzle, touch_puzzle
+
 T = TypeVar("T")
 
+Cells = List[Tuple[int, int, str]]
+
 
 class Repo(Protocol):
     def create(self, state: dict) -> dict: ...
     def get(self, match_id: str) -> Optional[dict]: ...
     def update(self, match_id: str, updater: Callable[[dict], T]) -> T: ...
+    def move(self, match_id: str, user_id: str, cells: Cells) -> Dict[str, Any]: ...
+    def version(self, match_id: str) -> Optional[int]: ...
+
+
+def _move_result(state: dict, user_id: str) -> Dict[str, Any]:
+    player = state["players"][user_id]
+    return {
+        "version": state["version"],
+        "size": state["size"],
+        "status": state["status"],
+        "winnerUserId": state["winnerUserId"],
+        "answered": player["answered"],
+        "mismatches": player["mismatches"],
+        "finished": bool(player.get("finishedAt")),
+    }
 
 
 class MemoryRepo:
     def __init__(self, ttl: int = 86400):
         self.ttl = ttl
         self.store: Dict[str, tuple[float, dict]] = {}
+        self.lock = threading.Lock()
 
     def create(self, state: dict) -> dict:
         self.store[state["matchId"]] = (time.time(), state)
@@ -35,37 +57,307 @@ class MemoryRepo:
         return value[1]
 
     def update(self, match_id: str, updater: Callable[[dict], T]) -> T:
+        with self.lock:
+            state = self.get(match_id)
+            if state is None:
+                raise KeyError("MATCH_NOT_FOUND")
+            result = updater(state)
+            self.store[match_id] = (time.time(), state)
+            if state.get("puzzleId"):
+                touch_puzzle(state["puzzleId"])
+            return result
+
+    def move(self, match_id: str, user_id: str, cells: Cells) -> Dict[str, Any]:
+        return self.update(match_id, lambda state: _move_result(apply_moves(state, user_id, cells), user_id))
+
+    def version(self, match_id: str) -> Optional[int]:
         state = self.get(match_id)
-        if state is None:
-            raise KeyError("MATCH_NOT_FOUND")
-        result = updater(state)
-        self.store[match_id] = (time.time(), state)
-        return result
+        return state.get("version", 0) if state is not None else None
+
+
+# Applies a batch of cell edits to one player's board atomically.
+# KEYS: meta hash, solution bitmap, this player's hash, this player's board, then every player's hash.
+# ARGV: userId, now, ttl, then (row, column, code) triples.
+# Board and solution use cell index row * size + column (BITFIELD u2 / GETBIT).
+_MOVE_SCRIPT = """
+local meta, solution, player, board = KEYS[1], KEYS[2], KEYS[3], KEYS[4]
+local status = redis.call('HGET', meta, 'status')
+if not status then return {0, 'MATCH_NOT_FOUND'} end
+if status ~= 'playing' then return {0, 'MATCH_NOT_PLAYING'} end
+if redis.call('EXISTS', player) == 0 then return {0, 'USER_NOT_IN_MATCH'} end
+local finished_at = redis.call('HGET', player, 'finishedAt')
+if finished_at and finished_at ~= '' then return {0, 'PLAYER_ALREADY_FINISHED'} end
+local size = tonumber(redis.call('HGET', meta, 'size'))
+for i = 4, #ARGV, 3 do
+  local row, column = tonumber(ARGV[i]), tonumber(ARGV[i + 1])
+  if row < 0 or column < 0 or row >= size or column >= size then return {0, 'CELL_OUT_OF_RANGE'} end
+end
+local answered, mismatches = 0, 0
+for i = 4, #ARGV, 3 do
+  local index = tonumber(ARGV[i]) * size + tonumber(ARGV[i + 1])
+  local code = tonumber(ARGV[i + 2])
+  local old = redis.call('BITFIELD', board, 'SET', 'u2', '#' .. index, code)[1]
+  if old ~= code then
+    local expected = redis.call('GETBIT', solution, index) == 1
+    answered = answered + (code ~= 0 and 1 or 0) - (old ~= 0 and 1 or 0)
+    mismatches = mismatches + (((code == 1) ~= expected) and 1 or 0) - (((old == 1) ~= expected) and 1 or 0)
+  end
+end
+answered = redis.call('HINCRBY', player, 'answered', answered)
+mismatches = redis.call('HINCRBY', player, 'mismatches', mismatches)
+local done = 0
+if mismatches == 0 then
+  done = 1
+  redis.call('HSET', player, 'finishedAt', ARGV[2])
+  if redis.call('HGET', meta, 'winnerUserId') == '' then
+    redis.call('HSET', meta, 'winnerUserId', ARGV[1])
+  end
+  local all_done = true
+  for i = 5, #KEYS do
+    local other = redis.call('HGET', KEYS[i], 'finishedAt')
+    if not other or other == '' then all_done = false end
+  end
+  if all_done then
+    redis.call('HSET', meta, 'status', 'finished', 'finishedAt', ARGV[2])
+  end
+end
+local version = redis.call('HINCRBY', meta, 'version', 1)
+local ttl = tonumber(ARGV[3])
+for i = 1, #KEYS do
+  if redis.call('EXISTS', KEYS[i]) == 1 then redis.call('EXPIRE', KEYS[i], ttl) end
+end
+return {1, answered, mismatches, done, redis.call('HGET', meta, 'status'), redis.call('HGET', meta, 'winnerUserId'), version, size}
+"""
+
+_META_FIELDS = ("matchId", "createdAt", "startedAt", "finishedAt", "status", "size", "difficulty", "winnerUserId", "version", "puzzleId")
+
+
+def _encode(value: Any) -> str:
+    return "" if value is None else str(value)
+
+
+def _decode_time(value: Optional[str]) -> Optional[float]:
+    return float(value) if value else None
+
+
+def board_to_bytes(rows: List[int], size: int) -> bytes:
+    """Packed rows -> the BITFIELD u2 layout (cell i at bits 2i..2i+1 from the start of the string)."""
+    value = 0
+    for row in rows:
+        for column in range(size):
+            value = value << 2 | (row >> (2 * column) & 3)
+    length = (2 * size * size + 7) // 8
+    return (value << (8 * length - 2 * size * size)).to_bytes(length, "big")
+
+
+def board_from_bytes(data: Optional[bytes], size: int) -> List[int]:
+    length = (2 * size * size + 7) // 8
+    raw = (data or b"").ljust(length, b"\0")[:length]
+    value = int.from_bytes(raw, "big") >> (8 * length - 2 * size * size)
+    rows = [0] * size
+    for index in range(size * size - 1, -1, -1):
+        row, column = divmod(index, size)
+        rows[row] |= (value & 3) << (2 * column)
+        value >>= 2
+    return rows
+
+
+def solution_to_bytes(solution: Sequence[Sequence[bool]]) -> bytes:
+    cells = [cell for row in solution for cell in row]
+    value = 0
+    for cell in cells:
+        value = value << 1 | bool(cell)
+    length = (len(cells) + 7) // 8
+    return (value << (8 * length - len(cells))).to_bytes(length, "big")
 
 
 class RedisRepo:
-    def __init__(self, url: str, ttl: int):
+    """Match split across keys so moves never rewrite the whole document.
+
+    Clues and solution live once in the shared puzzle store (``puzzleId`` in the
+    meta hash); only the ``{id}:solution`` bitmap is copied per match so the move
+    script can read it from the match's cluster slot. ``{id}`` is a hash of match
+    metadata; each player has a counter hash ``{id}:player:<userId>`` and a
+    2-bit-per-cell board ``{id}:board:<userId>``. The hash tag keeps a match's
+    keys in one cluster slot for the move script.
+    """
+
+    def __init__(self, url: str, ttl: int, key_prefix: str = "mh:v2:nonogram-battle"):
         self.redis = redis.Redis.from_url(url, decode_responses=True)
+        self.raw = redis.Redis.from_url(url)
         self.ttl = ttl
+        self.key_prefix = key_prefix
+        self._move = self.redis.register_script(_MOVE_SCRIPT)
+
+    def key(self, match_id: str, *parts: str) -> str:
+        return ":".join((f"{self.key_prefix}:{{{match_id}}}",) + parts)
 
-    def key(self, match_id: str) -> str:
+    def legacy_key(self, match_id: str) -> str:
         return f"mh:v1:nonogram-battle:{match_id}"
 
+    def _write_players(self, pipe: Any, state: dict, user_ids: List[str]) -> None:
+        match_id = state["matchId"]
+        for user_id in user_ids:
+            player = state["players"][user_id]
+            player_key = self.key(match_id, "player", user_id)
+            pipe.hset(player_key, mapping={
+                "answered": player["answered"],
+                "mismatches": player["mismatches"],
+                "finishedAt": _encode(player.get("finishedAt")),
+            })
+            pipe.expire(player_key, self.ttl)
+            board_key = self.key(match_id, "board", user_id)
+            pipe.set(board_key, board_to_bytes(player["rows"], state["size"]), ex=self.ttl)
+
+    def _write_meta(self, pipe: Any, state: dict) -> None:
+        meta_key = self.key(state["matchId"])
+        mapping = {field: _encode(state.get(field)) for field in _META_FIELDS}
+        mapping["players"] = json.dumps(list(state["players"]), ensure_ascii=False)
+        pipe.hset(meta_key, mapping=mapping)
+        pipe.expire(meta_key, self.ttl)
+
     def create(self, state: dict) -> dict:
-        self.redis.setex(self.key(state["matchId"]), self.ttl, json.dumps(state, ensure_ascii=False))
+        match_id = state["matchId"]
+        detach_puzzle(state)
+        pipe = self.raw.pipeline()
+        pipe.set(self.key(match_id, "solution"), solution_to_bytes(match_solution(state)), ex=self.ttl, nx=True)
+        self._write_meta(pipe, state)
+        self._write_players(pipe, state, list(state["players"]))
+        pipe.execute()
         return state
 
+    def _migrate_legacy(self, match_id: str) -> Optional[dict]:
+        raw = self.redis.get(self.legacy_key(match_id))
+        if not raw:
+            return None
+        state = json.loads(raw)
+        solution = match_solution(state)
+        for player in state["players"].values():
+            _ensure_packed(player, solution)
+        self.create(state)
+        self.redis.delete(self.legacy_key(match_id))
+        return state
+
+    def _adopt_inline_puzzle(self, match_id: str, meta: Dict[str, str]) -> Optional[Puzzle]:
+        """Matches created before ``puzzleId`` kept a per-match ``{id}:puzzle`` JSON copy."""
+        raw = self.redis.get(self.key(match_id, "puzzle"))
+        if not raw:
+            return None
+        data = json.loads(raw)
+        solution = [[char == "1" for char in row] for row in data["solution"]]
+        puzzle = save_puzzle(make_puzzle(solution, data["rowClues"], data["columnClues"], meta.get("difficulty") or "normal"))
+        pipe = self.redis.pipeline()
+        pipe.hset(self.key(match_id), "puzzleId", puzzle.puzzle_id)
+        pipe.delete(self.key(match_id, "puzzle"))
+        pipe.execute()
+        return puzzle
+
     def get(self, match_id: str) -> Optional[dict]:
-        raw = self.redis.get(self.key(match_id))
-        return json.loads(raw) if raw else None
+        meta = self.redis.hgetall(self.key(match_id))
+        if not meta:
+            return self._migrate_legacy(match_id)
+        puzzle_id = meta.get("puzzleId")
+        if not puzzle_id:
+            adopted = self._adopt_inline_puzzle(match_id, meta)
+            if adopted is None:
+                return None
+            puzzle_id = adopted.puzzle_id
+        size = int(meta["size"])
+        user_ids = json.loads(meta.get("players") or "[]")
+
+        counters = self.redis.pipeline()
+        boards = self.raw.pipeline()
+        for user_id in user_ids:
+            counters.hgetall(self.key(match_id, "player", user_id))
+            boards.get(self.key(match_id, "board", user_id))
+        counter_values = counters.execute()
+        board_values = boards.execute()
+
+        players = {}
+        for user_id, counter, board in zip(user_ids, counter_values, board_values):
+            players[user_id] = {
+                "rows": board_from_bytes(board, size),
+                "answered": int(counter.get("answered", 0)),
+                "mismatches": int(counter.get("mismatches", 0)),
+                "finishedAt": _decode_time(counter.get("finishedAt")),
+            }
+        return {
+            "matchId": meta["matchId"],
+            "createdAt": _decode_time(meta.get("createdAt")),
+            "startedAt": _decode_time(meta.get("startedAt")),
+            "finishedAt": _decode_time(meta.get("finishedAt")),
+            "status": meta["status"],
+            "size": size,
+            "difficulty": meta.get("difficulty") or "normal",
+            "puzzleId": puzzle_id,
+            "winnerUserId": meta.get("winnerUserId") or None,
+            "version": int(meta.get("version") or 0),
+            "players": players,
+        }
 
     def update(self, match_id: str, updater: Callable[[dict], T]) -> T:
-        state = self.get(match_id)
-        if state is None:
-            raise KeyError("MATCH_NOT_FOUND")
-        result = updater(state)
-        self.redis.setex(self.key(match_id), self.ttl, json.dumps(state, ensure_ascii=False))
-        return result
+        """Optimistic read-modify-write for rare whole-match changes (join, clear)."""
+        while True:
+            with self.redis.pipeline() as pipe:
+                try:
+                    meta_key = self.key(match_id)
+                    pipe.watch(meta_key)
+                    state = self.get(match_id)
+                    if state is None:
+                        raise KeyError("MATCH_NOT_FOUND")
+                    for user_id in state["players"]:
+                        pipe.watch(self.key(match_id, "player", user_id), self.key(match_id, "board", user_id))
+                    result = updater(state)
+                    pipe.multi()
+                    self._write_meta(pipe, state)
+                    self._write_players(pipe, state, list(state["players"]))
+                    pipe.execute()
+                    if state.get("puzzleId"):
+                        touch_puzzle(state["puzzleId"])
+                    return result
+                except redis.WatchError:
+                    continue
+
+    def move(self, match_id: str, user_id: str, cells: Cells) -> Dict[str, Any]:
+        meta_key = self.key(match_id)
+        players, puzzle_id = self.redis.hmget(meta_key, "players", "puzzleId")
+        user_ids = json.loads(players or "null") or []
+        if not user_ids and self._migrate_legacy(match_id) is not None:
+            players, puzzle_id = self.redis.hmget(meta_key, "players", "puzzleId")
+            user_ids = json.loads(players or "[]")
+        keys = [
+            meta_key,
+            self.key(match_id, "solution"),
+            self.key(match_id, "player", user_id),
+            self.key(match_id, "board", user_id),
+        ] + [self.key(match_id, "player", uid) for uid in user_ids]
+        args: List[Any] = [user_id, time.time(), self.ttl]
+        for row, column, cell_state in cells:
+            args += [row, column, CELL_CODES[cell_state]]
+        result = self._move(keys=keys, args=args)
+        if not result[0]:
+            code = result[1]
+            if code == "MATCH_NOT_FOUND":
+                raise KeyError(code)
+            raise ValueError(code)
+        if puzzle_id:
+            # The match keys were just re-expired by the script; keep the shared puzzle alive too.
+            touch_puzzle(puzzle_id)
+        _, answered, mismatches, done, status, winner, version, size = result
+        return {
+            "version": int(version),
+            "size": int(size),
+            "status": status,
+            "winnerUserId": winner or None,
+            "answered": int(answered),
+            "mismatches": int(mismatches),
+            "finished": bool(int(done)),
+        }
+
+    def version(self, match_id: str) -> Optional[int]:
+        """One hash field, for conditional GETs; None (read the match) for legacy documents."""
+        raw = self.redis.hget(self.key(match_id), "version")
+        return int(raw) if raw else None
 
 
 def create_repo() -> Repo:
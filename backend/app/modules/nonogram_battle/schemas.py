@@ -1,8 +1,8 @@
 from __future__ import annotations
 
-from typing import Any, Dict, Literal, Optional
+from typing import Any, Dict, List, Literal, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 
 
 class ApiError(BaseModel):
@@ -21,6 +21,8 @@ class CreateReq(BaseModel):
     userId: str = Field(..., min_length=1)
     size: int = Field(10, ge=5, le=25)
     difficulty: Literal["easy", "normal", "hard"] = "normal"
+    scoreMin: Optional[int] = Field(None, ge=0, le=100)
+    scoreMax: Optional[int] = Field(None, ge=0, le=100)
 
 
 class JoinReq(BaseModel):
@@ -29,6 +31,32 @@ class JoinReq(BaseModel):
 
 class MoveReq(BaseModel):
     userId: str = Field(..., min_length=1)
-    row: int = Field(..., ge=0, le=14)
-    column: int = Field(..., ge=0, le=14)
+    row: int = Field(..., ge=0, le=24)
+    column: int = Field(..., ge=0, le=24)
     state: Literal["unknown", "filled", "marked"]
+
+
+class CellEdit(BaseModel):
+    row: int = Field(..., ge=0, le=24)
+    column: int = Field(..., ge=0, le=24)
+    state: Literal["unknown", "filled", "marked"]
+
+
+class MovesReq(BaseModel):
+    userId: str = Field(..., min_length=1)
+    cells: List[CellEdit] = Field(..., min_length=1, max_length=625)
+
+
+class HintReq(BaseModel):
+    """Single-player hint: the client owns the puzzle, so clues and board come with the request.
+    Each board row is a string of cell codes: 0 unknown, 1 filled, 2 marked."""
+    rowClues: List[List[int]] = Field(..., min_length=5, max_length=25)
+    columnClues: List[List[int]] = Field(..., min_length=5, max_length=25)
+    board: List[str] = Field(..., min_length=5, max_length=25)
+
+    @field_validator("board")
+    @classmethod
+    def _cell_codes(cls, rows: List[str]) -> List[str]:
+        if any(row.strip("012") for row in rows):
+            raise ValueError("board rows may only contain 0, 1 and 2")
+        return rows
@@ -0,0 +1,263 @@
+from __future__ import annotations
+
+from typing import List, Optional, Sequence, Tuple
+
+Cell = Optional[bool]
+Dirty = Tuple[List[bool], List[bool]]
+
+# Lines are bitmasks where bit i is cell i: ``filled`` holds the cells known to
+# be filled and ``known`` the cells whose value is known (filled is a subset).
+
+
+def _popcount(value: int) -> int:
+    return bin(value).count("1")
+
+
+def _spread_up(seeds: int, passable: int, limit: int) -> int:
+    """Extend every seed bit towards higher bits while the next bit is passable."""
+    shift = 1
+    while shift <= limit:
+        seeds |= passable & (seeds << shift)
+        passable &= passable << shift
+        shift <<= 1
+    return seeds
+
+
+def _spread_down(seeds: int, passable: int, limit: int) -> int:
+    shift = 1
+    while shift <= limit:
+        seeds |= passable & (seeds >> shift)
+        passable &= passable >> shift
+        shift <<= 1
+    return seeds
+
+
+def _runs_of(mask: int, width: int) -> int:
+    """Bits s such that bits s..s+width-1 of ``mask`` are all set."""
+    result = mask
+    covered = 1
+    while covered < width:
+        step = min(covered, width - covered)
+        result &= result >> step
+        covered += step
+    return result
+
+
+def _smear(starts: int, width: int) -> int:
+    """Set bits s..s+width-1 for every set bit s."""
+    result = starts
+    covered = 1
+    while covered < width:
+        step = min(covered, width - covered)
+        result |= result << step
+        covered += step
+    return result
+
+
+def _mask_runs(filled: int, length: int) -> List[int]:
+    runs: List[int] = []
+    run = 0
+    for i in range(length):
+        if filled >> i & 1:
+            run += 1
+        elif run:
+            runs.append(run)
+            run = 0
+    if run:
+        runs.append(run)
+    return runs
+
+
+def solve_line_mask(raw_clues: Sequence[int], length: int, filled: int, known: int) -> Optional[Tuple[int, int]]:
+    """Return ``(filled, known)`` with every cell forced by the clues, or ``None`` on a contradiction.
+
+    ``prefix[j]`` has bit i set when cells [0, i) can hold exactly the first j
+    blocks and ``suffix[j]`` when cells [i, n) can hold blocks j..k-1. This is
+    the O(length x clues) placement DP, but each DP row is built with a few
+    shifts over the whole line instead of one step per cell.
+    """
+    clues = [value for value in raw_clues if value > 0]
+    n = length
+    k = len(clues)
+    full = (1 << n) - 1
+    if known == full:
+        return (filled, known) if _mask_runs(filled, n) == clues else None
+
+    not_filled = full & ~filled
+    free = full & ~(known & ~filled)
+    fits = [_runs_of(free, width) for width in clues]
+
+    # Moving from position i to i + 1 crosses cell i, which must not be filled.
+    prefix = [_spread_up(1, not_filled << 1, n)]
+    lefts: List[int] = []
+    for j, width in enumerate(clues):
+        lefts.append(((prefix[j] & not_filled) << 1) | (1 if j == 0 else 0))
+        prefix.append(_spread_up((lefts[j] & fits[j]) << width, not_filled << 1, n))
+    if not prefix[k] >> n & 1:
+        return None
+
+    suffix = [0] * (k + 1)
+    suffix[k] = _spread_down(1 << n, not_filled, n)
+    rights = [0] * k
+    for j in range(k - 1, -1, -1):
+        rights[j] = ((suffix[j + 1] >> 1) & not_filled) | ((1 << n) if j == k - 1 else 0)
+        suffix[j] = _spread_down(fits[j] & (rights[j] >> clues[j]), not_filled, n)
+
+    can_be_empty = 0
+    for j in range(k + 1):
+        can_be_empty |= prefix[j] & (suffix[j] >> 1)
+    can_be_empty &= not_filled
+    can_be_filled = 0
+    for j, width in enumerate(clues):
+        can_be_filled |= _smear(lefts[j] & fits[j] & (rights[j] >> width), width)
+
+    if (can_be_empty | can_be_filled) & full != full:
+        return None
+    both = can_be_empty & can_be_filled
+    return can_be_filled & ~both & full, full & ~both
+
+
+def solve_line(raw_clues: Sequence[int], known: Sequence[Cell]) -> Optional[List[Cell]]:
+    """List form of :func:`solve_line_mask`: forced cells are filled in, the rest stay ``None``."""
+    filled = sum(1 << i for i, value in enumerate(known) if value is True)
+    known_mask = sum(1 << i for i, value in enumerate(known) if value is not None)
+    solved = solve_line_mask(raw_clues, len(known), filled, known_mask)
+    if solved is None:
+        return None
+    filled, known_mask = solved
+    return [bool(filled >> i & 1) if known_mask >> i & 1 else None for i in range(len(known))]
+
+
+class MaskGrid:
+    """Square grid kept as row masks plus the transposed column masks."""
+
+    __slots__ = ("size", "row_filled", "row_known", "column_filled", "column_known")
+
+    def __init__(self, size: int):
+        self.size = size
+        self.row_filled = [0] * size
+        self.row_known = [0] * size
+        self.column_filled = [0] * size
+        self.column_known = [0] * size
+
+    def copy(self) -> "MaskGrid":
+        other = MaskGrid.__new__(MaskGrid)
+        other.size = self.size
+        other.row_filled = self.row_filled[:]
+        other.row_known = self.row_known[:]
+        other.column_filled = self.column_filled[:]
+        other.column_known = self.column_known[:]
+        return other
+
+    def set(self, row: int, column: int, value: bool) -> None:
+        self.row_known[row] |= 1 << column
+        self.column_known[column] |= 1 << row
+        if value:
+            self.row_filled[row] |= 1 << column
+            self.column_filled[column] |= 1 << row
+
+    def first_unknown(self) -> Optional[Tuple[int, int]]:
+        full = (1 << self.size) - 1
+        for row, known in enumerate(self.row_known):
+            unknown = full & ~known
+            if unknown:
+                return row, (unknown & -unknown).bit_length() - 1
+        return None
+
+    def is_complete(self) -> bool:
+        full = (1 << self.size) - 1
+        return all(known == full for known in self.row_known)
+
+    def to_lists(self) -> List[List[Cell]]:
+        return [
+            [bool(filled >> column & 1) if known >> column & 1 else None for column in range(self.size)]
+            for filled, known in zip(self.row_filled, self.row_known)
+        ]
+
+
+def blank_dirty(size: int) -> Dirty:
+    return [True] * size, [True] * size
+
+
+def _propagate_lines(
+    size: int,
+    clues: List[List[int]],
+    filled_lines: List[int],
+    known_lines: List[int],
+    cross_filled: List[int],
+    cross_known: List[int],
+    own_dirty: List[bool],
+    cross_dirty: List[bool],
+) -> Optional[int]:
+    deduced = 0
+    for index in range(size):
+        if not own_dirty[index]:
+            continue
+        own_dirty[index] = False
+        known = known_lines[index]
+        solved = solve_line_mask(clues[index], size, filled_lines[index], known)
+        if solved is None:
+            return None
+        filled, known_after = solved
+        new = known_after & ~known
+        if not new:
+            continue
+        filled_lines[index] = filled
+        known_lines[index] = known_after
+        deduced += _popcount(new)
+        bit = 1 << index
+        while new:
+            low = new & -new
+            cross = low.bit_length() - 1
+            cross_known[cross] |= bit
+            if filled & low:
+                cross_filled[cross] |= bit
+            cross_dirty[cross] = True
+            new ^= low
+    return deduced
+
+
+def propagate_round(
+    grid: MaskGrid,
+    row_clues: List[List[int]],
+    column_clues: List[List[int]],
+    dirty: Optional[Dirty] = None,
+) -> Optional[int]:
+    """Run one pass over all rows, then all columns, writing forced cells into ``grid``.
+
+    Returns the number of newly deduced cells, or ``None`` on a contradiction.
+    ``dirty`` flags the rows/columns changed since they were last solved; clean
+    lines cannot yield anything new and are skipped. It is updated in place.
+    """
+    size = grid.size
+    dirty_rows, dirty_columns = dirty if dirty is not None else blank_dirty(size)
+    from_rows = _propagate_lines(
+        size, row_clues, grid.row_filled, grid.row_known,
+        grid.column_filled, grid.column_known, dirty_rows, dirty_columns,
+    )
+    if from_rows is None:
+        return None
+    from_columns = _propagate_lines(
+        size, column_clues, grid.column_filled, grid.column_known,
+        grid.row_filled, grid.row_known, dirty_columns, dirty_rows,
+    )
+    if from_columns is None:
+        return None
+    return from_rows + from_columns
+
+
+def propagate(
+    grid: MaskGrid,
+    row_clues: List[List[int]],
+    column_clues: List[List[int]],
+    dirty: Optional[Dirty] = None,
+) -> bool:
+    """Repeat line passes until nothing changes; ``False`` means the grid is contradictory."""
+    if dirty is None:
+        dirty = blank_dirty(grid.size)
+    while True:
+        deduced = propagate_round(grid, row_clues, column_clues, dirty)
+        if deduced is None:
+            return False
+        if not deduced:
+            return True
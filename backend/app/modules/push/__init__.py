@@ -0,0 +1 @@
+"""Match event fan-out and server-sent event streams."""
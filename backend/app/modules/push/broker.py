@@ -0,0 +1,164 @@
+"""In-process and Redis pub/sub fan-out of match events.
+
+An event is a small JSON-able dict with a ``type`` and the match ``version`` it
+produced. Subscribers live on the asyncio loop that serves their stream; publishers
+are usually sync endpoints on threadpool threads, so delivery always goes through
+``call_soon_threadsafe``.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Set
+
+import redis
+
+log = logging.getLogger("mahjong.push")
+
+Event = Dict[str, Any]
+
+
+class Subscription:
+    """One stream's view of a channel. A bounded queue; a slow reader is flagged as
+    ``lagged`` instead of buffering without limit, and should resync from a snapshot."""
+
+    def __init__(self, broker: "MemoryBroker", channel: str, queue_size: int):
+        self.broker = broker
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue: "asyncio.Queue[Event]" = asyncio.Queue(queue_size)
+        self.lagged = False
+
+    def _deliver(self, event: Event) -> None:
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.lagged = True
+
+    async def get(self, timeout: float) -> Optional[Event]:
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def drain(self) -> None:
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.lagged = False
+
+    def close(self) -> None:
+        self.broker._unsubscribe(self)
+
+
+class MemoryBroker:
+    broker_type = "memory"
+
+    def __init__(self, queue_size: int = 64):
+        self.queue_size = queue_size
+        self._subscriptions: Dict[str, Set[Subscription]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel: str) -> Subscription:
+        """Must be called on the event loop that will read the subscription."""
+        subscription = Subscription(self, channel, self.queue_size)
+        with self._lock:
+            self._subscriptions.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def _unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.channel)
+            if subscriptions is None:
+                return
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self._subscriptions.pop(subscription.channel, None)
+
+    def subscriber_count(self, channel: Optional[str] = None) -> int:
+        with self._lock:
+            if channel is not None:
+                return len(self._subscriptions.get(channel, ()))
+            return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+    def publish(self, channel: str, event: Event) -> None:
+        self._dispatch(channel, event)
+
+    def _dispatch(self, channel: str, event: Event) -> None:
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._deliver, event)
+            except RuntimeError:
+                # The stream's loop is gone; its finally block will unsubscribe.
+                pass
+
+    def close(self) -> None:
+        pass
+
+
+class RedisBroker(MemoryBroker):
+    """Publishes to ``{prefix}:{channel}``. One pattern subscription per process,
+    started with the first local subscriber, feeds the in-process fan-out, so every
+    uvicorn worker sees events published by any other."""
+
+    broker_type = "redis"
+
+    def __init__(self, url: str, prefix: str = "mh:v1:events", queue_size: int = 64):
+        super().__init__(queue_size)
+        self.redis = redis.Redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+        self._listener: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def subscribe(self, channel: str) -> Subscription:
+        subscription = super().subscribe(channel)
+        if self._listener is None:
+            with self._lock:
+                if self._listener is None:
+                    self._listener = threading.Thread(target=self._listen, name="push-listener", daemon=True)
+                    self._listener.start()
+        return subscription
+
+    def publish(self, channel: str, event: Event) -> None:
+        self.redis.publish(f"{self.prefix}:{channel}", json.dumps(event, ensure_ascii=False, separators=(",", ":")))
+
+    def _listen(self) -> None:
+        skip = len(self.prefix) + 1
+        while not self._stopped.is_set():
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.psubscribe(f"{self.prefix}:*")
+                while not self._stopped.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message.get("type") == "pmessage":
+                        self._dispatch(message["channel"][skip:], json.loads(message["data"]))
+            except redis.RedisError:
+                # Streams resync from a snapshot on reconnect, so missed events are not replayed.
+                log.exception("push_listener_failed prefix=%s", self.prefix)
+                time.sleep(1.0)
+            finally:
+                pubsub.close()
+
+    def close(self) -> None:
+        self._stopped.set()
+
+
+def create_broker_from_env() -> MemoryBroker:
+    queue_size = int(os.getenv("PUSH_QUEUE_SIZE", "64"))
+    if os.getenv("GAME_REPO", "memory").lower() == "redis":
+        return RedisBroker(os.getenv("REDIS_URL", "redis://localhost:6379/0"), queue_size=queue_size)
+    return MemoryBroker(queue_size)
+
+
+def publish(broker: MemoryBroker, channel: str, *events: Event) -> None:
+    """Best effort: a failed publish only delays clients until their next resync."""
+    for event in events:
+        try:
+            broker.publish(channel, event)
+        except Exception:
+            log.exception("push_publish_failed channel=%s type=%s", channel, event.get("type"))
@@ -0,0 +1,98 @@
+"""Per-match snapshots shared by every viewer in the process.
+
+Spectator polls and event-stream (re)connects ask for the same match view over and
+over. ``SnapshotCache.get`` answers from the cached snapshot while the match version
+is unchanged and rebuilds it at most once per version: one viewer builds, the others
+wait on the same per-key lock and reuse the result. Within ``fresh_seconds`` of the
+last check not even the version is read, and a finished match is never re-read.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+Snapshot = Dict[str, Any]
+
+
+@dataclass
+class _Entry:
+    version: Optional[int]
+    checked_at: float
+    snapshot: Snapshot
+
+
+class SnapshotCache:
+    def __init__(self, fresh_seconds: float = 1.0, max_entries: int = 1024):
+        self.fresh_seconds = fresh_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self.builds = 0
+        self.hits = 0
+
+    def _entry(self, key: str) -> Optional[_Entry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def _key_lock(self, key: str) -> threading.Lock:
+        with self._lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _hit(self, entry: _Entry) -> Snapshot:
+        with self._lock:
+            self.hits += 1
+        return entry.snapshot
+
+    def get(
+        self,
+        key: str,
+        version: Callable[[], Optional[int]],
+        build: Callable[[], Optional[Snapshot]],
+        fresh_seconds: Optional[float] = None,
+    ) -> Optional[Snapshot]:
+        """The snapshot for ``key``; ``version`` is the cheap current-version lookup and
+        ``build`` reads the match and returns a dict with ``version`` (None if missing).
+
+        Event streams pass ``fresh_seconds=0``: their snapshot must be at least as new as
+        anything published before they subscribed.
+        """
+        fresh = self.fresh_seconds if fresh_seconds is None else fresh_seconds
+        entry = self._entry(key)
+        if entry is not None and (entry.snapshot.get("status") == "finished" or time.monotonic() - entry.checked_at < fresh):
+            return self._hit(entry)
+        current = version()
+        if entry is not None and current is not None and entry.version == current:
+            entry.checked_at = time.monotonic()
+            return self._hit(entry)
+        with self._key_lock(key):
+            entry = self._entry(key)
+            if entry is not None and current is not None and entry.version is not None and entry.version >= current:
+                return self._hit(entry)
+            snapshot = build()
+            with self._lock:
+                self.builds += 1
+                if snapshot is None:
+                    self._entries.pop(key, None)
+                    self._locks.pop(key, None)
+                    return None
+                self._entries[key] = _Entry(int(snapshot["version"]), time.monotonic(), snapshot)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    evicted, _ = self._entries.popitem(last=False)
+                    self._locks.pop(evicted, None)
+            return snapshot
+
+
+def create_snapshot_cache_from_env() -> SnapshotCache:
+    return SnapshotCache(
+        fresh_seconds=float(os.getenv("SPECTATE_FRESH_SECONDS", "1")),
+        max_entries=int(os.getenv("SPECTATE_CACHE_SIZE", "1024")),
+    )
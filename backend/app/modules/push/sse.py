@@ -0,0 +1,103 @@
+"""Server-sent event streams of match events with heartbeats and resume-from-version.
+
+A stream subscribes first and then reads a snapshot, so nothing published in between
+is lost. The snapshot is sent as a ``sync`` event unless the client already has that
+version (``Last-Event-ID`` / ``lastVersion``); live events at or below the synced
+version are skipped. A reader that falls behind gets a fresh ``sync`` instead of the
+events it missed. Event ids are match versions, so a reconnecting ``EventSource``
+resumes by itself.
+"""
+from __future__ import annotations
+
+import json
+import os
+from typing import AsyncIterator, Callable, Optional
+
+from fastapi import Request
+from fastapi.responses import Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+from app.modules.push.broker import Event, MemoryBroker
+
+HEARTBEAT_SECONDS = float(os.getenv("PUSH_HEARTBEAT_SECONDS", "15"))
+RETRY_MILLISECONDS = int(os.getenv("PUSH_RETRY_MILLISECONDS", "3000"))
+
+Snapshot = Callable[[], Optional[Event]]
+
+
+def format_event(event: Event) -> str:
+    data = json.dumps(event, ensure_ascii=False, separators=(",", ":"))
+    return f"id: {event['version']}\nevent: {event['type']}\ndata: {data}\n\n"
+
+
+def last_version(request: Request, query_value: Optional[int]) -> Optional[int]:
+    if query_value is not None:
+        return query_value
+    header = request.headers.get("last-event-id", "")
+    return int(header) if header.isdigit() else None
+
+
+async def event_stream(
+    request: Request,
+    broker: MemoryBroker,
+    channel: str,
+    snapshot: Snapshot,
+    since: Optional[int],
+    heartbeat: float = HEARTBEAT_SECONDS,
+) -> AsyncIterator[str]:
+    subscription = broker.subscribe(channel)
+    try:
+        yield f"retry: {RETRY_MILLISECONDS}\n\n"
+        current = await run_in_threadpool(snapshot)
+        if current is None:
+            return
+        synced = current["version"]
+        if since != synced:
+            yield format_event(current)
+        if current.get("status") == "finished":
+            return
+        while True:
+            event = await subscription.get(heartbeat)
+            if await request.is_disconnected():
+                return
+            if subscription.lagged:
+                subscription.drain()
+                current = await run_in_threadpool(snapshot)
+                if current is None:
+                    return
+                synced = current["version"]
+                yield format_event(current)
+                if current.get("status") == "finished":
+                    return
+                continue
+            if event is None:
+                yield ": ping\n\n"
+                continue
+            if event["version"] <= synced:
+                continue
+            yield format_event(event)
+            if event["type"] == "finished":
+                return
+    finally:
+        subscription.close()
+
+
+def stream_response(
+    request: Request,
+    broker: MemoryBroker,
+    channel: str,
+    snapshot: Snapshot,
+    since: Optional[int],
+    current: Event,
+) -> Response:
+    """``current`` is the snapshot the endpoint already read to check the match exists.
+
+    A client that already saw the final version gets 204: per the SSE spec this stops
+    ``EventSource`` from reconnecting to a finished match."""
+    if current.get("status") == "finished" and since is not None and since >= current["version"]:
+        return Response(status_code=204)
+    return StreamingResponse(
+        event_stream(request, broker, channel, snapshot, since),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
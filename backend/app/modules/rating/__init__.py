@@ -0,0 +1 @@
+"""Persistent Elo ratings and leaderboard for finished battles."""
@@ -0,0 +1,21 @@
+from __future__ import annotations
+
+from fastapi import APIRouter, Query
+
+from app.api.deps import rating_store
+from app.modules.rating.elo import DEFAULT_RATING
+from app.modules.rating.schemas import ApiResponse
+
+router = APIRouter()
+
+
+@router.get("/leaderboard", response_model=ApiResponse)
+def leaderboard(limit: int = Query(10, ge=1, le=100)) -> ApiResponse:
+    return ApiResponse(ok=True, data={"players": rating_store.top(limit)}, error=None)
+
+
+@router.get("/player", response_model=ApiResponse)
+def player(userId: str) -> ApiResponse:
+    """A player's rating and 1-based rank; unrated players get the starting rating and no rank."""
+    record = rating_store.player(userId) or {"userId": userId, "rank": None, "rating": DEFAULT_RATING, "games": 0, "wins": 0}
+    return ApiResponse(ok=True, data=record, error=None)
@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+from typing import Dict, Mapping
+
+DEFAULT_RATING = 1500.0
+DEFAULT_K = 32.0
+
+
+def expected(rating: float, other: float) -> float:
+    return 1.0 / (1.0 + 10 ** ((other - rating) / 400.0))
+
+
+def match_deltas(ratings: Mapping[str, float], scores: Mapping[str, int], k: float = DEFAULT_K) -> Dict[str, float]:
+    """Rating change per player, scoring a match as every pairwise game between its players.
+
+    Each player's K is split over their ``n - 1`` pairings, so a large room moves a
+    rating no further than a duel; the changes sum to zero.
+    """
+    players = list(scores)
+    deltas = dict.fromkeys(players, 0.0)
+    if len(players) < 2:
+        return deltas
+    scale = k / (len(players) - 1)
+    for i, a in enumerate(players):
+        for b in players[i + 1:]:
+            actual = 1.0 if scores[a] > scores[b] else 0.5 if scores[a] == scores[b] else 0.0
+            change = scale * (actual - expected(ratings[a], ratings[b]))
+            deltas[a] += change
+            deltas[b] -= change
+    return deltas
+
+
+def apply_match(current: Mapping[str, Mapping], scores: Mapping[str, int], k: float = DEFAULT_K) -> Dict[str, Dict]:
+    """New ``{rating, games, wins}`` records for a match's players; a tie for first is no win."""
+    ratings = {uid: float((current.get(uid) or {}).get("rating", DEFAULT_RATING)) for uid in scores}
+    deltas = match_deltas(ratings, scores, k)
+    best = max(scores.values())
+    leaders = [uid for uid, score in scores.items() if score == best]
+    winner = leaders[0] if len(leaders) == 1 else None
+    updated = {}
+    for uid in scores:
+        record = current.get(uid) or {}
+        updated[uid] = {
+            "rating": ratings[uid] + deltas[uid],
+            "games": int(record.get("games", 0)) + 1,
+            "wins": int(record.get("wins", 0)) + (uid == winner),
+        }
+    return updated
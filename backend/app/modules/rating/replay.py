@@ -0,0 +1,83 @@
+"""Offline rating recompute from an archived match log.
+
+Every rated match is archived (the ``{prefix}:log`` stream in Redis). Export it,
+replay it in one in-memory pass, e.g. with a new K factor, and optionally replace
+the live ratings with the result::
+
+    python -m app.modules.rating.replay export --out matches.jsonl
+    python -m app.modules.rating.replay replay --log matches.jsonl --k 24 --top 20
+    python -m app.modules.rating.replay replay --write
+
+The log is JSON lines of ``{"matchId", "finishedAt", "scores": {userId: totalScore}}``.
+Matches are replayed by ``finishedAt``; a match id seen twice is rated once.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from typing import Any, Dict, Iterable, Iterator, Mapping
+
+from app.modules.rating.elo import DEFAULT_K, apply_match
+from app.modules.rating.store import create_rating_store_from_env
+
+
+def replay(entries: Iterable[Mapping[str, Any]], k: float = DEFAULT_K) -> Dict[str, Dict[str, Any]]:
+    """Ratings after applying ``entries`` in ``finishedAt`` order, starting from nothing."""
+    players: Dict[str, Dict[str, Any]] = {}
+    seen = set()
+    for entry in sorted(entries, key=lambda e: (float(e["finishedAt"]), e["matchId"])):
+        if entry["matchId"] in seen or len(entry["scores"]) < 2:
+            continue
+        seen.add(entry["matchId"])
+        scores = entry["scores"]
+        for uid, record in apply_match({uid: players.get(uid) for uid in scores}, scores, k).items():
+            players[uid] = {**record, "updatedAt": float(entry["finishedAt"])}
+    return players
+
+
+def read_log(path: str) -> Iterator[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Export the rated-match archive or recompute ratings from it.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export")
+    export.add_argument("--out", required=True)
+    run = commands.add_parser("replay")
+    run.add_argument("--log", help="JSON lines file; defaults to the configured store's archive")
+    run.add_argument("--k", type=float, help="K factor; defaults to RATING_K_FACTOR")
+    run.add_argument("--top", type=int, default=10)
+    run.add_argument("--write", action="store_true", help="replace the stored ratings with the result")
+    args = parser.parse_args()
+
+    store = create_rating_store_from_env()
+    if args.command == "export":
+        count = 0
+        with open(args.out, "w", encoding="utf-8") as f:
+            for entry in store.archive():
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                count += 1
+        print(f"exported {count} matches to {args.out}")
+        return
+
+    started = time.perf_counter()
+    entries = list(read_log(args.log) if args.log else store.archive())
+    players = replay(entries, args.k if args.k is not None else store.k)
+    elapsed = time.perf_counter() - started
+    print(f"replayed {len(entries)} matches, {len(players)} players ({elapsed:.2f}s)", file=sys.stderr)
+    best = sorted(players.items(), key=lambda item: (item[1]["rating"], item[0]), reverse=True)[:args.top]
+    for rank, (uid, record) in enumerate(best, 1):
+        print(f"{rank:>4} {record['rating']:8.1f} {record['games']:>5} {record['wins']:>5}  {uid}")
+    if args.write:
+        store.replace(players)
+        print(f"wrote {len(players)} ratings to the {store.store_type} store")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,17 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Optional
+
+from pydantic import BaseModel
+
+
+class ApiError(BaseModel):
+    code: str
+    message: str
+    detail: Optional[Dict[str, Any]] = None
+
+
+class ApiResponse(BaseModel):
+    ok: bool
+    data: Optional[Dict[str, Any]] = None
+    error: Optional[ApiError] = None
@@ -0,0 +1,219 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Protocol
+
+import redis
+
+from app.modules.common.scoreboard import Scoreboard
+from app.modules.rating.elo import DEFAULT_K, DEFAULT_RATING, apply_match
+
+# A match id is remembered this long after it was rated; a finished battle expires well before.
+APPLIED_TTL = 30 * 86400
+# The memory store keeps only this many archived matches; Redis keeps the whole log.
+ARCHIVE_SIZE = 100_000
+
+
+def _changes(current: Mapping[str, Mapping], updated: Mapping[str, Mapping]) -> Dict[str, Dict[str, float]]:
+    changes = {}
+    for uid, record in updated.items():
+        before = float((current.get(uid) or {}).get("rating", DEFAULT_RATING))
+        changes[uid] = {"before": before, "after": record["rating"], "delta": record["rating"] - before}
+    return changes
+
+
+def archive_entry(match_id: str, scores: Mapping[str, int], finished_at: float) -> Dict[str, Any]:
+    return {"matchId": match_id, "finishedAt": finished_at, "scores": dict(scores)}
+
+
+class RatingStore(Protocol):
+    k: float
+    def record(self, match_id: str, scores: Mapping[str, int], finished_at: float) -> Optional[Dict[str, Dict[str, float]]]: ...
+    def player(self, user_id: str) -> Optional[Dict[str, Any]]: ...
+    def top(self, limit: int) -> List[Dict[str, Any]]: ...
+    def archive(self) -> Iterator[Dict[str, Any]]: ...
+    def replace(self, players: Mapping[str, Mapping]) -> None: ...
+    @property
+    def store_type(self) -> str: ...
+
+
+class MemoryRatingStore:
+    """Ratings in a dict with a ``Scoreboard`` for O(log n) ranks.
+
+    Rated match ids expire after ``applied_ttl`` like the Redis markers, and the archive
+    keeps the latest ``archive_size`` matches.
+    """
+
+    def __init__(self, k: float = DEFAULT_K, applied_ttl: int = APPLIED_TTL, archive_size: int = ARCHIVE_SIZE):
+        self.k = k
+        self.applied_ttl = applied_ttl
+        self._players: Dict[str, Dict[str, Any]] = {}
+        self._board = Scoreboard()
+        self._applied: Dict[str, float] = {}
+        self._archive: "deque[Dict[str, Any]]" = deque(maxlen=archive_size)
+        self._lock = threading.Lock()
+
+    @property
+    def store_type(self) -> str:
+        return "memory"
+
+    def _gc(self) -> None:
+        now = time.time()
+        expired = [mid for mid, ts in self._applied.items() if now - ts > self.applied_ttl]
+        for mid in expired:
+            del self._applied[mid]
+
+    def record(self, match_id: str, scores: Mapping[str, int], finished_at: float) -> Optional[Dict[str, Dict[str, float]]]:
+        """Rate a finished match once; ``None`` if ``match_id`` was already rated."""
+        with self._lock:
+            self._gc()
+            if match_id in self._applied:
+                return None
+            current = {uid: self._players.get(uid) for uid in scores}
+            updated = apply_match(current, scores, self.k)
+            for uid, record in updated.items():
+                self._players[uid] = {**record, "updatedAt": finished_at}
+                self._board.set(uid, record["rating"])
+            self._applied[match_id] = time.time()
+            self._archive.append(archive_entry(match_id, scores, finished_at))
+            return _changes(current, updated)
+
+    def player(self, user_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            record = self._players.get(user_id)
+            if record is None:
+                return None
+            return {"userId": user_id, "rank": self._board.rank(user_id) + 1, **record}
+
+    def top(self, limit: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [
+                {"userId": uid, "rank": i + 1, **self._players[uid]}
+                for i, (uid, _) in enumerate(self._board.range(0, limit - 1))
+            ]
+
+    def archive(self) -> Iterator[Dict[str, Any]]:
+        with self._lock:
+            entries = list(self._archive)
+        return iter(entries)
+
+    def replace(self, players: Mapping[str, Mapping]) -> None:
+        with self._lock:
+            self._players = {uid: dict(record) for uid, record in players.items()}
+            self._board = Scoreboard()
+            for uid, record in self._players.items():
+                self._board.set(uid, record["rating"])
+
+
+class RedisRatingStore:
+    """``{prefix}:player:<userId>`` hashes, a ``{prefix}:leaderboard`` sorted set by rating,
+    ``{prefix}:applied:<matchId>`` markers and the ``{prefix}:log`` stream of rated matches.
+
+    ``record`` is an optimistic transaction watching the marker and the players' hashes,
+    so concurrent matches sharing a player retry instead of losing an update and a match
+    is rated at most once however many processes report it.
+    """
+
+    def __init__(self, url: str, k: float = DEFAULT_K, key_prefix: str = "mh:v1:rating", applied_ttl: int = APPLIED_TTL):
+        self.redis = redis.Redis.from_url(url, decode_responses=True)
+        self.k = k
+        self.key_prefix = key_prefix
+        self.applied_ttl = applied_ttl
+
+    @property
+    def store_type(self) -> str:
+        return "redis"
+
+    def key(self, *parts: str) -> str:
+        return ":".join((self.key_prefix,) + parts)
+
+    def _read(self, user_ids: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        pipe = self.redis.pipeline(transaction=False)
+        for uid in user_ids:
+            pipe.hgetall(self.key("player", uid))
+        return {uid: _record_from_hash(data) for uid, data in zip(user_ids, pipe.execute())}
+
+    def record(self, match_id: str, scores: Mapping[str, int], finished_at: float) -> Optional[Dict[str, Dict[str, float]]]:
+        """Rate a finished match once; ``None`` if ``match_id`` was already rated."""
+        applied = self.key("applied", match_id)
+        user_ids = list(scores)
+        while True:
+            with self.redis.pipeline() as pipe:
+                try:
+                    pipe.watch(applied, *(self.key("player", uid) for uid in user_ids))
+                    if pipe.exists(applied):
+                        return None
+                    current = self._read(user_ids)
+                    updated = apply_match(current, scores, self.k)
+                    pipe.multi()
+                    for uid, record in updated.items():
+                        pipe.hset(self.key("player", uid), mapping={**record, "updatedAt": finished_at})
+                        pipe.zadd(self.key("leaderboard"), {uid: record["rating"]})
+                    pipe.set(applied, "1", ex=self.applied_ttl)
+                    pipe.xadd(self.key("log"), {"match": json.dumps(archive_entry(match_id, scores, finished_at), ensure_ascii=False)})
+                    pipe.execute()
+                    return _changes(current, updated)
+                except redis.WatchError:
+                    continue
+
+    def player(self, user_id: str) -> Optional[Dict[str, Any]]:
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.hgetall(self.key("player", user_id))
+        pipe.zrevrank(self.key("leaderboard"), user_id)
+        data, rank = pipe.execute()
+        record = _record_from_hash(data)
+        if record is None or rank is None:
+            return None
+        return {"userId": user_id, "rank": int(rank) + 1, **record}
+
+    def top(self, limit: int) -> List[Dict[str, Any]]:
+        user_ids = self.redis.zrevrange(self.key("leaderboard"), 0, limit - 1)
+        records = self._read(user_ids)
+        return [{"userId": uid, "rank": i + 1, **(records[uid] or {})} for i, uid in enumerate(user_ids)]
+
+    def archive(self, chunk: int = 1000) -> Iterator[Dict[str, Any]]:
+        start = "-"
+        while True:
+            entries = self.redis.xrange(self.key("log"), min=start, count=chunk)
+            for _, fields in entries:
+                yield json.loads(fields["match"])
+            if len(entries) < chunk:
+                return
+            start = "(" + entries[-1][0]
+
+    def replace(self, players: Mapping[str, Mapping], chunk: int = 1000) -> None:
+        """Overwrite every rating, e.g. with a batch recompute; players not in ``players`` are dropped."""
+        stale = set(self.redis.zrange(self.key("leaderboard"), 0, -1)) - set(players)
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.delete(self.key("leaderboard"), *(self.key("player", uid) for uid in stale))
+        for i, (uid, record) in enumerate(players.items(), 1):
+            pipe.delete(self.key("player", uid))
+            pipe.hset(self.key("player", uid), mapping=dict(record))
+            pipe.zadd(self.key("leaderboard"), {uid: record["rating"]})
+            if i % chunk == 0:
+                pipe.execute()
+        pipe.execute()
+
+
+def _record_from_hash(data: Dict[str, str]) -> Optional[Dict[str, Any]]:
+    if not data:
+        return None
+    record: Dict[str, Any] = {
+        "rating": float(data.get("rating") or DEFAULT_RATING),
+        "games": int(data.get("games") or 0),
+        "wins": int(data.get("wins") or 0),
+    }
+    if data.get("updatedAt"):
+        record["updatedAt"] = float(data["updatedAt"])
+    return record
+
+
+def create_rating_store_from_env() -> RatingStore:
+    k = float(os.getenv("RATING_K_FACTOR", str(DEFAULT_K)))
+    if os.getenv("GAME_REPO", "memory").lower() == "redis":
+        return RedisRatingStore(os.getenv("REDIS_URL", "redis://localhost:6379/0"), k=k)
+    return MemoryRatingStore(k=k, archive_size=int(os.getenv("RATING_ARCHIVE_SIZE", str(ARCHIVE_SIZE))))
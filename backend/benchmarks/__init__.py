@@ -0,0 +1 @@
+"""性能基准。在 ``backend/`` 下以 ``python -m benchmarks.<name>`` 运行。"""
@@ -0,0 +1,137 @@
+# _*_ coding : utf-8 _*_
+# @Time : 2026/10/19
+# @Author : Yoln
+# @File : common
+# @Project : mahjong-handle-web
+"""基准脚本公共工具：延迟统计、JSON 基线的保存与对比。"""
+from __future__ import annotations
+
+import json
+import os
+import platform
+import sys
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# 数值越大越好的指标；其余指标均为越小越好
+HIGHER_IS_BETTER = {"picksPerSec", "opsPerSec", "winRate", "successRate", "speedup", "inRangeRate"}
+
+
+def percentile(sorted_values: Sequence[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, max(0, int(round(q / 100 * (len(sorted_values) - 1)))))
+    return float(sorted_values[idx])
+
+
+def latency_summary(samples_ns: Iterable[int], prefix: str = "") -> Dict[str, float]:
+    """把单次操作耗时（纳秒）汇总为微秒级 p50/p99/均值。"""
+    values = sorted(samples_ns)
+    count = len(values)
+    mean = sum(values) / count if count else 0.0
+    return {
+        f"{prefix}p50Us": round(percentile(values, 50) / 1000, 2),
+        f"{prefix}p99Us": round(percentile(values, 99) / 1000, 2),
+        f"{prefix}meanUs": round(mean / 1000, 2),
+    }
+
+
+def run_meta(**extra: Any) -> Dict[str, Any]:
+    return {
+        "createdAt": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        **extra,
+    }
+
+
+def save_baseline(path: str, payload: Dict[str, Any]) -> None:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def load_baseline(path: str) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare_results(
+    current: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    threshold: float = 0.10,
+) -> Tuple[List[str], int]:
+    """对比两份 ``{case: {metric: value}}`` 结果，返回可打印的行与退化超过 threshold 的指标数。"""
+    rows: List[str] = []
+    regressions = 0
+    for case in sorted(set(current) | set(baseline)):
+        cur = current.get(case)
+        base = baseline.get(case)
+        if cur is None or base is None:
+            rows.append(f"{case:<32} {'only in ' + ('current' if cur else 'baseline')}")
+            continue
+        for metric in sorted(set(cur) & set(base)):
+            old, new = base[metric], cur[metric]
+            if not isinstance(old, (int, float)) or not isinstance(new, (int, float)):
+                continue
+            change = (new - old) / old if old else 0.0
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            flag = ""
+            if worse > threshold:
+                flag = "  REGRESSION"
+                regressions += 1
+            elif worse < -threshold:
+                flag = "  improved"
+            rows.append(f"{case:<32} {metric:<20} {old:>12.2f} -> {new:>12.2f} ({change:+.1%}){flag}")
+    return rows, regressions
+
+
+def print_table(results: Dict[str, Dict[str, Any]], columns: Optional[List[str]] = None) -> None:
+    if not results:
+        return
+    columns = columns or sorted({k for row in results.values() for k in row})
+    width = max([16] + [len(c) + 2 for c in columns])
+    print(f"{'case':<32}" + "".join(f"{c:>{width}}" for c in columns))
+    for case, row in results.items():
+        cells = "".join(
+            f"{row.get(c, ''):>{width}.2f}" if isinstance(row.get(c), float) else f"{str(row.get(c, '')):>{width}}"
+            for c in columns
+        )
+        print(f"{case:<32}{cells}")
+
+
+class DictRedis:
+    """进程内替身，实现 JSON 文档型 repo 用到的 ``redis.Redis`` 子集。
+
+    值仍以字符串保存，repo 的 ``json.dumps``/``json.loads`` 开销照常计入。
+    """
+
+    def __init__(self) -> None:
+        self._data: Dict[str, str] = {}
+
+    def get(self, key: str) -> Optional[str]:
+        return self._data.get(key)
+
+    def set(self, key: str, value: str, *args: Any, **kwargs: Any) -> bool:
+        self._data[key] = value
+        return True
+
+    def setex(self, key: str, ttl: int, value: str) -> bool:
+        self._data[key] = value
+        return True
+
+    def delete(self, *keys: str) -> int:
+        return sum(1 for key in keys if self._data.pop(key, None) is not None)
+
+    def exists(self, key: str) -> int:
+        return int(key in self._data)
+
+    def ttl(self, key: str) -> int:
+        return -1 if key in self._data else -2
+
+    def ping(self) -> bool:
+        return True
@@ -0,0 +1,294 @@
+# _*_ coding : utf-8 _*_
+# @Time : 2026/10/19
+# @Author : Yoln
+# @File : link_engine
+# @Project : mahjong-handle-web
+"""连连看引擎吞吐基准：种子化机器人自我对弈。
+
+机器人（random / greedy / solver）只根据接口返回的 payload 决策，分别直接调用 domain、
+经 InMemoryLinkRepo、经 RedisLinkRepo（DictRedis 替身，保留 JSON 编解码开销）对局，
+统计 picks/sec、单步 p50/p99、status 与 _ensure_temp_tracking 耗时，以及每步分配字节数。
+
+    python -m benchmarks.link_engine --games 1000 --save benchmarks/baselines/link_engine.json
+    python -m benchmarks.link_engine --games 1000 --compare benchmarks/baselines/link_engine.json
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.modules.link.domain import (
+    _ensure_temp_tracking,
+    create_game,
+    pick_tile,
+    to_status_payload,
+    undo_tile,
+)
+from app.modules.link.repo import InMemoryLinkRepo, RedisLinkRepo
+from app.modules.link.utils.generator import derive_seed
+from app.modules.link.utils.solver import solve_columns
+from benchmarks.common import (
+    DictRedis,
+    compare_results,
+    latency_summary,
+    load_baseline,
+    print_table,
+    run_meta,
+    save_baseline,
+)
+
+Move = Tuple[str, int]
+MAX_STEPS = 400
+
+
+# ----------------------------
+# 机器人
+# ----------------------------
+
+class RandomBot:
+    """随机取非空列，偶尔撤回。"""
+
+    name = "random"
+    undo_rate = 0.05
+
+    def reset(self, payload: Dict[str, Any], rng: random.Random) -> None:
+        pass
+
+    def choose(self, payload: Dict[str, Any], rng: random.Random) -> Move:
+        if payload.get("canUndo") and rng.random() < self.undo_rate:
+            return "undo", len(payload["tempSlots"]) - 1
+        options = [c for c, n in enumerate(payload["columnCounts"]) if n]
+        return "pick", rng.choice(options)
+
+
+class GreedyBot:
+    """优先取能与暂存区配对的牌，否则取同种牌在其他列最浅的一张。"""
+
+    name = "greedy"
+
+    def reset(self, payload: Dict[str, Any], rng: random.Random) -> None:
+        pass
+
+    def choose(self, payload: Dict[str, Any], rng: random.Random) -> Move:
+        tops: List[Optional[str]] = payload["topTiles"]
+        temp = set(payload["tempSlots"])
+        pairs = [c for c, t in enumerate(tops) if t is not None and t in temp]
+        if pairs:
+            return "pick", rng.choice(pairs)
+        columns: List[List[str]] = payload["columns"]
+
+        def depth(c: int) -> int:
+            tile = tops[c]
+            best = 99
+            for o, col in enumerate(columns):
+                start = len(col) - 2 if o == c else len(col) - 1
+                for d, i in enumerate(range(start, -1, -1)):
+                    if d >= best:
+                        break
+                    if col[i] == tile:
+                        best = d
+                        break
+            return best
+
+        options = [c for c, t in enumerate(tops) if t is not None]
+        return "pick", min(options, key=lambda c: (depth(c), rng.random()))
+
+
+class SolverBot:
+    """开局时用求解器规划完整取牌序列；无解时退化为贪心。"""
+
+    name = "solver"
+
+    def __init__(self) -> None:
+        self._fallback = GreedyBot()
+        self._plans: Dict[Tuple[Tuple[str, ...], ...], List[int]] = {}
+        self._plan: List[int] = []
+
+    def reset(self, payload: Dict[str, Any], rng: random.Random) -> None:
+        key = tuple(tuple(col) for col in payload["columns"])
+        if key not in self._plans:
+            self._plans[key] = solve_columns(payload["columns"], temp_limit=payload["tempLimit"]).moves
+        self._plan = list(reversed(self._plans[key]))
+
+    def choose(self, payload: Dict[str, Any], rng: random.Random) -> Move:
+        if self._plan:
+            return "pick", self._plan.pop()
+        return self._fallback.choose(payload, rng)
+
+
+BOTS: Dict[str, Callable[[], Any]] = {"random": RandomBot, "greedy": GreedyBot, "solver": SolverBot}
+
+
+# ----------------------------
+# 对局目标：domain / memory repo / redis repo
+# ----------------------------
+
+class DomainTarget:
+    name = "domain"
+
+    def start(self, deal_seed: int) -> Tuple[Any, Dict[str, Any]]:
+        state = create_game(deal_seed=deal_seed, undo_unlimited=False)
+        return state, to_status_payload(state)
+
+    def move(self, state: Any, kind: str, arg: int) -> Dict[str, Any]:
+        return pick_tile(state, arg) if kind == "pick" else undo_tile(state, arg)
+
+    def status(self, state: Any) -> Dict[str, Any]:
+        return to_status_payload(state)
+
+
+class RepoTarget:
+    def __init__(self, name: str, repo: Any):
+        self.name = name
+        self.repo = repo
+
+    def start(self, deal_seed: int) -> Tuple[Any, Dict[str, Any]]:
+        state = create_game(deal_seed=deal_seed, undo_unlimited=False)
+        self.repo.create(state)
+        return state["gameId"], to_status_payload(state)
+
+    def move(self, game_id: Any, kind: str, arg: int) -> Dict[str, Any]:
+        if kind == "pick":
+            return self.repo.update(game_id, lambda s: pick_tile(s, arg))
+        return self.repo.update(game_id, lambda s: undo_tile(s, arg))
+
+    def status(self, game_id: Any) -> Dict[str, Any]:
+        return to_status_payload(self.repo.get(game_id))
+
+
+def _make_target(name: str) -> Any:
+    if name == "domain":
+        return DomainTarget()
+    if name == "memory":
+        return RepoTarget("memory", InMemoryLinkRepo())
+    repo = RedisLinkRepo("redis://localhost:6379/0", ttl_seconds=3600)
+    repo._r = DictRedis()  # type: ignore[attr-defined]
+    return RepoTarget("redis", repo)
+
+
+# ----------------------------
+# 运行
+# ----------------------------
+
+def run_case(target: Any, bot: Any, games: int, seed: int) -> Dict[str, float]:
+    pick_ns: List[int] = []
+    undo_ns: List[int] = []
+    status_ns: List[int] = []
+    ensure_ns: List[int] = []
+    wins = 0
+    clock = time.perf_counter_ns
+
+    for i in range(games):
+        rng = random.Random(derive_seed(seed, 1_000_000 + i))
+        handle, payload = target.start(derive_seed(seed, i))
+        bot.reset(payload, rng)
+        for _ in range(MAX_STEPS):
+            if payload["finish"]:
+                break
+            kind, arg = bot.choose(payload, rng)
+            t0 = clock()
+            try:
+                result = target.move(handle, kind, arg)
+            except ValueError:
+                continue
+            t1 = clock()
+            (pick_ns if kind == "pick" else undo_ns).append(t1 - t0)
+
+            t0 = clock()
+            payload = target.status(handle)
+            status_ns.append(clock() - t0)
+            if isinstance(handle, dict):
+                t0 = clock()
+                _ensure_temp_tracking(handle)
+                ensure_ns.append(clock() - t0)
+            payload = {**payload, **result}
+        wins += bool(payload.get("win"))
+
+    row: Dict[str, float] = {
+        "games": games,
+        "winRate": round(wins / max(1, games), 4),
+        "picksPerGame": round(len(pick_ns) / max(1, games), 2),
+        "picksPerSec": round(len(pick_ns) / (sum(pick_ns) / 1e9), 1) if pick_ns else 0.0,
+        **latency_summary(pick_ns, "pick"),
+        **latency_summary(status_ns, "status"),
+    }
+    if undo_ns:
+        row.update(latency_summary(undo_ns, "undo"))
+    if ensure_ns:
+        row.update(latency_summary(ensure_ns, "ensureTemp"))
+    return row
+
+
+def measure_allocations(bot: Any, games: int, seed: int) -> float:
+    """在 domain 上用 tracemalloc 统计每次取牌（含 payload 构造）的峰值分配字节数。"""
+    target = DomainTarget()
+    samples: List[int] = []
+    tracemalloc.start()
+    try:
+        for i in range(games):
+            rng = random.Random(derive_seed(seed, 1_000_000 + i))
+            state, payload = target.start(derive_seed(seed, i))
+            bot.reset(payload, rng)
+            for _ in range(MAX_STEPS):
+                if payload["finish"]:
+                    break
+                kind, arg = bot.choose(payload, rng)
+                if kind != "pick":
+                    try:
+                        payload = {**payload, **target.move(state, kind, arg)}
+                    except ValueError:
+                        pass
+                    continue
+                tracemalloc.reset_peak()
+                before, _ = tracemalloc.get_traced_memory()
+                payload = pick_tile(state, arg)
+                _, peak = tracemalloc.get_traced_memory()
+                samples.append(peak - before)
+                payload = {**to_status_payload(state), **payload}
+    finally:
+        tracemalloc.stop()
+    return round(sum(samples) / max(1, len(samples)), 1)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Link engine throughput benchmark.")
+    parser.add_argument("--games", type=int, default=1000, help="games per bot and target")
+    parser.add_argument("--seed", type=int, default=20261019, help="base seed for deals and bots")
+    parser.add_argument("--bots", default="random,greedy,solver")
+    parser.add_argument("--targets", default="domain,memory,redis")
+    parser.add_argument("--alloc-games", type=int, default=50, help="games per bot traced for allocations (0 to skip)")
+    parser.add_argument("--save", help="write results to this JSON baseline")
+    parser.add_argument("--compare", help="compare results with this JSON baseline")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative change reported as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    results: Dict[str, Dict[str, float]] = {}
+    for bot_name in args.bots.split(","):
+        bot = BOTS[bot_name]()
+        for target_name in args.targets.split(","):
+            started = time.perf_counter()
+            results[f"{target_name}/{bot_name}"] = run_case(_make_target(target_name), bot, args.games, args.seed)
+            print(f"{target_name}/{bot_name}: {time.perf_counter() - started:.1f}s", file=sys.stderr)
+        if args.alloc_games > 0:
+            # Traced on the domain layer whichever targets ran; the row may hold only this metric.
+            results.setdefault(f"domain/{bot_name}", {})["allocBytesPerPick"] = measure_allocations(bot, args.alloc_games, args.seed)
+
+    print_table(results, ["picksPerSec", "pickp50Us", "pickp99Us", "statusp50Us", "statusp99Us", "allocBytesPerPick", "winRate"])
+
+    payload = {"meta": run_meta(benchmark="link_engine", games=args.games, seed=args.seed), "results": results}
+    if args.save:
+        save_baseline(args.save, payload)
+    if args.compare:
+        rows, regressions = compare_results(results, load_baseline(args.compare)["results"], args.threshold)
+        print("\n".join(rows))
+        if regressions and args.fail_on_regression:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
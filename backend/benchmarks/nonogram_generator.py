@@ -0,0 +1,167 @@
+# _*_ coding : utf-8 _*_
+# @Time : 2026/10/19
+# @Author : Yoln
+# @File : nonogram_generator
+# @Project : mahjong-handle-web
+"""数织生成器基准：固定题库 + 固定种子，跟踪求解与生成的耗时回归。
+
+题库文件（benchmarks/corpus/nonogram.json）记录 5/10/15/20/25 五种尺寸、三种难度下的
+种子与对应生成出的解（其他尺寸可用 --write-corpus --sizes 另行生成）；count_solutions
+与 _logical_difficulty_score 始终在这批固定题上计时，生成器改动不会改变被测输入。
+generate_puzzle 则按同一批种子端到端重跑，另统计每次成功所需的尝试次数分布，
+以及落入目标区间 / 取最接近 / 三角形兜底的比例。
+
+    python -m benchmarks.nonogram_generator --write-corpus
+    python -m benchmarks.nonogram_generator --save benchmarks/baselines/nonogram_generator.json
+    python -m benchmarks.nonogram_generator --compare benchmarks/baselines/nonogram_generator.json
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import time
+from typing import Any, Dict, List
+
+from app.modules.nonogram_battle import domain
+from app.modules.nonogram_battle.bank import pack_solution, unpack_solution
+from benchmarks.common import (
+    compare_results,
+    latency_summary,
+    load_baseline,
+    percentile,
+    print_table,
+    run_meta,
+    save_baseline,
+)
+
+DIFFICULTIES = ("easy", "normal", "hard")
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), "corpus", "nonogram.json")
+
+
+def _seed(base: int, size: int, difficulty: str, index: int) -> int:
+    return base * 100000 + size * 1000 + DIFFICULTIES.index(difficulty) * 100 + index
+
+
+def write_corpus(path: str, sizes: List[int], per_case: int, base_seed: int) -> None:
+    """按固定种子生成题库并保存（解以位图十六进制存放，线索加载时再算）。"""
+    entries = []
+    for size in sizes:
+        for difficulty in DIFFICULTIES:
+            for index in range(per_case):
+                seed = _seed(base_seed, size, difficulty, index)
+                random.seed(seed)
+                solution, _, _ = domain.generate_puzzle(size, difficulty)
+                entries.append({
+                    "size": size,
+                    "difficulty": difficulty,
+                    "seed": seed,
+                    "solution": pack_solution(solution).hex(),
+                })
+    save_baseline(path, {"meta": run_meta(corpus="nonogram", perCase=per_case, seed=base_seed), "puzzles": entries})
+    print(f"wrote {len(entries)} puzzles to {path}")
+
+
+def load_corpus(path: str) -> List[Dict[str, Any]]:
+    entries = load_baseline(path)["puzzles"]
+    for entry in entries:
+        solution = unpack_solution(bytes.fromhex(entry["solution"]), entry["size"])
+        entry["rowClues"], entry["columnClues"] = domain.solution_clues(solution)
+    return entries
+
+
+def _timed(fn, *args) -> int:
+    t0 = time.perf_counter_ns()
+    fn(*args)
+    return time.perf_counter_ns() - t0
+
+
+def bench_case(entries: List[Dict[str, Any]], repeat: int) -> Dict[str, Dict[str, Any]]:
+    count_ns: List[int] = []
+    score_ns: List[int] = []
+    generate_ns: List[int] = []
+    attempts: List[int] = []
+    outcomes = {"inRange": 0, "closest": 0, "triangle": 0}
+    for entry in entries:
+        rows, columns = entry["rowClues"], entry["columnClues"]
+        for _ in range(repeat):
+            count_ns.append(_timed(domain.count_solutions, rows, columns))
+            score_ns.append(_timed(domain._logical_difficulty_score, rows, columns))
+        stats: Dict[str, Any] = {}
+        random.seed(entry["seed"])
+        generate_ns.append(_timed(domain.generate_puzzle, entry["size"], entry["difficulty"], stats))
+        attempts.append(stats["attempts"])
+        outcomes[stats["outcome"]] += 1
+
+    def ops(samples: List[int]) -> float:
+        return round(len(samples) / (sum(samples) / 1e9), 1)
+
+    attempts.sort()
+    calls = len(entries)
+    return {
+        "count": {"calls": len(count_ns), "opsPerSec": ops(count_ns), **latency_summary(count_ns)},
+        "score": {"calls": len(score_ns), "opsPerSec": ops(score_ns), **latency_summary(score_ns)},
+        "generate": {
+            "calls": calls,
+            "opsPerSec": ops(generate_ns),
+            **latency_summary(generate_ns),
+            "attemptsMean": round(sum(attempts) / calls, 2),
+            "attemptsP50": percentile(attempts, 50),
+            "attemptsP90": percentile(attempts, 90),
+            "attemptsMax": float(attempts[-1]),
+            "inRangeRate": round(outcomes["inRange"] / calls, 3),
+            "closestRate": round(outcomes["closest"] / calls, 3),
+            "fallbackRate": round(outcomes["triangle"] / calls, 3),
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Nonogram solver/generator benchmark on a fixed seeded corpus.")
+    parser.add_argument("--corpus", default=CORPUS_PATH)
+    parser.add_argument("--write-corpus", action="store_true", help="regenerate the corpus file and exit")
+    parser.add_argument("--sizes", default="5,10,15,20,25")
+    parser.add_argument("--per-case", type=int, default=12, help="puzzles per size/difficulty when writing the corpus")
+    parser.add_argument("--seed", type=int, default=20261019)
+    parser.add_argument("--repeat", type=int, default=3, help="timing repeats of count/score per puzzle")
+    parser.add_argument("--save")
+    parser.add_argument("--compare")
+    parser.add_argument("--threshold", type=float, default=0.10)
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    if args.write_corpus:
+        write_corpus(args.corpus, sizes, args.per_case, args.seed)
+        return
+
+    corpus = load_corpus(args.corpus)
+    results: Dict[str, Dict[str, Any]] = {}
+    for size in sizes:
+        for difficulty in DIFFICULTIES:
+            entries = [e for e in corpus if e["size"] == size and e["difficulty"] == difficulty]
+            if not entries:
+                continue
+            for op, row in bench_case(entries, args.repeat).items():
+                results[f"{size}/{difficulty}/{op}"] = row
+
+    print_table(results, ["calls", "opsPerSec", "p50Us", "p99Us", "meanUs"])
+    print()
+    generate_rows = {case: row for case, row in results.items() if case.endswith("/generate")}
+    print_table(generate_rows, ["attemptsMean", "attemptsP50", "attemptsP90", "attemptsMax", "inRangeRate", "closestRate", "fallbackRate"])
+
+    payload = {
+        "meta": run_meta(benchmark="nonogram_generator", corpus=os.path.basename(args.corpus), repeat=args.repeat),
+        "results": results,
+    }
+    if args.save:
+        save_baseline(args.save, payload)
+    if args.compare:
+        rows, regressions = compare_results(results, load_baseline(args.compare)["results"], args.threshold)
+        print("\n".join(rows))
+        if regressions and args.fail_on_regression:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+# _*_ coding : utf-8 _*_
+# @Time : 2026/10/19
+# @Author : Yoln
+# @File : nonogram_list_reference
+# @Project : mahjong-handle-web
+"""031 版按 ``List[List[Optional[bool]]]`` 实现的行求解器与求解流程，冻结于此作为位掩码版本的对照。"""
+from __future__ import annotations
+
+from typing import List, Optional, Sequence, Tuple
+
+Cell = Optional[bool]
+Grid = List[List[Cell]]
+Dirty = Tuple[List[bool], List[bool]]
+
+
+def _runs(line: Sequence[Cell]) -> List[int]:
+    runs: List[int] = []
+    run = 0
+    for filled in line:
+        if filled:
+            run += 1
+        elif run:
+            runs.append(run)
+            run = 0
+    if run:
+        runs.append(run)
+    return runs
+
+
+def solve_line(raw_clues: Sequence[int], known: Sequence[Cell]) -> Optional[List[Cell]]:
+    """Return every cell of the line that is forced by its clues and known cells.
+
+    Cells that can still be either value stay ``None``; the result is ``None``
+    when no placement of the clues agrees with ``known``. Runs in
+    O(length x clues) using a prefix DP (can the first ``j`` blocks fit in the
+    first ``i`` cells?) and the mirrored suffix DP, instead of enumerating placements.
+    """
+    clues = [value for value in raw_clues if value > 0]
+    n = len(known)
+    k = len(clues)
+    if None not in known:
+        return list(known) if _runs(known) == clues else None
+
+    # empty_before[i]: known empty cells in [0, i), so a block fits [s, e) iff the counts match.
+    empty_before = [0] * (n + 1)
+    for i, value in enumerate(known):
+        empty_before[i + 1] = empty_before[i] + (value is False)
+
+    # prefix[j][i]: cells [0, i) hold exactly the first j blocks.
+    prefix = [[False] * (n + 1) for _ in range(k + 1)]
+    prefix[0][0] = True
+    for i in range(1, n + 1):
+        prefix[0][i] = prefix[0][i - 1] and known[i - 1] is not True
+    for j in range(1, k + 1):
+        length = clues[j - 1]
+        row, previous = prefix[j], prefix[j - 1]
+        for i in range(length, n + 1):
+            if row[i - 1] and known[i - 1] is not True:
+                row[i] = True
+                continue
+            start = i - length
+            if empty_before[i] != empty_before[start]:
+                continue
+            if start == 0:
+                row[i] = j == 1
+            else:
+                row[i] = known[start - 1] is not True and previous[start - 1]
+
+    if not prefix[k][n]:
+        return None
+
+    # suffix[j][i]: cells [i, n) hold exactly blocks j..k-1.
+    suffix = [[False] * (n + 2) for _ in range(k + 1)]
+    suffix[k][n] = True
+    for i in range(n - 1, -1, -1):
+        suffix[k][i] = suffix[k][i + 1] and known[i] is not True
+    for j in range(k - 1, -1, -1):
+        length = clues[j]
+        row, following = suffix[j], suffix[j + 1]
+        for i in range(n - length, -1, -1):
+            if row[i + 1] and known[i] is not True:
+                row[i] = True
+                continue
+            end = i + length
+            if empty_before[end] != empty_before[i]:
+                continue
+            if end == n:
+                row[i] = j == k - 1
+            else:
+                row[i] = known[end] is not True and following[end + 1]
+
+    can_be_empty = [False] * n
+    for j in range(k + 1):
+        before, after = prefix[j], suffix[j]
+        for i in range(n):
+            if before[i] and after[i + 1] and known[i] is not True:
+                can_be_empty[i] = True
+    # Block j may start at s when the blocks before it fit left of s - 1 and the
+    # blocks after it fit right of its end; mark its cells via a difference array.
+    cover = [0] * (n + 1)
+    for j, length in enumerate(clues):
+        for start in range(n - length + 1):
+            end = start + length
+            if empty_before[end] != empty_before[start]:
+                continue
+            if start == 0:
+                left = j == 0
+            else:
+                left = known[start - 1] is not True and prefix[j][start - 1]
+            if not left:
+                continue
+            if end == n:
+                right = j == k - 1
+            else:
+                right = known[end] is not True and suffix[j + 1][end + 1]
+            if right:
+                cover[start] += 1
+                cover[end] -= 1
+
+    result: List[Cell] = []
+    running = 0
+    for i in range(n):
+        running += cover[i]
+        can_be_filled = running > 0
+        if can_be_filled and can_be_empty[i]:
+            result.append(None)
+        elif can_be_filled:
+            result.append(True)
+        elif can_be_empty[i]:
+            result.append(False)
+        else:
+            return None
+    return result
+
+
+def blank_dirty(size: int) -> Dirty:
+    return [True] * size, [True] * size
+
+
+def propagate_round(
+    grid: Grid,
+    row_clues: List[List[int]],
+    column_clues: List[List[int]],
+    dirty: Optional[Dirty] = None,
+) -> Optional[int]:
+    """Run one pass over all rows, then all columns, writing forced cells into ``grid``.
+
+    Returns the number of newly deduced cells, or ``None`` on a contradiction.
+    ``dirty`` flags the rows/columns changed since they were last solved; clean
+    lines cannot yield anything new and are skipped. It is updated in place.
+    """
+    size = len(grid)
+    dirty_rows, dirty_columns = dirty if dirty is not None else blank_dirty(size)
+    deduced = 0
+    for row in range(size):
+        if not dirty_rows[row]:
+            continue
+        dirty_rows[row] = False
+        line = grid[row]
+        solved = solve_line(row_clues[row], line)
+        if solved is None:
+            return None
+        for column in range(size):
+            if line[column] is None and solved[column] is not None:
+                line[column] = solved[column]
+                dirty_columns[column] = True
+                deduced += 1
+    for column in range(size):
+        if not dirty_columns[column]:
+            continue
+        dirty_columns[column] = False
+        known = [grid[row][column] for row in range(size)]
+        solved = solve_line(column_clues[column], known)
+        if solved is None:
+            return None
+        for row in range(size):
+            if known[row] is None and solved[row] is not None:
+                grid[row][column] = solved[row]
+                dirty_rows[row] = True
+                deduced += 1
+    return deduced
+
+
+def propagate(
+    grid: Grid,
+    row_clues: List[List[int]],
+    column_clues: List[List[int]],
+    dirty: Optional[Dirty] = None,
+) -> bool:
+    """Repeat line passes until nothing changes; ``False`` means the grid is contradictory."""
+    if dirty is None:
+        dirty = blank_dirty(len(grid))
+    while True:
+        deduced = propagate_round(grid, row_clues, column_clues, dirty)
+        if deduced is None:
+            return False
+        if not deduced:
+            return True
+
+
+def count_solutions(row_clues: List[List[int]], column_clues: List[List[int]], limit: int = 2) -> int:
+    size = len(row_clues)
+
+    def search(grid: List[List[Optional[bool]]], dirty: Optional[Dirty] = None) -> int:
+        if not propagate(grid, row_clues, column_clues, dirty):
+            return 0
+        target = next(((row, column) for row in range(size) for column in range(size) if grid[row][column] is None), None)
+        if target is None:
+            return 1
+        row, column = target
+        total = 0
+        for value in (False, True):
+            next_grid = [line[:] for line in grid]
+            next_grid[row][column] = value
+            next_dirty = ([False] * size, [False] * size)
+            next_dirty[0][row] = next_dirty[1][column] = True
+            total += search(next_grid, next_dirty)
+            if total >= limit:
+                return total
+        return total
+
+    return search([[None] * size for _ in range(size)])
+
+
+def _logical_difficulty_score(row_clues: List[List[int]], column_clues: List[List[int]]) -> Optional[int]:
+    size = len(row_clues)
+    grid: List[List[Optional[bool]]] = [[None] * size for _ in range(size)]
+    dirty = blank_dirty(size)
+    rounds = 0
+    initial_forced = 0
+
+    while True:
+        deduced = propagate_round(grid, row_clues, column_clues, dirty)
+        if deduced is None:
+            return None
+        if not deduced:
+            break
+        rounds += 1
+        if rounds == 1:
+            initial_forced = deduced
+
+    if any(cell is None for line in grid for cell in line):
+        return None
+    all_clues = row_clues + column_clues
+    values = [value for clues in all_clues for value in clues if value > 0]
+    short_ratio = sum(value <= 2 for value in values) / max(1, len(values))
+    multi_ratio = sum(len([value for value in clues if value > 0]) >= 3 for clues in all_clues) / max(1, len(all_clues))
+    initial_ratio = initial_forced / max(1, size * size)
+    return round((1 - initial_ratio) * 45 + min(rounds, 6) / 6 * 20 + short_ratio * 20 + multi_ratio * 15)
@@ -0,0 +1,129 @@
+# _*_ coding : utf-8 _*_
+# @Time : 2026/10/19
+# @Author : Yoln
+# @File : nonogram_solver
+# @Project : mahjong-handle-web
+"""数织求解器基准：位掩码实现对比冻结的列表实现。
+
+对 5~25 各尺寸生成固定种子的题目，分别计时 solve_line（逐行）、count_solutions 与
+_logical_difficulty_score，并校验两种实现结果一致。
+
+    python -m benchmarks.nonogram_solver --puzzles 20 --save benchmarks/baselines/nonogram_solver.json
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from app.modules.nonogram_battle import domain
+from app.modules.nonogram_battle.solver import solve_line
+from benchmarks import nonogram_list_reference as reference
+from benchmarks.common import compare_results, latency_summary, load_baseline, print_table, run_meta, save_baseline
+
+Puzzle = Tuple[List[List[int]], List[List[int]]]
+
+IMPLEMENTATIONS: Dict[str, Dict[str, Callable[..., Any]]] = {
+    "mask": {
+        "line": solve_line,
+        "count": domain.count_solutions,
+        "score": domain._logical_difficulty_score,
+    },
+    "list": {
+        "line": reference.solve_line,
+        "count": reference.count_solutions,
+        "score": reference._logical_difficulty_score,
+    },
+}
+
+
+def build_corpus(size: int, count: int, seed: int) -> List[Puzzle]:
+    """固定种子生成题目；一半取生成器产出，一半取随机填充（含多解与逻辑不可解的题）。"""
+    state = random.getstate()
+    random.seed(seed * 100 + size)
+    try:
+        corpus: List[Puzzle] = []
+        for i in range(count):
+            if i % 2 == 0:
+                _, rows, columns = domain.generate_puzzle(size, ("easy", "normal", "hard")[i // 2 % 3])
+            else:
+                solution = [[random.random() < 0.65 for _ in range(size)] for _ in range(size)]
+                rows, columns = domain.solution_clues(solution)
+            corpus.append((rows, columns))
+        return corpus
+    finally:
+        random.setstate(state)
+
+
+def partial_lines(corpus: List[Puzzle], seed: int) -> List[Tuple[List[int], List[Any]]]:
+    rng = random.Random(seed)
+    lines = []
+    for rows, _ in corpus:
+        size = len(rows)
+        for clues in rows:
+            lines.append((clues, [None] * size))
+            known = [None] * size
+            solved = reference.solve_line(clues, known) or known
+            lines.append((clues, [value if rng.random() < 0.3 else None for value in solved]))
+    return lines
+
+
+def time_calls(fn: Callable[..., Any], calls: List[Tuple[Any, ...]]) -> Tuple[List[Any], List[int]]:
+    results: List[Any] = []
+    samples: List[int] = []
+    clock = time.perf_counter_ns
+    for args in calls:
+        t0 = clock()
+        results.append(fn(*args))
+        samples.append(clock() - t0)
+    return results, samples
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Nonogram solver benchmark (bitmask vs list).")
+    parser.add_argument("--sizes", default="5,10,15,20,25")
+    parser.add_argument("--puzzles", type=int, default=20, help="puzzles per size")
+    parser.add_argument("--seed", type=int, default=20261019)
+    parser.add_argument("--save")
+    parser.add_argument("--compare")
+    parser.add_argument("--threshold", type=float, default=0.10)
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    results: Dict[str, Dict[str, float]] = {}
+    for size in (int(s) for s in args.sizes.split(",")):
+        corpus = build_corpus(size, args.puzzles, args.seed)
+        workloads = {
+            "line": partial_lines(corpus, args.seed),
+            "count": [(rows, columns) for rows, columns in corpus],
+            "score": [(rows, columns) for rows, columns in corpus],
+        }
+        for op, calls in workloads.items():
+            outputs = {}
+            for impl, table in IMPLEMENTATIONS.items():
+                outputs[impl], samples = time_calls(table[op], calls)
+                results[f"{size}/{op}/{impl}"] = {
+                    "calls": len(calls),
+                    "opsPerSec": round(len(samples) / (sum(samples) / 1e9), 1),
+                    **latency_summary(samples),
+                }
+            if outputs["mask"] != outputs["list"]:
+                raise SystemExit(f"size {size} {op}: implementations disagree")
+            results[f"{size}/{op}/mask"]["speedup"] = round(
+                results[f"{size}/{op}/list"]["meanUs"] / max(0.01, results[f"{size}/{op}/mask"]["meanUs"]), 2
+            )
+
+    print_table(results, ["calls", "opsPerSec", "p50Us", "p99Us", "meanUs", "speedup"])
+    payload = {"meta": run_meta(benchmark="nonogram_solver", puzzles=args.puzzles, seed=args.seed), "results": results}
+    if args.save:
+        save_baseline(args.save, payload)
+    if args.compare:
+        rows, regressions = compare_results(results, load_baseline(args.compare)["results"], args.threshold)
+        print("\n".join(rows))
+        if regressions and args.fail_on_regression:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+import json
+import os
+import threading
+import time
+import uuid
+
+import pytest
+from starlette.requests import Request
+from starlette.responses import Response
+
+import app.main  # noqa: F401  (resolves the app.api <-> module api import cycle)
+from app.modules.battle import api as battle_api
+from app.modules.battle import catalog, questions
+from app.modules.battle.catalog import hand_for, hint_for
+from app.modules.battle.domain import (
+    _refresh_match_status,
+    create_battle,
+    enter_battle,
+    join_battle,
+    scoreboard_view,
+    submit_events,
+    submit_guess,
+    to_status_payload,
+    to_sync_event,
+)
+from app.modules.battle.questions import MemoryQuestionSetStore, RedisQuestionSetStore, load_question_set, resolve_question_set
+from app.modules.battle.repo import InMemoryBattleRepo, RedisBattleRepo
+from app.modules.battle.schemas import SubmitBattleReq
+from app.modules.handle.domain import GameState, HandResultData, evaluate_guess, expand_compact_hand_tiles
+from app.modules.handle.repo import game_to_dict
+from app.modules.push.snapshots import SnapshotCache
+from app.modules.rating.store import MemoryRatingStore
+
+_HANDS = ["123m123p123s111z55z", "123m456p789s111z55z", "111m234p567s222z66z"]
+
+
+def _fixed_hand(hand_index=None, rule_mode="normal"):
+    raw = _HANDS[hand_index % len(_HANDS)]
+    tiles = expand_compact_hand_tiles(raw)
+    return HandResultData(
+        tiles_ascii_13=tiles[:13], win_tile=tiles[13], tsumo=False, round_wind=1, seat_wind=2, wind_raw="12",
+        raw_14=raw, hand_index=hand_index, han=1, fu=30, cost=1000, yaku_jp=["立直"], han_tip="1番30符", tip="提示: 立直",
+    )
+
+
+@pytest.fixture(autouse=True)
+def fixed_catalog(monkeypatch):
+    monkeypatch.setattr(catalog, "get_hand", _fixed_hand)
+    monkeypatch.setattr(catalog, "hands_count", lambda: len(_HANDS))
+    monkeypatch.setattr("app.modules.battle.domain.hands_count", lambda: len(_HANDS))
+    catalog.hand_for.cache_clear()
+    catalog._hint_items.cache_clear()
+    yield
+    catalog.hand_for.cache_clear()
+    catalog._hint_items.cache_clear()
+
+
+def _answer(state, question):
+    hand = hand_for(state["questionHandIndices"][question], state["mode"])
+    return "".join(hand.tiles_ascii_13 + [hand.win_tile])
+
+
+def test_battle_state_keeps_indices_and_guesses_only():
+    state = create_battle(creator_user_id="p1", mode="normal", question_count=2)
+    join_battle(state, "p2")
+    enter_battle(state, "p1")
+    first = to_status_payload(state, "p1")["my"]
+    assert first["currentHint"] == hint_for(state["questionHandIndices"][0], "normal")
+
+    result = submit_guess(state, "p1", _answer(state, 0))
+    assert result["questionFinished"] is True and result["totalScore"] > 0
+    assert result["guess"]["hint"] == hint_for(state["questionHandIndices"][1], "normal")
+    progress = state["players"]["p1"]
+    assert progress["currentQuestion"] == 1 and progress["guesses"] == []
+
+    submit_guess(state, "p1", _answer(state, 1))
+    submit_guess(state, "p2", _answer(state, 0))
+    assert [e["type"] for e in submit_events(state, "p2", submit_guess(state, "p2", "123m123p123s111z66z"))] == ["progress"]
+    last = submit_events(state, "p2", submit_guess(state, "p2", _answer(state, 1)))
+    assert state["status"] == "finished"
+    assert [e["type"] for e in last] == ["questionFinished", "finished"]
+    assert to_sync_event(state)["players"][1] == {"userId": "p2", "currentQuestion": 2, "totalScore": last[0]["totalScore"], "finished": True}
+    assert to_status_payload(state, "p2")["my"]["currentHint"] is None
+
+    document = json.dumps(state, ensure_ascii=False)
+    assert "currentGame" not in document and "tiles_ascii_13" not in document
+
+
+def test_legacy_progress_with_embedded_game_is_compacted():
+    state = create_battle(creator_user_id="p1", mode="normal", question_count=1)
+    join_battle(state, "p2")
+    hand = hand_for(state["questionHandIndices"][0], "normal")
+    game = GameState(game_id="g", created_at=time.time() - 5, max_guess=6, rule_mode="normal", hand=hand, users={})
+    ok, err = evaluate_guess(game=game, user_id="p1", guess_str="123m123p123s111z66z")
+    assert err is None
+    legacy = state["players"]["p1"]
+    legacy.pop("guesses")
+    legacy.pop("questionStartedAt")
+    legacy["currentGame"] = game_to_dict(game)
+    legacy["currentHint"] = {"yakuTip": "", "hanTip": "", "windTip": "", "isTsumo": ""}
+
+    payload = to_status_payload(state, "p1")["my"]
+    assert payload["currentGameCreatedAt"] == game.created_at
+    assert payload["currentHint"] == hint_for(state["questionHandIndices"][0], "normal")
+    assert legacy["guesses"] == ["".join(ok.guess_tiles_14)]
+    assert "currentGame" not in legacy
+
+
+def test_questions_are_resolved_once_at_creation(monkeypatch):
+    monkeypatch.setattr(questions, "_store", MemoryQuestionSetStore())
+    monkeypatch.setattr(questions, "_cache", questions.OrderedDict())
+    calls = []
+    monkeypatch.setattr(catalog, "get_hand", lambda **kw: calls.append(kw) or _fixed_hand(**kw))
+
+    state = create_battle(creator_user_id="p1", mode="guobiao", question_count=2)
+    assert len(calls) == 2
+    shared = resolve_question_set("guobiao", state["questionHandIndices"])
+    assert shared.set_id == state["questionSetId"]
+
+    # Nothing is evaluated again while the match is played.
+    catalog.hand_for.cache_clear()
+    catalog._hint_items.cache_clear()
+    calls.clear()
+    join_battle(state, "p2")
+    enter_battle(state, "p1")
+    answers = [shared.questions[i].hand for i in range(2)]
+    result = submit_guess(state, "p1", "".join(answers[0].tiles_ascii_13 + [answers[0].win_tile]))
+    assert result["guess"]["hint"] == shared.questions[1].hint_dict()
+    assert to_status_payload(state, "p2")["my"]["currentHint"] == shared.questions[0].hint_dict()
+    assert calls == []
+
+    # A set that expired from the store is rebuilt from the match's hand indices.
+    questions._store.store.clear()
+    questions._cache.clear()
+    assert load_question_set(state["questionSetId"], "guobiao", state["questionHandIndices"]) == shared
+
+
+def test_question_set_worker_pool_matches_inline(monkeypatch):
+    monkeypatch.setattr(questions, "_store", MemoryQuestionSetStore())
+    inline = resolve_question_set("normal", [2, 0, 1])
+    monkeypatch.setattr(questions, "_WORKERS", 2)
+    try:
+        pooled = resolve_question_set("normal", [2, 0, 1])
+    finally:
+        questions.shutdown()
+    assert pooled == inline and pooled.hand_indices == [2, 0, 1]
+
+
+@pytest.mark.skipif(not os.getenv("REDIS_URL"), reason="REDIS_URL not set; skip redis integration test")
+def test_redis_question_set_store_roundtrip():
+    store = RedisQuestionSetStore(os.environ["REDIS_URL"], ttl=60, key_prefix=f"mh:test:battle-questions:{uuid.uuid4().hex}")
+    question_set = resolve_question_set("riichi", [1, 2])
+    store.put(question_set)
+    assert store.get(question_set.set_id) == question_set
+    store.redis.delete(store.key(question_set.set_id))
+
+
+def _interleaved_submissions(repo):
+    state = create_battle(creator_user_id="p1", mode="normal", question_count=1)
+    match_id = state["matchId"]
+    repo.create(state)
+    repo.update(match_id, lambda s: join_battle(s, "p2"))
+    p2_read, p1_written = threading.Event(), threading.Event()
+
+    def p2_submits(s):
+        # p2 has read the match; p1's submission lands before p2 writes back.
+        p2_read.set()
+        assert p1_written.wait(5)
+        return submit_guess(s, "p2", _answer(s, 0))
+
+    worker = threading.Thread(target=repo.update_player, args=(match_id, "p2", p2_submits))
+    worker.start()
+    assert p2_read.wait(5)
+    repo.update_player(match_id, "p1", lambda s: submit_guess(s, "p1", _answer(s, 0)))
+    p1_written.set()
+    worker.join(5)
+    assert not worker.is_alive()
+
+    stored = repo.get(match_id)
+    assert stored["players"]["p1"]["finished"] and stored["players"]["p2"]["finished"]
+    assert stored["players"]["p1"]["questionScores"] and stored["players"]["p2"]["questionScores"]
+    assert stored["status"] == "finished"
+    assert stored["version"] == 3
+    return stored
+
+
+def test_player_updates_do_not_overwrite_each_other_in_memory():
+    _interleaved_submissions(InMemoryBattleRepo(ttl_seconds=60))
+
+
+@pytest.mark.skipif(not os.getenv("REDIS_URL"), reason="REDIS_URL not set; skip redis integration test")
+def test_player_updates_do_not_overwrite_each_other_in_redis():
+    repo = RedisBattleRepo(os.environ["REDIS_URL"], ttl_seconds=60, key_prefix=f"mh:test:battle:{uuid.uuid4().hex}")
+    stored = _interleaved_submissions(repo)
+    assert to_status_payload(stored, "p1")["opponent"]["finished"] is True
+    repo.delete(stored["matchId"])
+
+
+@pytest.mark.skipif(not os.getenv("REDIS_URL"), reason="REDIS_URL not set; skip redis integration test")
+@pytest.mark.parametrize("scores", [(3, 3), (5, 2), (1, 4), (2, None), (4, 1, 4), (2, 6, 1), (3, 3, None)])
+def test_redis_status_script_matches_domain_rule(scores):
+    repo = RedisBattleRepo(os.environ["REDIS_URL"], ttl_seconds=60, key_prefix=f"mh:test:battle:{uuid.uuid4().hex}")
+    user_ids = [f"p{i + 1}" for i in range(len(scores))]
+    state = create_battle(creator_user_id="p1", mode="normal", question_count=1, max_players=len(scores))
+    for user_id in user_ids[1:]:
+        join_battle(state, user_id)
+    repo.create(state)
+    for user_id, score in zip(user_ids, scores):
+        if score is not None:
+            progress = state["players"][user_id]
+            progress.update(finished=True, totalScore=score, currentQuestion=1)
+            repo.update_player(state["matchId"], user_id, lambda s, p=dict(progress), u=user_id: s["players"][u].update(p))
+    _refresh_match_status(state)
+    stored = repo.get(state["matchId"])
+    assert (stored["status"], stored["winnerUserId"], stored["isDraw"]) == (state["status"], state["winnerUserId"], state["isDraw"])
+    repo.delete(state["matchId"])
+
+
+def test_finishing_a_match_rates_it_once(monkeypatch):
+    repo, ratings = InMemoryBattleRepo(ttl_seconds=60), MemoryRatingStore()
+    monkeypatch.setattr(battle_api, "battle_repo", repo)
+    monkeypatch.setattr(battle_api, "rating_store", ratings)
+    state = create_battle(creator_user_id="p1", mode="normal", question_count=1)
+    join_battle(state, "p2")
+    repo.create(state)
+
+    assert battle_api.submit(state["matchId"], SubmitBattleReq(userId="p1", guess=_answer(state, 0))).ok
+    assert ratings.top(10) == []
+    battle_api.submit(state["matchId"], SubmitBattleReq(userId="p2", guess="123m123p123s111z66z"))
+    assert battle_api.submit(state["matchId"], SubmitBattleReq(userId="p2", guess=_answer(state, 0))).ok
+    assert [p["userId"] for p in ratings.top(10)] == ["p1", "p2"]
+    battle_api._rate(state["matchId"])
+    assert ratings.player("p1")["games"] == 1 and len(list(ratings.archive())) == 1
+
+
+def test_spectators_share_one_snapshot_per_version(monkeypatch):
+    repo, snapshots = InMemoryBattleRepo(ttl_seconds=60), SnapshotCache(fresh_seconds=0)
+    monkeypatch.setattr(battle_api, "battle_repo", repo)
+    monkeypatch.setattr(battle_api, "match_snapshots", snapshots)
+    state = create_battle(creator_user_id="p1", mode="normal", question_count=1)
+    join_battle(state, "p2")
+    repo.create(state)
+    reads = []
+    view = repo.view
+    monkeypatch.setattr(repo, "view", lambda *args: reads.append(args) or view(*args))
+
+    request = Request({"type": "http", "method": "GET", "path": "/", "headers": [], "query_string": b""})
+    first = battle_api.spectate(state["matchId"], request, Response())
+    for _ in range(20):
+        battle_api.spectate(state["matchId"], request, Response())
+    assert len(reads) == 1
+    assert [p["userId"] for p in first.data["leaderboard"]] == ["p2", "p1"]
+    assert "currentHint" not in str(first.data)
+
+    response = Response()
+    repo.update_player(state["matchId"], "p1", lambda s: submit_guess(s, "p1", _answer(s, 0)))
+    payload = battle_api.spectate(state["matchId"], request, response).data
+    assert len(reads) == 2 and payload["leaderboard"][0]["userId"] == "p1"
+    tagged = Request({"type": "http", "method": "GET", "path": "/", "headers": [(b"if-none-match", response.headers["etag"].encode())], "query_string": b""})
+    assert battle_api.spectate(state["matchId"], tagged, Response()).status_code == 304
+
+
+def _rooms():
+    yield InMemoryBattleRepo(ttl_seconds=60)
+    if os.getenv("REDIS_URL"):
+        yield RedisBattleRepo(os.environ["REDIS_URL"], ttl_seconds=60, key_prefix=f"mh:test:battle:{uuid.uuid4().hex}")
+
+
+@pytest.mark.parametrize("repo", list(_rooms()))
+def test_large_room_status_reads_only_top_and_neighbours(repo):
+    state = create_battle(creator_user_id="u00", mode="normal", question_count=1, max_players=30)
+    match_id = state["matchId"]
+    repo.create(state)
+    user_ids = [f"u{i:02d}" for i in range(30)]
+    for user_id in user_ids[1:]:
+        repo.update(match_id, lambda s, u=user_id: join_battle(s, u))
+    with pytest.raises(ValueError, match="MATCH_FULL"):
+        repo.update(match_id, lambda s: join_battle(s, "late"))
+
+    # Everyone finishes with score = their index, so u29 leads and u15 is 15th.
+    for i, user_id in enumerate(user_ids):
+        repo.update_player(match_id, user_id, lambda s, u=user_id, i=i: s["players"][u].update(finished=True, totalScore=i, currentQuestion=1))
+    view = repo.view(match_id, "u15", top_k=3, radius=1)
+    assert set(view["players"]) == {"u29", "u28", "u27", "u16", "u15", "u14"}
+    payload = to_status_payload(view, "u15")
+    assert payload["playerCount"] == 30 and payload["my"]["rank"] == 15
+    assert [e["userId"] for e in payload["leaderboard"]["top"]] == ["u29", "u28", "u27"]
+    assert [(e["rank"], e["userId"]) for e in payload["leaderboard"]["around"]] == [(14, "u16"), (15, "u15"), (16, "u14")]
+    assert payload["opponent"]["userId"] == "u29"
+    assert (view["status"], view["winnerUserId"]) == ("finished", "u29")
+
+    # The incrementally kept scoreboard agrees with ranking the full state.
+    assert view["scoreboard"] == scoreboard_view(repo.get(match_id), "u15", top_k=3, radius=1)
+    with pytest.raises(ValueError, match="MATCH_FINISHED"):
+        join_battle(repo.get(match_id) | {"maxPlayers": 100}, "late")
@@ -0,0 +1,135 @@
+import os
+import time
+
+import pytest
+from starlette.requests import Request
+from starlette.responses import Response
+
+import app.main  # noqa: F401  (resolves the app.api <-> module api import cycle)
+from app.api.conditional import etag, not_modified
+from app.api.settled import SettledCache
+from app.modules.handle.domain import UserProgress
+from app.modules.handle.repo import InMemoryGameRepo, RedisGameRepo, game_from_dict
+from app.modules.handle.schemas import ApiResponse
+from app.modules.link import api as link_api
+from app.modules.link.domain import create_game
+from app.modules.link.repo import InMemoryLinkRepo, RedisLinkRepo
+from app.modules.link.schemas import ResetReq
+
+REDIS_URL = os.getenv("REDIS_URL")
+
+
+def _request(if_none_match=None):
+    headers = [(b"if-none-match", if_none_match.encode())] if if_none_match else []
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers, "query_string": b""})
+
+
+def test_not_modified_matches_weak_and_strong_forms_for_the_same_scope():
+    tag = etag(3, "u1")
+    assert not_modified(_request(tag), 3, "u1").status_code == 304
+    assert not_modified(_request(tag[2:]), 3, "u1") is not None
+    assert not_modified(_request(f'W/"x", {tag}'), 3, "u1") is not None
+    assert not_modified(_request(tag), 4, "u1") is None
+    assert not_modified(_request(tag), 3, "u2") is None
+    assert not_modified(_request(tag), None, "u1") is None
+    assert not_modified(_request(), 3, "u1") is None
+
+
+def _repos():
+    yield InMemoryGameRepo(), InMemoryLinkRepo()
+    if REDIS_URL:
+        yield (
+            RedisGameRepo(redis_url=REDIS_URL, ttl_seconds=120, prefix="mh:test:v1:handle:"),
+            RedisLinkRepo(redis_url=REDIS_URL, ttl_seconds=120, prefix="mh:test:v1:link:"),
+        )
+
+
+@pytest.mark.parametrize("handle_repo, link_repo", list(_repos()))
+def test_every_write_bumps_the_stored_version(handle_repo, link_repo):
+    # Built directly: drawing a hand needs the pinned mahjong version.
+    g = game_from_dict({"game_id": os.urandom(8).hex(), "hand": {}})
+    handle_repo.save(g)
+    before = handle_repo.version(g.game_id)
+    assert before == 1
+    handle_repo.update(g.game_id, lambda game: game.users.setdefault("u1", UserProgress()))
+    assert handle_repo.version(g.game_id) == before + 1 == handle_repo.get(g.game_id).version
+
+    state = link_repo.create(create_game(deal_seed=7))
+    assert link_repo.version(state["gameId"]) == 0
+    link_repo.update(state["gameId"], lambda st: st.update(undoBudget=1))
+    assert link_repo.version(state["gameId"]) == 1 == link_repo.get(state["gameId"])["version"]
+
+    link_repo.delete(state["gameId"])
+    assert link_repo.version(state["gameId"]) is None
+
+
+def test_link_status_answers_304_until_the_game_changes(monkeypatch):
+    repo = InMemoryLinkRepo()
+    monkeypatch.setattr(link_api, "link_repo", repo)
+    state = repo.create(create_game(deal_seed=7))
+    game_id = state["gameId"]
+
+    response = Response()
+    body = link_api.status(game_id, "u1", _request(), response)
+    assert body.ok
+    tag = response.headers["etag"]
+
+    assert link_api.status(game_id, "u1", _request(tag), Response()).status_code == 304
+
+    repo.update(game_id, lambda st: st.update(undoBudget=1))
+    assert link_api.status(game_id, "u1", _request(tag), Response()).ok
+
+
+def test_settled_cache_serves_stored_bodies_until_the_ttl(monkeypatch):
+    cache = SettledCache(ttl=60)
+    first = cache.store(_request(), "k", ApiResponse(ok=True, data={"answerStr": "牌"}, error=None))
+    assert cache.respond(_request(), "other") is None
+    hit = cache.respond(_request(), "k", private=True)
+    assert hit.body == first.body and b"\xe7\x89\x8c" in hit.body
+    assert hit.headers["cache-control"].startswith("private, max-age=") and hit.headers["etag"] == first.headers["etag"]
+    assert cache.respond(_request(first.headers["etag"]), "k").status_code == 304
+
+    now = time.time()
+    monkeypatch.setattr("app.api.settled.time.time", lambda: now + 61)
+    assert cache.respond(_request(), "k") is None
+
+
+@pytest.mark.skipif(not REDIS_URL, reason="REDIS_URL not set; skip redis integration test")
+def test_settled_cache_is_shared_through_redis():
+    prefix = f"mh:test:settled:{os.urandom(4).hex()}"
+    writer, reader = SettledCache(ttl=60, redis_url=REDIS_URL, key_prefix=prefix), SettledCache(ttl=60, redis_url=REDIS_URL, key_prefix=prefix)
+    stored = writer.store(_request(), "k", ApiResponse(ok=True, data={"x": 1}, error=None), tag='W/"7-0"')
+    hit = reader.respond(_request(), "k")
+    assert hit.body == stored.body and hit.headers["etag"] == 'W/"7-0"'
+    writer.delete("k")
+    assert SettledCache(ttl=60, redis_url=REDIS_URL, key_prefix=prefix).respond(_request(), "k") is None
+
+
+def test_finished_link_status_is_served_without_reading_the_game(monkeypatch):
+    repo = InMemoryLinkRepo()
+    monkeypatch.setattr(link_api, "link_repo", repo)
+    monkeypatch.setattr(link_api, "settled_cache", SettledCache(ttl=60))
+    state = repo.create(create_game(deal_seed=7))
+    game_id = state["gameId"]
+    assert link_api.status(game_id, "u1", _request(), Response()).ok
+
+    repo.update(game_id, lambda st: st.update(finish=True))
+    settled = link_api.status(game_id, "u1", _request(), Response())
+    assert settled.headers["etag"] == etag(1) and "max-age" in settled.headers["cache-control"]
+    monkeypatch.setattr(repo, "get", lambda *_: pytest.fail("finished status must not read the repo"))
+    monkeypatch.setattr(repo, "version", lambda *_: pytest.fail("finished status must not read the repo"))
+    assert link_api.status(game_id, "u1", _request(), Response()).body == settled.body
+    assert link_api.status(game_id, "u1", _request(etag(1)), Response()).status_code == 304
+
+
+def test_reset_drops_the_settled_link_status(monkeypatch):
+    repo = InMemoryLinkRepo()
+    monkeypatch.setattr(link_api, "link_repo", repo)
+    monkeypatch.setattr(link_api, "settled_cache", SettledCache(ttl=60))
+    game_id = repo.create(create_game(deal_seed=7))["gameId"]
+    repo.update(game_id, lambda st: st.update(finish=True))
+    assert link_api.status(game_id, "u1", _request(), Response()).status_code == 200
+
+    assert link_api.reset(game_id, ResetReq(userId="u1")).ok
+    gone = link_api.status(game_id, "u1", _request(), Response())
+    assert not gone.ok and gone.error.code == "GAME_NOT_FOUND"
@@ -0,0 +1,180 @@
+import copy
+import time
+
+import pytest
+
+from app.modules.link.domain import (
+    MoveRejected,
+    apply_moves,
+    create_game,
+    encode_move_log,
+    pick_tile,
+    replay_move_log,
+    to_status_payload,
+    undo_tile,
+)
+from app.modules.link.deals import SeededDealSource, deal_columns, load_hands, seed_line
+from app.modules.link.utils.generator import generate_hands, hand_line_at, line_to_columns
+from app.modules.link.utils.solver import solve_columns
+from app.modules.link.utils.validate_hands import validate_file, validate_line
+
+
+def test_generated_hands_are_deterministic_regardless_of_workers():
+    single = generate_hands(30, seed=42, workers=1, chunk_size=7)
+    pooled = generate_hands(30, seed=42, workers=2, chunk_size=4)
+    assert single == pooled
+    assert single[5] == hand_line_at(42, 5)
+    assert all(validate_line(line, i) == [] for i, line in enumerate(single))
+
+
+def test_unsatisfiable_difficulty_filter_stops_at_attempt_cap():
+    with pytest.raises(RuntimeError, match="within 40 attempts"):
+        generate_hands(1, seed=1, difficulty="easy", temp_limit=1, chunk_size=16, max_attempts=40)
+
+
+def test_validate_line_reports_counts_and_invalid_tokens():
+    line = hand_line_at(1, 0)
+    broken = "8z" + line[2:]
+    errors = validate_line(broken, 3)
+    assert any("invalid tile token 8z" in e for e in errors)
+    assert any(e.startswith("line 3: tile") and "count 3 != 4" in e for e in errors)
+
+
+def test_validate_file_streams_in_chunks(tmp_path):
+    path = tmp_path / "hands.txt"
+    lines = generate_hands(12, seed=5)
+    lines[4] = lines[4][:-2] + "9z"
+    path.write_text("\n".join(lines), encoding="utf-8")
+    total, bad, errors = validate_file(str(path), chunk_size=5)
+    assert (total, bad) == (12, 1)
+    assert all(e.startswith("line 5:") for e in errors)
+
+
+def test_solver_moves_clear_the_board():
+    columns = line_to_columns(load_hands()[0])
+    result = solve_columns(columns, temp_limit=7)
+    assert result.solvable is True
+    assert len(result.moves) == 136
+    assert result.difficulty in ("easy", "normal", "hard")
+
+
+def _solution_log(state):
+    result = solve_columns(to_status_payload(state)["columns"], temp_limit=state["tempLimit"])
+    return encode_move_log([("pick", column) for column in result.moves])
+
+
+def test_replay_move_log_settles_a_won_game():
+    state = create_game(hand_index=0)
+    result = replay_move_log(state, _solution_log(state))
+    assert result["applied"] == 136
+    assert result["finish"] is True and result["win"] is True
+    assert to_status_payload(state)["remainTiles"] == 0
+
+
+def test_replay_matches_per_pick_play_including_undo():
+    online = create_game(hand_index=3, undo_unlimited=True)
+    offline = copy.deepcopy(online)
+    moves = [("pick", 0), ("pick", 1), ("undo", 0), ("pick", 2)]
+    for kind, arg in moves:
+        (pick_tile if kind == "pick" else undo_tile)(online, arg)
+    replay_move_log(offline, encode_move_log(moves))
+    assert to_status_payload(offline) == to_status_payload(online)
+
+
+def test_replay_rejects_invalid_move_without_touching_state():
+    state = create_game(hand_index=0)
+    before = to_status_payload(state)
+    with pytest.raises(MoveRejected) as exc:
+        replay_move_log(state, "abT")
+    assert exc.value.code == "SLOT_INDEX_OUT_OF_RANGE"
+    assert exc.value.index == 2
+    assert to_status_payload(state) == before
+
+
+def test_apply_moves_stops_at_first_failure_and_keeps_earlier_moves():
+    state = create_game(hand_index=0)
+    result = apply_moves(state, [("pick", 0), ("pick", 1), ("undo", 19), ("pick", 2)])
+    assert result["applied"] == 2
+    assert result["stoppedAt"] == 2
+    assert result["stopReason"] == "SLOT_INDEX_OUT_OF_RANGE"
+    assert state["pickSeq"] == 2
+    assert [step["picked"]["column"] for step in result["steps"]] == [0, 1]
+
+
+def test_apply_moves_legacy_undo_source_keeps_the_tile():
+    state = create_game(hand_index=0)
+    apply_moves(state, [("pick", 0)])
+    state["tempSlotOrigins"][0] = -1
+    result = apply_moves(state, [("pick", 1), ("undo", 0)])
+    assert (result["applied"], result["stopReason"]) == (1, "UNDO_SOURCE_UNKNOWN")
+    assert state["tempSlots"] == ["3z", "4z"] and state["tempSlotOrigins"] == [-1, 1]
+    assert state["undoBudget"] == 1
+
+
+def test_apply_moves_reports_game_end_mid_batch():
+    state = create_game(hand_index=0)
+    moves = [("pick", column) for column in solve_columns(to_status_payload(state)["columns"]).moves]
+    result = apply_moves(state, moves + [("pick", 0)])
+    assert result["win"] is True
+    assert (result["applied"], result["stoppedAt"], result["stopReason"]) == (136, 136, "GAME_FINISHED")
+
+
+def test_seeded_deal_stores_only_seed_and_heights():
+    state = create_game(deal_seed=12345)
+    assert "columns" not in state
+    assert state["deal"] == {"source": "seed", "seed": 12345}
+    payload = to_status_payload(state)
+    assert payload["dealSeed"] == "12345"
+    assert payload["columns"] == line_to_columns(seed_line(12345))
+    pick_tile(state, 4)
+    assert state["columnCounts"][4] == 7
+    assert to_status_payload(state)["columns"][4] == line_to_columns(seed_line(12345))[4][:7]
+
+
+def test_undo_out_of_column_order_keeps_board_consistent():
+    seeded = create_game(deal_seed=99, undo_unlimited=True)
+    legacy = copy.deepcopy(seeded)
+    legacy["columns"] = to_status_payload(legacy)["columns"]
+    del legacy["columnCounts"]
+    for state in (seeded, legacy):
+        apply_moves(state, [("pick", 0), ("pick", 0)])
+    assert len(seeded["tempSlots"]) == 2
+    for state in (seeded, legacy):
+        undo_tile(state, 0)
+    assert "columns" in seeded
+    assert to_status_payload(seeded)["columns"] == to_status_payload(legacy)["columns"]
+    assert to_status_payload(seeded)["tempSlots"] == to_status_payload(legacy)["tempSlots"]
+
+
+def test_prescreened_seed_source_serves_solvable_deals():
+    source = SeededDealSource(prescreen=True, target_depth=4, batch_size=4)
+    try:
+        source.next_deal(7)
+        deadline = time.time() + 30
+        while source.depth == 0 and time.time() < deadline:
+            time.sleep(0.05)
+        deal = source.next_deal(7)
+        assert source.hits == 1
+        assert solve_columns(deal_columns(deal), temp_limit=7).solvable is True
+    finally:
+        source.shutdown()
+
+
+def test_seed_source_survives_a_killed_prescreen_worker():
+    source = SeededDealSource(prescreen=True, target_depth=4, batch_size=4)
+    try:
+        source.next_deal(7)
+        pool = source._pool
+        for process in list(pool._processes.values()):
+            process.kill()
+        deadline = time.time() + 30
+        while not pool._broken and time.time() < deadline:
+            time.sleep(0.05)
+        assert pool._broken
+        # The broken pool is dropped without failing game creation, then rebuilt.
+        assert source.next_deal(7)["source"] == "seed"
+        assert source._pool is None
+        source.next_deal(7)
+        assert source._pool is not None and source._pool is not pool
+    finally:
+        source.shutdown()
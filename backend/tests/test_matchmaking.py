@@ -0,0 +1,94 @@
+import os
+import threading
+import time
+
+import pytest
+
+from app.modules.matchmaking.queue import Matchmaker, MemoryMatchQueue, RedisMatchQueue
+
+REDIS_URL = os.getenv("REDIS_URL")
+
+
+def _queues():
+    yield MemoryMatchQueue()
+    if REDIS_URL:
+        yield RedisMatchQueue(REDIS_URL, key_prefix=f"mh:test:matchmaking:{time.time_ns()}")
+
+
+def _starter(created):
+    def start(pool, first, second):
+        created.append((pool, first, second))
+        return f"m{len(created)}"
+    return start
+
+
+@pytest.mark.parametrize("queue", list(_queues()))
+def test_pairs_longest_waiters_first_and_keeps_the_odd_one(queue):
+    mm = Matchmaker(queue, max_pairs=8)
+    for user in ("a", "b", "c"):
+        mm.enqueue("battle:normal:1", user)
+    created = []
+    assert mm.tick("battle:normal:1", _starter(created)) == 1
+    assert created == [("battle:normal:1", "a", "b")]
+    assert mm.ticket("a")["matchId"] == mm.ticket("b")["matchId"] == "m1"
+    assert mm.ticket("b")["opponentUserId"] == "a"
+    assert mm.ticket("c")["state"] == "waiting"
+    assert queue.depth("battle:normal:1") == 1
+
+    # Other settings never pair with this pool.
+    mm.enqueue("battle:riichi:1", "d")
+    assert mm.tick("battle:normal:1", _starter(created)) == 0
+    stats = mm.stats()["pools"]["battle:normal:1"]
+    assert stats["matched"] == 1 and stats["waitSeconds"]["count"] == 2
+
+
+@pytest.mark.parametrize("queue", list(_queues()))
+def test_ticks_are_bounded_expire_stale_waiters_and_requeue_failures(queue):
+    mm = Matchmaker(queue, max_pairs=2, timeout=60)
+    queue.enqueue("p", "stale", time.time() - 120)
+    for i in range(10):
+        mm.enqueue("p", f"u{i}")
+
+    def broken(pool, first, second):
+        raise RuntimeError("boom")
+
+    assert mm.tick("p", broken) == 0
+    assert queue.depth("p") == 10
+    assert mm.ticket("u0")["state"] == "waiting"
+
+    created = []
+    assert mm.tick("p", _starter(created)) == 2
+    assert [(a, b) for _, a, b in created] == [("u0", "u1"), ("u2", "u3")]
+    stats = mm.stats()["pools"]["p"]
+    assert stats["expired"] == 1 and stats["failed"] == 2 and stats["depth"] == 6
+
+
+@pytest.mark.parametrize("queue", list(_queues()))
+def test_concurrent_ticks_never_match_a_player_twice(queue):
+    mm = Matchmaker(queue, max_pairs=4)
+    for i in range(200):
+        mm.enqueue("p", f"u{i}")
+    created, lock = [], threading.Lock()
+
+    def start(pool, first, second):
+        with lock:
+            created.append((first, second))
+        return first
+
+    threads = [threading.Thread(target=lambda: [mm.tick("p", start) for _ in range(30)]) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    users = [u for pair in created for u in pair]
+    assert len(users) == len(set(users)) == 200
+
+
+def test_cancel_and_switching_pools_leave_the_old_queue():
+    queue = MemoryMatchQueue()
+    mm = Matchmaker(queue)
+    mm.enqueue("a", "u1")
+    mm.enqueue("b", "u1")
+    assert queue.depth("a") == 0 and queue.depth("b") == 1
+    assert mm.cancel("u1") is True
+    assert queue.depth("b") == 0 and mm.ticket("u1") is None
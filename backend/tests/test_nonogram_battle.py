@@ -1,4 +1,30 @@
-from app.modules.nonogram_battle.domain import apply_move, create_match, join_match, line_clues, status_payload
+import itertools
+import os
+import random
+import time
+
+import pytest
+
+from app.modules.nonogram_battle.domain import (
+    _logical_difficulty_score,
+    apply_move,
+    count_solutions,
+    create_match,
+    generate_puzzle,
+    join_match,
+    line_clues,
+    match_solution,
+    solution_clues,
+    spectator_payload,
+    status_payload,
+)
+from app.modules.nonogram_battle.bank import MemoryRecentPuzzles, PuzzleBank, canonical_hash, pack_solution, write_bank
+from app.modules.nonogram_battle.hint import battle_hint, board_hint, split_packed_rows, transpose, unstack_rows
+from app.modules.nonogram_battle.pool import LocalPoolStore, PuzzlePool, RedisPoolStore, pool_key
+from app.modules.nonogram_battle import puzzles
+from app.modules.nonogram_battle.puzzles import MemoryPuzzleStore, Puzzle, load_puzzle
+from app.modules.nonogram_battle.repo import MemoryRepo, RedisRepo, board_from_bytes, board_to_bytes
+from app.modules.nonogram_battle.solver import solve_line
 
 
 def test_line_clues():
@@ -6,6 +32,35 @@ def test_line_clues():
     assert line_clues([False, False]) == [0]
 
 
+def test_solve_line_matches_brute_force():
+    rng = random.Random(3)
+    for _ in range(300):
+        length = rng.randint(1, 9)
+        clues = line_clues([rng.random() < 0.5 for _ in range(length)])
+        known = [rng.choice((None, None, True, False)) for _ in range(length)]
+        placements = [
+            line for line in itertools.product((False, True), repeat=length)
+            if line_clues(list(line)) == clues and all(k is None or k == v for k, v in zip(known, line))
+        ]
+        expected = None
+        if placements:
+            expected = [values[0] if len(set(values)) == 1 else None for values in zip(*placements)]
+        assert solve_line(clues, known) == expected
+
+
+def test_uniqueness_check_and_score():
+    # Two diagonals share the same clues, so this grid is ambiguous.
+    assert count_solutions([[1], [1]], [[1], [1]]) == 2
+    assert _logical_difficulty_score([[1], [1]], [[1], [1]]) is None
+    assert count_solutions([[2], [1]], [[2], [1]]) == 1
+
+
+def test_large_generated_puzzle_is_unique():
+    solution, rows, columns = generate_puzzle(25, "hard")
+    assert len(solution) == 25
+    assert count_solutions(rows, columns) == 1
+
+
 def test_match_starts_when_second_player_joins():
     state = create_match("p1", 5)
     assert state["status"] == "waiting"
@@ -17,7 +72,7 @@ def test_match_starts_when_second_player_joins():
 def _complete_board(state, user_id):
     for row in range(state["size"]):
         for column in range(state["size"]):
-            if state["solution"][row][column]:
+            if match_solution(state)[row][column]:
                 apply_move(state, user_id, row, column, "filled")
 
 
@@ -45,3 +100,265 @@ def test_first_solved_board_wins_but_second_player_can_continue():
     _complete_board(state, "p2")
     assert state["status"] == "finished"
     assert state["winnerUserId"] == "p1"
+
+
+def test_spectators_see_boards_only_after_the_match():
+    state = create_match("p1", 5)
+    join_match(state, "p2")
+    _complete_board(state, "p1")
+    watching = spectator_payload(state)
+    assert [p["userId"] for p in watching["players"]] == ["p1", "p2"]
+    assert watching["players"][0]["finished"] is True
+    assert all("board" not in p for p in watching["players"])
+    assert watching["rowClues"] == status_payload(state, "p1")["rowClues"]
+
+    _complete_board(state, "p2")
+    boards = [p["board"] for p in spectator_payload(state)["players"]]
+    assert boards[0] == status_payload(state, "p1")["my"]["board"]
+
+
+def test_puzzle_pool_serves_pregenerated_puzzles_and_persists(tmp_path):
+    path = str(tmp_path / "pool.json")
+    pool = PuzzlePool(LocalPoolStore(path), target_depth=2, batch_size=2, warm_sizes=(5,))
+    try:
+        assert pool.draw(5, "easy") is None
+        deadline = time.time() + 30
+        while pool.store.depth(pool_key(5, "easy")) < 2 and time.time() < deadline:
+            time.sleep(0.05)
+        solution, rows, columns = pool.draw(5, "easy")
+        assert (rows, columns) == solution_clues(solution)
+        stats = pool.stats()["pools"][pool_key(5, "easy")]
+        assert (stats["hits"], stats["misses"]) == (1, 1)
+        assert stats["refillPerSec"] and stats["refillPerSec"] <= stats["workerPerSec"] * pool.workers
+    finally:
+        pool.shutdown()
+    assert LocalPoolStore(path).depth(pool_key(5, "easy")) >= 1
+
+
+def test_local_pool_store_snapshots_pops_on_close_not_per_push(tmp_path):
+    path = str(tmp_path / "pool.json")
+    store = LocalPoolStore(path, save_interval=3600)
+    store.push("5:easy", [{"n": 1}, {"n": 2}])
+    assert not os.path.exists(path)
+    assert store.pop("5:easy") == {"n": 1}
+    store.close()
+    assert LocalPoolStore(path).pop("5:easy") == {"n": 2}
+
+
+def test_puzzle_pool_recovers_from_a_killed_worker():
+    pool = PuzzlePool(LocalPoolStore(), target_depth=2, batch_size=2)
+    try:
+        pool.draw(5, "easy")
+        executor = pool._pool
+        for process in list(executor._processes.values()):
+            process.kill()
+        deadline = time.time() + 30
+        while not executor._broken and time.time() < deadline:
+            time.sleep(0.05)
+        # Draws keep working (inline generation) and the next refill starts a new executor.
+        while pool.store.depth(pool_key(5, "easy")):
+            pool.store.pop(pool_key(5, "easy"))
+        assert pool.draw(5, "easy") is None
+        assert pool._counter(pool_key(5, "easy"))["inflight"] == 0
+        pool.draw(5, "easy")
+        assert pool._pool is not None and pool._pool is not executor
+        deadline = time.time() + 30
+        while pool.store.depth(pool_key(5, "easy")) < 2 and time.time() < deadline:
+            time.sleep(0.05)
+        assert pool.draw(5, "easy") is not None
+    finally:
+        pool.shutdown()
+
+
+@pytest.mark.skipif(not os.getenv("REDIS_URL"), reason="REDIS_URL not set; skip redis integration test")
+def test_redis_pool_processes_do_not_overshoot_target_depth():
+    stores = [RedisPoolStore(os.environ["REDIS_URL"], key_prefix="mh:test:nonogram-pool") for _ in range(3)]
+    key = pool_key(5, "easy")
+    stores[0].redis.delete(stores[0].key(key))
+    pools = [PuzzlePool(store, target_depth=2, batch_size=2, warm_sizes=(5,)) for store in stores]
+    try:
+        for pool in pools:
+            pool.draw(5, "easy")
+        deadline = time.time() + 30
+        while any(pool._counter(key)["inflight"] for pool in pools) and time.time() < deadline:
+            time.sleep(0.05)
+        assert stores[0].depth(key) == 2
+    finally:
+        for pool in pools:
+            pool.shutdown()
+        stores[0].redis.delete(stores[0].key(key))
+
+
+def test_canonical_hash_ignores_rotation_and_mirroring():
+    solution = [[True, True, False], [False, True, False], [False, False, False]]
+    rotated = [list(row) for row in zip(*solution[::-1])]
+    mirrored = [row[::-1] for row in solution]
+    assert canonical_hash(solution) == canonical_hash(rotated) == canonical_hash(mirrored)
+    assert canonical_hash(solution) != canonical_hash([[True, False, False]] + solution[1:])
+
+
+def test_puzzle_bank_samples_by_score_without_recent_repeats(tmp_path):
+    path = str(tmp_path / "bank.bin")
+    sections = {(5, "easy"): [(score, pack_solution(generate_puzzle(5, "easy")[0])) for score in (40, 10, 30, 20)]}
+    write_bank(path, sections)
+    bank = PuzzleBank(path)
+    assert bank.total == 4
+    assert bank.sample(6, "easy") is None
+    puzzle_id, (solution, rows, columns) = bank.sample(5, "easy", score_min=15, score_max=25)
+    assert bank.get(puzzle_id)[0] == 20
+    assert (rows, columns) == solution_clues(solution)
+
+    recent = MemoryRecentPuzzles(window=3)
+    drawn = []
+    for _ in range(3):
+        puzzle_id, _ = bank.sample(5, "easy", exclude=recent.seen("p1"))
+        recent.add("p1", puzzle_id)
+        drawn.append(puzzle_id)
+    assert len(set(drawn)) == 3
+
+
+def test_packed_board_counters_track_moves_and_legacy_boards():
+    state = create_match("p1", 5)
+    join_match(state, "p2")
+    solution = match_solution(state)
+    player = state["players"]["p1"]
+    filled = sum(cell for row in solution for cell in row)
+    assert (player["answered"], player["mismatches"]) == (0, filled)
+
+    wrong = next((r, c) for r in range(5) for c in range(5) if not solution[r][c])
+    apply_move(state, "p1", *wrong, "filled")
+    apply_move(state, "p1", *wrong, "filled")
+    assert (player["answered"], player["mismatches"]) == (1, filled + 1)
+    apply_move(state, "p1", *wrong, "marked")
+    assert (player["answered"], player["mismatches"]) == (1, filled)
+    assert status_payload(state, "p1")["my"]["board"][wrong[0]][wrong[1]] == "marked"
+
+    legacy = {"board": status_payload(state, "p1")["my"]["board"], "finishedAt": None}
+    state["players"]["p2"] = legacy
+    assert status_payload(state, "p2")["my"]["progress"] == 4
+    assert legacy["rows"] == player["rows"] and legacy["mismatches"] == filled
+
+
+def test_generate_puzzle_reports_attempts_and_outcome():
+    random.seed(11)
+    stats = {}
+    _, rows, columns = generate_puzzle(10, "normal", stats)
+    assert stats["outcome"] in ("inRange", "closest", "triangle")
+    assert 1 <= stats["attempts"] <= 240
+    assert stats["score"] == _logical_difficulty_score(rows, columns)
+
+
+def test_match_state_references_shared_puzzle():
+    puzzle = generate_puzzle(5)
+    first = create_match("p1", 5, puzzle=puzzle)
+    second = create_match("p3", 5, puzzle=puzzle)
+    assert "solution" not in first and "rowClues" not in first
+    assert first["puzzleId"] == second["puzzleId"]
+    shared = load_puzzle(first["puzzleId"])
+    assert Puzzle.from_dict(shared.to_dict()) == shared
+    assert [list(row) for row in shared.solution] == puzzle[0]
+
+    payload = status_payload(first, "p1")
+    assert payload["rowClues"] == puzzle[1] and payload["puzzleId"] == shared.puzzle_id
+    slim = status_payload(first, "p1", include_clues=False)
+    assert "rowClues" not in slim and "columnClues" not in slim
+
+
+def test_split_and_transpose_match_cell_loops():
+    rng = random.Random(5)
+    size = 25
+    rows = [sum(rng.randrange(3) << (2 * column) for column in range(size)) for _ in range(size)]
+    filled, marked = split_packed_rows(rows)
+    filled_rows = unstack_rows(filled, size)
+    assert filled_rows == [sum(1 << c for c in range(size) if row >> (2 * c) & 3 == 1) for row in rows]
+    assert unstack_rows(marked, size) == [sum(1 << c for c in range(size) if row >> (2 * c) & 3 == 2) for row in rows]
+    assert transpose(filled_rows, size) == [
+        sum((filled_rows[r] >> c & 1) << r for r in range(size)) for c in range(size)
+    ]
+
+
+def test_battle_hints_solve_the_board_and_flag_mistakes():
+    state = create_match("p1", 10, "hard")
+    join_match(state, "p2")
+    solution = match_solution(state)
+    wrong = next((r, c) for r in range(10) for c in range(10) if not solution[r][c])
+    apply_move(state, "p1", *wrong, "filled")
+    first = battle_hint(state, "p1")
+    assert first["mistakes"] is True and first["cell"] is not None
+    apply_move(state, "p1", *wrong, "unknown")
+    for _ in range(100):
+        hint = battle_hint(state, "p1")
+        if hint["cell"] is None:
+            break
+        cell = hint["cell"]
+        assert (cell["state"] == "filled") == solution[cell["row"]][cell["column"]]
+        assert hint["line"]["index"] == (cell["row"] if hint["line"]["axis"] == "row" else cell["column"])
+        apply_move(state, "p1", cell["row"], cell["column"], cell["state"])
+        if state["players"]["p1"]["finishedAt"]:
+            break
+    assert state["players"]["p1"]["finishedAt"]
+
+
+def test_board_hint_reports_contradicting_line():
+    rows, columns = solution_clues([[True, False, False, False, True]] * 5)
+    board = ["00000"] * 5
+    hint = board_hint(rows, columns, board)
+    assert hint["mistakes"] is False and hint["cell"]["state"] in ("filled", "marked")
+    board[2] = "01000"
+    hint = board_hint(rows, columns, board)
+    assert hint["mistakes"] is True and hint["cell"] is None
+    assert hint["line"] == {"axis": "column", "index": 1, "clues": [0]}
+    assert board_hint(rows, columns, ["12221"] * 5)["complete"] is True
+
+
+def test_board_bytes_use_bitfield_layout():
+    rows = [0b100100, 0b000001, 0b011000]
+    data = board_to_bytes(rows, 3)
+    # cells in row-major order, 2 bits each from the most significant bit: 0,1,2 / 1,0,0 / 0,2,1
+    assert data == bytes([0b00011001, 0b00000010, 0b01000000])
+    assert board_from_bytes(data, 3) == rows
+    assert board_from_bytes(None, 3) == [0, 0, 0]
+
+
+def _play_through_repo(repo):
+    state = create_match("p1", 5)
+    repo.create(state)
+    repo.update(state["matchId"], lambda current: join_match(current, "p2"))
+    solution = match_solution(state)
+    cells = [(r, c, "filled") for r in range(5) for c in range(5) if solution[r][c]]
+    first = repo.move(state["matchId"], "p1", cells[:-1])
+    assert first["finished"] is False and first["mismatches"] == 1
+    assert (first["version"], first["size"]) == (2, 5)
+    last = repo.move(state["matchId"], "p1", cells[-1:])
+    assert last["finished"] is True and last["winnerUserId"] == "p1"
+    assert last["version"] == 3
+    stored = repo.get(state["matchId"])
+    assert stored["players"]["p1"]["answered"] == len(cells)
+    assert status_payload(stored, "p2")["opponent"]["finished"] is True
+    assert status_payload(stored, "p2")["version"] == 3
+    with pytest.raises(ValueError, match="PLAYER_ALREADY_FINISHED"):
+        repo.move(state["matchId"], "p1", cells[:1])
+
+
+def test_memory_repo_applies_cell_batches():
+    _play_through_repo(MemoryRepo())
+
+
+@pytest.mark.skipif(not os.getenv("REDIS_URL"), reason="REDIS_URL not set; skip redis integration test")
+def test_redis_repo_applies_cell_batches_atomically():
+    _play_through_repo(RedisRepo(os.environ["REDIS_URL"], ttl=120, key_prefix="mh:test:nonogram-battle"))
+
+
+def test_match_writes_keep_the_shared_puzzle_alive(monkeypatch):
+    store = MemoryPuzzleStore(ttl=60)
+    monkeypatch.setattr(puzzles, "_store", store)
+    monkeypatch.setattr(puzzles, "_touched", puzzles.OrderedDict())
+    repo = MemoryRepo()
+    state = create_match("p1", 5)
+    repo.create(state)
+    repo.update(state["matchId"], lambda current: join_match(current, "p2"))
+    puzzle_id = state["puzzleId"]
+    monkeypatch.setattr(puzzles, "_touched", puzzles.OrderedDict())
+    store.store[puzzle_id] = (time.time() - 50, store.store[puzzle_id][1])
+    repo.move(state["matchId"], "p1", [(0, 0, "marked")])
+    assert time.time() - store.store[puzzle_id][0] < 5
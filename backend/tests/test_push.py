@@ -0,0 +1,133 @@
+import asyncio
+import json
+import os
+import threading
+
+import pytest
+
+from app.modules.push.broker import MemoryBroker, RedisBroker
+from app.modules.push.snapshots import SnapshotCache
+from app.modules.push.sse import event_stream
+
+
+class _Request:
+    def __init__(self):
+        self.closed = False
+
+    async def is_disconnected(self):
+        return self.closed
+
+
+def _parse(chunk):
+    fields = dict(line.split(": ", 1) for line in chunk.strip().splitlines() if not line.startswith(":"))
+    return json.loads(fields["data"]) if "data" in fields else None
+
+
+async def _collect(broker, snapshot, since, publish, limit=10):
+    request = _Request()
+    stream = event_stream(request, broker, "battle:m1", snapshot, since, heartbeat=0.05)
+    events, chunks = [], []
+    async for chunk in stream:
+        chunks.append(chunk)
+        event = _parse(chunk)
+        if event is not None:
+            events.append(event)
+        if len(chunks) == 2:
+            # Published from a worker thread, like a sync endpoint would.
+            await asyncio.get_running_loop().run_in_executor(None, publish)
+        if len(chunks) >= limit:
+            request.closed = True
+    return events, chunks
+
+
+def _stream(broker, snapshot, since, events):
+    return asyncio.run(_collect(broker, snapshot, since, lambda: [broker.publish("battle:m1", e) for e in events]))
+
+
+def test_stream_sends_sync_then_newer_events_until_finished():
+    broker = MemoryBroker()
+    snapshot = lambda: {"type": "sync", "version": 3, "status": "playing"}
+    live = [
+        {"type": "progress", "version": 3, "userId": "p2"},
+        {"type": "questionFinished", "version": 4, "userId": "p2"},
+        {"type": "finished", "version": 5, "status": "finished"},
+        {"type": "progress", "version": 6, "userId": "p2"},
+    ]
+    events, _ = _stream(broker, snapshot, None, live)
+    assert [(e["type"], e["version"]) for e in events] == [("sync", 3), ("questionFinished", 4), ("finished", 5)]
+    assert broker.subscriber_count() == 0
+
+
+def test_resume_at_current_version_skips_sync_and_sends_heartbeats():
+    broker = MemoryBroker()
+    events, chunks = _stream(broker, lambda: {"type": "sync", "version": 7, "status": "playing"}, 7, [])
+    assert events == []
+    assert ": ping\n\n" in chunks
+
+
+def test_lagging_reader_gets_a_fresh_snapshot():
+    broker = MemoryBroker(queue_size=2)
+    versions = iter([1, 9])
+    snapshot = lambda: {"type": "sync", "version": next(versions), "status": "playing"}
+    live = [{"type": "progress", "version": v, "userId": "p2"} for v in range(2, 8)]
+    events, _ = _stream(broker, snapshot, None, live)
+    assert [(e["type"], e["version"]) for e in events][:2] == [("sync", 1), ("sync", 9)]
+
+
+@pytest.mark.skipif(not os.getenv("REDIS_URL"), reason="REDIS_URL not set; skip redis integration test")
+def test_redis_broker_fans_out_across_instances():
+    publisher = RedisBroker(os.environ["REDIS_URL"], prefix="mh:test:events")
+    listener = RedisBroker(os.environ["REDIS_URL"], prefix="mh:test:events")
+    received = []
+
+    async def run():
+        subscription = listener.subscribe("battle:m1")
+        for _ in range(50):
+            await asyncio.sleep(0.05)
+            threading.Thread(target=publisher.publish, args=("battle:m1", {"type": "progress", "version": 1})).start()
+            event = await subscription.get(0.2)
+            if event is not None:
+                received.append(event)
+                break
+        subscription.close()
+
+    try:
+        asyncio.run(run())
+    finally:
+        listener.close()
+    assert received == [{"type": "progress", "version": 1}]
+
+
+def test_snapshot_cache_builds_once_per_version_for_all_viewers():
+    cache = SnapshotCache(fresh_seconds=0)
+    state = {"version": 1, "status": "playing"}
+    builds, reads = [], []
+
+    def version():
+        reads.append(1)
+        return state["version"]
+
+    def build():
+        builds.append(state["version"])
+        return dict(state)
+
+    viewers = [threading.Thread(target=cache.get, args=("battle:m1", version, build)) for _ in range(50)]
+    for viewer in viewers:
+        viewer.start()
+    for viewer in viewers:
+        viewer.join()
+    assert builds == [1]
+
+    state["version"] = 2
+    assert cache.get("battle:m1", version, build)["version"] == 2
+    assert cache.get("battle:m1", version, build)["version"] == 2
+    assert builds == [1, 2]
+
+    # Inside the freshness window, and for a finished match, not even the version is read.
+    reads.clear()
+    assert cache.get("battle:m1", version, build, fresh_seconds=60)["version"] == 2
+    state.update(version=3, status="finished")
+    cache.get("battle:m1", version, build)
+    cache.get("battle:m1", version, build)
+    assert builds == [1, 2, 3] and len(reads) == 1
+    assert cache.get("battle:missing", lambda: None, lambda: None) is None
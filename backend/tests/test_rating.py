@@ -0,0 +1,75 @@
+import os
+import random
+import time
+import uuid
+
+import pytest
+
+from app.modules.rating.elo import DEFAULT_RATING, match_deltas
+from app.modules.rating.replay import replay
+from app.modules.rating.store import MemoryRatingStore, RedisRatingStore
+
+
+def _stores():
+    yield MemoryRatingStore()
+    if os.getenv("REDIS_URL"):
+        yield RedisRatingStore(os.environ["REDIS_URL"], key_prefix=f"mh:test:rating:{uuid.uuid4().hex}")
+
+
+def test_match_deltas_are_zero_sum_and_reward_the_winner():
+    duel = match_deltas({"a": 1500, "b": 1500}, {"a": 3, "b": 1})
+    assert duel["a"] == pytest.approx(16) and duel["b"] == pytest.approx(-16)
+    assert match_deltas({"a": 1500, "b": 1500}, {"a": 2, "b": 2}) == {"a": 0.0, "b": 0.0}
+    room = match_deltas({"a": 1600, "b": 1500, "c": 1400}, {"a": 1, "b": 5, "c": 3})
+    assert sum(room.values()) == pytest.approx(0)
+    assert room["b"] > 0 > room["a"]
+
+
+@pytest.mark.parametrize("store", list(_stores()))
+def test_record_is_idempotent_and_ranks_players(store):
+    changes = store.record("m1", {"a": 5, "b": 2}, 100.0)
+    assert changes["a"]["before"] == DEFAULT_RATING and changes["a"]["delta"] > 0
+    assert store.record("m1", {"a": 5, "b": 2}, 100.0) is None
+    store.record("m2", {"c": 4, "b": 1, "a": 4}, 200.0)
+
+    top = store.top(10)
+    assert [p["rank"] for p in top] == [1, 2, 3]
+    assert [p["rating"] for p in top] == sorted((p["rating"] for p in top), reverse=True)
+    a = store.player("a")
+    assert (a["games"], a["wins"]) == (2, 1)
+    assert a["rank"] == next(p["rank"] for p in top if p["userId"] == "a")
+    assert store.player("nobody") is None
+
+
+@pytest.mark.parametrize("store", list(_stores()))
+def test_replaying_the_archive_reproduces_incremental_ratings(store):
+    rng = random.Random(7)
+    users = [f"u{i}" for i in range(12)]
+    for n in range(40):
+        players = rng.sample(users, rng.randint(2, 5))
+        store.record(f"m{n}", {uid: rng.randint(0, 10) for uid in players}, float(n))
+
+    entries = list(store.archive())
+    assert len(entries) == 40
+    replayed = replay(entries + entries[:5], store.k)
+    for uid, record in replayed.items():
+        live = store.player(uid)
+        assert (live["games"], live["wins"]) == (record["games"], record["wins"])
+        assert live["rating"] == pytest.approx(record["rating"])
+
+    store.replace(replay(entries, k=store.k / 2))
+    assert len(store.top(100)) == len(replayed)
+    assert store.top(1)[0]["rating"] != pytest.approx(max(r["rating"] for r in replayed.values()))
+
+
+def test_memory_store_expires_applied_ids_and_bounds_the_archive(monkeypatch):
+    store = MemoryRatingStore(applied_ttl=60, archive_size=3)
+    for n in range(5):
+        store.record(f"m{n}", {"a": n, "b": 1}, float(n))
+    assert [e["matchId"] for e in store.archive()] == ["m2", "m3", "m4"]
+    assert store.record("m0", {"a": 0, "b": 1}, 0.0) is None
+
+    now = time.time()
+    monkeypatch.setattr("app.modules.rating.store.time.time", lambda: now + 61)
+    store.record("m5", {"a": 1, "b": 1}, 5.0)
+    assert set(store._applied) == {"m5"}
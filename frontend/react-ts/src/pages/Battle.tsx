@@ -13,7 +13,9 @@ import {
     CopyOutlined,
 } from "@ant-design/icons";
 import type { BattleCreateReq, BattleMode, BattleResultData, BattleStatusData, Hint } from "../types/api";
-import { createBattle, enterBattle, getBattleResult, getBattleStatus, joinBattle, submitBattleGuess } from "../services/battleApi";
+import { battleEventsPath, createBattle, enterBattle, getBattleResult, getBattleStatus, joinBattle, submitBattleGuess } from "../services/battleApi";
+import { subscribeMatchEvents } from "../services/events";
+import { quickMatch } from "../services/matchmakingApi";
 import { getOrCreateUserId, normalizeUserId } from "../utils/userId";
 import TileCell from "../components/TileCell";
 import type { TileId } from "../constants/tiles";
@@ -92,6 +94,7 @@ export default function Battle() {
     const [mode, setMode] = useState<BattleMode>("normal");
     const [questionCount, setQuestionCount] = useState<number>(1);
     const [maxGuess, setMaxGuess] = useState<number>(6);
+    const [maxPlayers, setMaxPlayers] = useState<number>(2);
     const [joinMatchIdInput, setJoinMatchIdInput] = useState("");
     const [statusData, setStatusData] = useState<BattleStatusData | null>(null);
     const [resultData, setResultData] = useState<BattleResultData | null>(null);
@@ -111,6 +114,8 @@ export default function Battle() {
     const textInputRef = useRef<InputRef>(null);
     const [nowSec, setNowSec] = useState<number>(() => Date.now() / 1000);
     const [resumeMatchId, setResumeMatchId] = useState<string>("");
+    const [stopMatching, setStopMatching] = useState<(() => void) | null>(null);
+    const [matchingDepth, setMatchingDepth] = useState(0);
 
     const matchId = routeMatchId || statusData?.matchId || "";
     const maxRows = statusData?.maxGuess ?? maxGuess;
@@ -183,11 +188,20 @@ export default function Battle() {
 
     useEffect(() => {
         if (!matchId) return;
+        // 优先使用服务端推送：有变化才拉取状态；轮询只作为推送不可用或断线时的兜底。
+        const unsubscribe = subscribeMatchEvents(battleEventsPath(matchId), (event) => {
+            if (event.type === "sync" && event.version === 0) return;
+            void refreshStatus();
+            if (event.type === "finished" || event.status === "finished") void refreshResult();
+        });
         const timer = setInterval(() => {
             void refreshStatus();
             void refreshResult();
-        }, 2000);
-        return () => clearInterval(timer);
+        }, unsubscribe ? 15000 : 2000);
+        return () => {
+            clearInterval(timer);
+            unsubscribe?.();
+        };
     }, [matchId, refreshResult, refreshStatus]);
 
     useEffect(() => {
@@ -214,6 +228,7 @@ export default function Battle() {
                 mode,
                 questionCount,
                 maxGuess,
+                maxPlayers,
             };
             const res = await createBattle(payload);
             setStatusData(res);
@@ -229,6 +244,32 @@ export default function Battle() {
         }
     }
 
+    // Leave the queue only on unmount; a ticket that was matched must never be cancelled.
+    const stopMatchingRef = useRef<(() => void) | null>(null);
+    useEffect(() => () => stopMatchingRef.current?.(), []);
+
+    async function onQuickMatch() {
+        let cancelled = false;
+        const { done, stop } = quickMatch({ userId, game: "battle", mode, questionCount }, (ticket) => setMatchingDepth(ticket.depth));
+        const cancel = () => {
+            cancelled = true;
+            stop();
+        };
+        stopMatchingRef.current = cancel;
+        setStopMatching(() => cancel);
+        try {
+            const mid = await done;
+            stopMatchingRef.current = null;
+            if (mid) navigate(`/battle/${encodeURIComponent(mid)}?userId=${encodeURIComponent(userId)}`, { replace: false });
+            else if (!cancelled) message.info("暂时没有匹配到对手，请稍后再试");
+        } catch (e: any) {
+            message.error(e?.message || "匹配失败");
+        } finally {
+            stopMatchingRef.current = null;
+            setStopMatching(null);
+        }
+    }
+
     async function onJoinByInput() {
         const mid = (joinMatchIdInput || "").trim();
         if (!mid) {
@@ -434,9 +475,16 @@ export default function Battle() {
                                 <div>每题最大猜测次数</div>
                                 <InputNumber min={6} max={8} value={maxGuess} onChange={(v) => setMaxGuess(Number(v || 6))} />
                             </div>
+                            <div>
+                                <div>房间人数</div>
+                                <InputNumber min={2} max={100} value={maxPlayers} onChange={(v) => setMaxPlayers(Number(v || 2))} />
+                            </div>
                             <button className="modern-btn primary" type="button" onClick={onCreateBattle} disabled={loading}>
                                 创建对战
                             </button>
+                            <button className="modern-btn" type="button" onClick={() => (stopMatching ? stopMatching() : void onQuickMatch())} disabled={loading}>
+                                {stopMatching ? `取消匹配（排队 ${matchingDepth} 人）` : "快速匹配"}
+                            </button>
                         </Space>
                         <hr style={{ margin: "14px 0", opacity: 0.2 }} />
                         <h3>加入对战</h3>
@@ -776,6 +824,22 @@ export default function Battle() {
                     <div>我方得分：{statusData?.my.totalScore ?? 0}</div>
                     <div>对方进度：{progressText(statusData?.opponent?.currentQuestion, statusData?.questionCount, statusData?.opponent?.finished)}</div>
                     <div>对方得分：{statusData?.opponent?.totalScore ?? 0}</div>
+                    {(statusData?.maxPlayers ?? 2) > 2 && statusData?.leaderboard && (
+                        <div>
+                            <div>
+                                排名：{statusData.my.rank ?? "-"} / {statusData.playerCount ?? "-"}
+                            </div>
+                            {[...statusData.leaderboard.top, ...statusData.leaderboard.around]
+                                .filter((entry, idx, all) => all.findIndex((e) => e.userId === entry.userId) === idx)
+                                .sort((a, b) => a.rank - b.rank)
+                                .map((entry) => (
+                                    <div key={entry.userId} style={{ fontWeight: entry.userId === userId ? 600 : undefined }}>
+                                        #{entry.rank} {entry.userId === userId ? "我" : entry.userId.slice(0, 8)}：{entry.totalScore} 分（
+                                        {progressText(entry.currentQuestion, statusData.questionCount, entry.finished)}）
+                                    </div>
+                                ))}
+                        </div>
+                    )}
                 </div>
             </Modal>
 
@@ -1,10 +1,12 @@
-import { useCallback, useEffect, useMemo, useState } from "react";
+import { useCallback, useEffect, useMemo, useRef, useState } from "react";
 import { message } from "antd";
 import { useNavigate, useParams } from "react-router-dom";
 import NonogramBoard from "../components/nonogram/NonogramBoard";
 import NonogramToolbar from "../components/nonogram/NonogramToolbar";
 import type { CellState, DrawMode, NonogramDifficulty, NonogramPuzzle } from "../games/nonogram/types";
-import { clearNonogramBattle, createNonogramBattle, getNonogramBattleStatus, joinNonogramBattle, moveNonogramBattle } from "../services/nonogramBattleApi";
+import { clearNonogramBattle, createNonogramBattle, getNonogramBattleStatus, joinNonogramBattle, moveNonogramBattle, nonogramBattleEventsPath } from "../services/nonogramBattleApi";
+import { quickMatch } from "../services/matchmakingApi";
+import { subscribeMatchEvents } from "../services/events";
 import type { NonogramBattleData } from "../types/nonogramBattle";
 import { getOrCreateUserId } from "../utils/userId";
 import "../styles/nonogram.css";
@@ -39,6 +41,7 @@ export default function NonogramBattle() {
   const [drawMode, setDrawMode] = useState<DrawMode>("filled");
   const [loading, setLoading] = useState(false);
   const [loadError, setLoadError] = useState("");
+  const [stopMatching, setStopMatching] = useState<(() => void) | null>(null);
 
   const loadOrJoin = useCallback(async (matchId: string) => {
     try {
@@ -63,13 +66,22 @@ export default function NonogramBattle() {
     if (routeMatchId) void loadOrJoin(routeMatchId);
   }, [loadOrJoin, routeMatchId]);
 
+  const finished = data?.status === "finished";
+  const loaded = data != null;
+
   useEffect(() => {
-    if (!routeMatchId || !data || data.status === "finished") return;
-    const timer = window.setInterval(() => {
-      void getNonogramBattleStatus(routeMatchId, userId).then(setData).catch(() => undefined);
-    }, 1000);
-    return () => window.clearInterval(timer);
-  }, [data, routeMatchId, userId]);
+    if (!routeMatchId || !loaded || finished) return;
+    const refresh = () => void getNonogramBattleStatus(routeMatchId, userId).then(setData).catch(() => undefined);
+    // Pushed events say when the opponent changed something; polling is only a slow fallback.
+    const unsubscribe = subscribeMatchEvents(nonogramBattleEventsPath(routeMatchId), (event) => {
+      if (event.userId !== userId) refresh();
+    });
+    const timer = window.setInterval(refresh, unsubscribe ? 15000 : 1000);
+    return () => {
+      window.clearInterval(timer);
+      unsubscribe?.();
+    };
+  }, [finished, loaded, routeMatchId, userId]);
 
   async function createRoom() {
     try {
@@ -84,6 +96,32 @@ export default function NonogramBattle() {
     }
   }
 
+  // Leave the queue only on unmount; a ticket that was matched must never be cancelled.
+  const stopMatchingRef = useRef<(() => void) | null>(null);
+  useEffect(() => () => stopMatchingRef.current?.(), []);
+
+  async function startQuickMatch() {
+    let cancelled = false;
+    const { done, stop } = quickMatch({ userId, game: "nonogram-battle", size, difficulty });
+    const cancel = () => {
+      cancelled = true;
+      stop();
+    };
+    stopMatchingRef.current = cancel;
+    setStopMatching(() => cancel);
+    try {
+      const matchId = await done;
+      stopMatchingRef.current = null;
+      if (matchId) navigate(`/nonogram/battle/${encodeURIComponent(matchId)}`);
+      else if (!cancelled) message.info("暂时没有匹配到对手，请稍后再试");
+    } catch (error) {
+      message.error(error instanceof Error ? error.message : "匹配失败");
+    } finally {
+      stopMatchingRef.current = null;
+      setStopMatching(null);
+    }
+  }
+
   function enterRoom() {
     const id = extractMatchId(joinId);
     if (!id) return;
@@ -135,6 +173,10 @@ export default function NonogramBattle() {
             <div className="lobby-controls"><input className="room-input" value={joinId} onChange={(event) => setJoinId(event.target.value)} placeholder="房间号" onKeyDown={(event) => { if (event.key === "Enter") enterRoom(); }} /></div>
             <button type="button" disabled={loading || !joinId.trim()} onClick={enterRoom}>加入对战</button>
           </div>
+          <div className="nonogram-lobby-card">
+            <span className="lobby-number">03</span><h2>快速匹配</h2><p>按所选尺寸和难度，自动寻找一位对手。</p>
+            <button type="button" disabled={loading} onClick={() => (stopMatching ? stopMatching() : void startQuickMatch())}>{stopMatching ? "取消匹配" : "开始匹配"}</button>
+          </div>
         </section>
       </main>
     );
@@ -32,6 +32,10 @@ function buildUrl(path: string): string {
     return joinPath(API_PREFIX, BATTLE_PREFIX, path);
 }
 
+export function battleEventsPath(matchId: string): string {
+    return buildUrl(`${encodeURIComponent(matchId)}/events`);
+}
+
 function assertApiOk<T>(payload: ApiResponse<T>): T {
     if (!payload || typeof payload !== "object") throw new Error("后端响应不是合法的 ApiResponse");
     if (!payload.ok) throw new Error(payload.error?.message || payload.error?.code || "请求失败");
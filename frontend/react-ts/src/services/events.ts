@@ -0,0 +1,27 @@
+import { api } from "./api";
+
+export type MatchEventType = "sync" | "joined" | "progress" | "questionFinished" | "finished";
+
+export interface MatchEvent {
+  type: MatchEventType;
+  version: number;
+  status?: string;
+  userId?: string;
+  [key: string]: unknown;
+}
+
+const EVENT_TYPES: MatchEventType[] = ["sync", "joined", "progress", "questionFinished", "finished"];
+
+// 订阅对局事件流（SSE）；返回取消函数。浏览器不支持 EventSource 时返回 null，调用方继续轮询。
+// 断线后 EventSource 会带上 Last-Event-ID（即对局版本）自动重连，服务端只在版本变化时补发快照。
+export function subscribeMatchEvents(path: string, onEvent: (event: MatchEvent) => void): (() => void) | null {
+  if (typeof EventSource === "undefined") return null;
+  const source = new EventSource(`${api.defaults.baseURL || ""}${path}`);
+  const handle = (message: MessageEvent<string>) => {
+    const event = JSON.parse(message.data) as MatchEvent;
+    onEvent(event);
+    if (event.type === "finished" || (event.type === "sync" && event.status === "finished")) source.close();
+  };
+  for (const type of EVENT_TYPES) source.addEventListener(type, handle as EventListener);
+  return () => source.close();
+}
@@ -3,6 +3,8 @@ import type {
     ApiResponse,
     LinkPickData,
     LinkPickReq,
+    LinkPicksData,
+    LinkPicksReq,
     LinkUndoData,
     LinkUndoReq,
     LinkAssistReq,
@@ -11,6 +13,8 @@ import type {
     LinkStartData,
     LinkStartReq,
     LinkStatusData,
+    LinkSubmitData,
+    LinkSubmitReq,
 } from "../types/api";
 
 /**
@@ -81,6 +85,18 @@ export async function pickLinkTile(
     return assertApiOk(resp.data);
 }
 
+/** 批量取牌/撤回：POST {API_PREFIX}{LINK_PREFIX}/{gameId}/picks */
+export async function pickLinkTiles(
+    gameId: string,
+    payload: LinkPicksReq
+): Promise<LinkPicksData> {
+    const resp = await api.post<ApiResponse<LinkPicksData>>(
+        buildUrl(`/${encodeURIComponent(gameId)}/picks`),
+        payload
+    );
+    return assertApiOk(resp.data);
+}
+
 /** 从暂存区撤回：POST {API_PREFIX}{LINK_PREFIX}/{gameId}/undo */
 export async function undoLinkTile(
     gameId: string,
@@ -93,6 +109,18 @@ export async function undoLinkTile(
     return assertApiOk(resp.data);
 }
 
+/** 提交本地对局走法：POST {API_PREFIX}{LINK_PREFIX}/{gameId}/submit */
+export async function submitLinkMoves(
+    gameId: string,
+    payload: LinkSubmitReq
+): Promise<LinkSubmitData> {
+    const resp = await api.post<ApiResponse<LinkSubmitData>>(
+        buildUrl(`/${encodeURIComponent(gameId)}/submit`),
+        payload
+    );
+    return assertApiOk(resp.data);
+}
+
 /** 更新辅助功能：POST {API_PREFIX}{LINK_PREFIX}/{gameId}/assist */
 export async function setLinkAssist(
     gameId: string,
@@ -0,0 +1,65 @@
+import { api } from "./api";
+import type { ApiResponse } from "../types/api";
+
+const PREFIX = "/api/matchmaking";
+const POLL_MS = 1500;
+
+export type QuickMatchReq =
+  | { userId: string; game: "battle"; mode: string; questionCount: number }
+  | { userId: string; game: "nonogram-battle"; size: number; difficulty: string };
+
+export interface MatchTicket {
+  game: "battle" | "nonogram-battle";
+  state: "waiting" | "matched" | "expired";
+  pool: string;
+  depth: number;
+  enqueuedAt: number;
+  matchId?: string;
+  opponentUserId?: string;
+  waitedSeconds?: number;
+}
+
+function unwrap<T>(response: ApiResponse<T>): T {
+  if (!response.ok || response.data == null) throw new Error(response.error?.message || "请求失败");
+  return response.data;
+}
+
+export async function enqueueQuickMatch(req: QuickMatchReq) {
+  return unwrap((await api.post<ApiResponse<MatchTicket>>(`${PREFIX}/enqueue`, req)).data);
+}
+
+export async function getQuickMatchStatus(userId: string) {
+  return unwrap((await api.get<ApiResponse<MatchTicket>>(`${PREFIX}/status`, { params: { userId } })).data);
+}
+
+export async function cancelQuickMatch(userId: string) {
+  await api.post(`${PREFIX}/cancel`, { userId });
+}
+
+/**
+ * Queue up and poll until paired. Resolves with the matchId, or null when the wait
+ * timed out or `stop()` was called (which also leaves the queue).
+ */
+export function quickMatch(req: QuickMatchReq, onTicket?: (ticket: MatchTicket) => void) {
+  let stopped = false;
+  let timer: number | undefined;
+  let settle: (matchId: string | null) => void = () => undefined;
+  const done = new Promise<string | null>((resolve, reject) => {
+    settle = resolve;
+    const handle = (ticket: MatchTicket) => {
+      if (stopped) return resolve(null);
+      onTicket?.(ticket);
+      if (ticket.state === "matched" && ticket.matchId) return resolve(ticket.matchId);
+      if (ticket.state === "expired") return resolve(null);
+      timer = window.setTimeout(() => void getQuickMatchStatus(req.userId).then(handle, reject), POLL_MS);
+    };
+    enqueueQuickMatch(req).then(handle, reject);
+  });
+  const stop = () => {
+    stopped = true;
+    window.clearTimeout(timer);
+    settle(null);
+    void cancelQuickMatch(req.userId).catch(() => undefined);
+  };
+  return { done, stop };
+}
@@ -0,0 +1,13 @@
+import { api } from "./api";
+import type { ApiResponse } from "../types/api";
+import type { CellState } from "../games/nonogram/types";
+import type { NonogramHintData } from "../types/nonogramBattle";
+
+const CELL_CODES: Record<CellState, string> = { unknown: "0", filled: "1", marked: "2" };
+
+export async function getNonogramHint(rowClues: number[][], columnClues: number[][], board: CellState[][]) {
+  const rows = board.map((row) => row.map((cell) => CELL_CODES[cell]).join(""));
+  const response = (await api.post<ApiResponse<NonogramHintData>>("/api/nonogram/hint", { rowClues, columnClues, board: rows })).data;
+  if (!response.ok || response.data == null) throw new Error(response.error?.message || "请求失败");
+  return response.data;
+}
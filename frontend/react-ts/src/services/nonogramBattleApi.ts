@@ -1,7 +1,14 @@
 import { api } from "./api";
 import type { ApiResponse } from "../types/api";
 import type { CellState, NonogramDifficulty } from "../games/nonogram/types";
-import type { NonogramBattleData } from "../types/nonogramBattle";
+import type {
+  NonogramBattleData,
+  NonogramBattleMovesAck,
+  NonogramBattleProgressData,
+  NonogramCellEdit,
+  NonogramHintData,
+  NonogramPuzzleData,
+} from "../types/nonogramBattle";
 
 const PREFIX = "/api/nonogram-battle";
 
@@ -10,6 +17,10 @@ function unwrap<T>(response: ApiResponse<T>): T {
   return response.data;
 }
 
+export function nonogramBattleEventsPath(matchId: string) {
+  return `${PREFIX}/${encodeURIComponent(matchId)}/events`;
+}
+
 export async function createNonogramBattle(userId: string, size: number, difficulty: NonogramDifficulty) {
   return unwrap((await api.post<ApiResponse<NonogramBattleData>>(`${PREFIX}/create`, { userId, size, difficulty })).data);
 }
@@ -22,10 +33,26 @@ export async function getNonogramBattleStatus(matchId: string, userId: string) {
   return unwrap((await api.get<ApiResponse<NonogramBattleData>>(`${PREFIX}/${encodeURIComponent(matchId)}/status`, { params: { userId } })).data);
 }
 
+export async function getNonogramBattleProgress(matchId: string, userId: string) {
+  return unwrap((await api.get<ApiResponse<NonogramBattleProgressData>>(`${PREFIX}/${encodeURIComponent(matchId)}/status`, { params: { userId, clues: false } })).data);
+}
+
+export async function getNonogramPuzzle(puzzleId: string) {
+  return unwrap((await api.get<ApiResponse<NonogramPuzzleData>>(`${PREFIX}/puzzles/${encodeURIComponent(puzzleId)}`)).data);
+}
+
+export async function getNonogramBattleHint(matchId: string, userId: string) {
+  return unwrap((await api.get<ApiResponse<NonogramHintData>>(`${PREFIX}/${encodeURIComponent(matchId)}/hint`, { params: { userId } })).data);
+}
+
 export async function moveNonogramBattle(matchId: string, userId: string, row: number, column: number, state: CellState) {
   return unwrap((await api.post<ApiResponse<NonogramBattleData>>(`${PREFIX}/${encodeURIComponent(matchId)}/move`, { userId, row, column, state })).data);
 }
 
+export async function moveNonogramBattleCells(matchId: string, userId: string, cells: NonogramCellEdit[]) {
+  return unwrap((await api.post<ApiResponse<NonogramBattleMovesAck>>(`${PREFIX}/${encodeURIComponent(matchId)}/moves`, { userId, cells })).data);
+}
+
 export async function clearNonogramBattle(matchId: string, userId: string) {
   return unwrap((await api.post<ApiResponse<NonogramBattleData>>(`${PREFIX}/${encodeURIComponent(matchId)}/clear`, { userId })).data);
 }
@@ -108,6 +108,8 @@ export interface HealthResponse {
 export interface LinkStartReq {
     userId: string;
     handIndex?: number;
+    /** 64 位牌局 seed（十进制字符串），用于复现指定牌局 */
+    dealSeed?: string;
     tempLimit?: number;
     undoUnlimited?: boolean;
 }
@@ -116,6 +118,7 @@ export interface LinkStartReq {
 export interface LinkStartData {
     gameId: string;
     createdAt: number;
+    dealSeed?: string | null;
     columns: string[][];
     topTiles: Array<string | null>;
     columnCounts: number[];
@@ -178,6 +181,7 @@ export interface LinkUndoData {
 export interface LinkStatusData {
     gameId: string;
     createdAt: number;
+    dealSeed?: string | null;
     columns: string[][];
     topTiles: Array<string | null>;
     columnCounts: number[];
@@ -191,6 +195,37 @@ export interface LinkStatusData {
     canUndo?: boolean;
 }
 
+/** /link/{gameId}/picks 中的一步：column 取牌或 undoSlot 撤回，二选一 */
+export type LinkMove = { column: number } | { undoSlot: number };
+
+/** /link/{gameId}/picks 请求 */
+export interface LinkPicksReq {
+    userId: string;
+    moves: LinkMove[];
+}
+
+/** /link/{gameId}/picks 返回 data */
+export interface LinkPicksData extends LinkStatusData {
+    applied: number;
+    stoppedAt: number | null;
+    stopReason: string | null;
+    steps: Array<
+        | { picked: { column: number; tile: string }; removed: { tile: string; count: number } | null }
+        | { undone: { slotIndex: number; tile: string; column: number } }
+    >;
+}
+
+/** /link/{gameId}/submit 请求：a..q 取第 0..16 列，A..T 撤回暂存区第 0..19 格 */
+export interface LinkSubmitReq {
+    userId: string;
+    moves: string;
+}
+
+/** /link/{gameId}/submit 返回 data */
+export interface LinkSubmitData extends LinkStatusData {
+    applied: number;
+}
+
 /** /link/{gameId}/assist 请求 */
 export interface LinkAssistReq {
     userId: string;
@@ -201,6 +236,7 @@ export interface LinkAssistReq {
 export interface LinkResetReq {
     userId: string;
     handIndex?: number;
+    dealSeed?: string;
     tempLimit?: number;
     undoUnlimited?: boolean;
 }
@@ -222,6 +258,7 @@ export interface BattleCreateReq {
     mode: BattleMode;
     questionCount: number;
     maxGuess?: number;
+    maxPlayers?: number;
 }
 
 export interface BattleJoinReq {
@@ -241,6 +278,15 @@ export interface BattlePlayerStatus {
     questionScores: number[];
     currentHint?: Hint;
     currentGameCreatedAt?: number | null;
+    rank?: number | null;
+}
+
+export interface BattleLeaderboardEntry {
+    rank: number;
+    userId: string;
+    currentQuestion: number;
+    totalScore: number;
+    finished: boolean;
 }
 
 export interface BattleStatusData {
@@ -249,6 +295,10 @@ export interface BattleStatusData {
     mode: BattleMode;
     questionCount: number;
     maxGuess: number;
+    maxPlayers?: number;
+    playerCount?: number;
+    /** Top players plus the caller's neighbours; rooms of any size send only these. */
+    leaderboard?: { top: BattleLeaderboardEntry[]; around: BattleLeaderboardEntry[] };
     my: BattlePlayerStatus;
     opponent: BattlePlayerStatus | null;
 }
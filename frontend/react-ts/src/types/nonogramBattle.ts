@@ -7,10 +7,42 @@ export type NonogramBattleData = {
   status: NonogramBattleStatus;
   size: number;
   difficulty: NonogramDifficulty;
+  puzzleId: string;
   rowClues: number[][];
   columnClues: number[][];
   startedAt: number | null;
   winnerUserId: string | null;
+  version: number;
   my: { userId: string; board: CellState[][]; progress: number; finished: boolean };
   opponent: { userId: string; progress: number; finished: boolean } | null;
 };
+
+// status?clues=false omits the clues; fetch them once by puzzleId instead.
+export type NonogramBattleProgressData = Omit<NonogramBattleData, "rowClues" | "columnClues">;
+
+export type NonogramPuzzleData = {
+  puzzleId: string;
+  size: number;
+  difficulty: NonogramDifficulty;
+  rowClues: number[][];
+  columnClues: number[][];
+};
+
+export type NonogramCellEdit = { row: number; column: number; state: CellState };
+
+export type NonogramBattleMovesAck = {
+  matchId: string;
+  version: number;
+  applied: number;
+  progress: number;
+  finished: boolean;
+  status: NonogramBattleStatus;
+  winnerUserId: string | null;
+};
+
+export type NonogramHintData = {
+  cell: { row: number; column: number; state: "filled" | "marked" } | null;
+  line: { axis: "row" | "column"; index: number; clues: number[] } | null;
+  mistakes: boolean;
+  complete: boolean;
+};